@@ -0,0 +1,504 @@
+import argparse
+import asyncio
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import orjson
+from datetime import datetime
+from fnmatch import fnmatch
+from os.path import dirname, abspath, join
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, dirname(abspath(__file__)))
+
+from seed import CREATER, LOOKUPS, ROOT, SIZES, WORKSPACE, build_row, code, read_manifest, rows_of, seed, setup, write_manifest
+
+PAGE_SIZE = 30
+
+# records per batch request
+BATCH_SIZE = 10
+
+# pages a cursor walk follows before it starts over
+CURSOR_DEPTH = 50
+
+# share of the seeded ids, at the end of each range, which only the delete scenarios touch
+DELETE_SHARE = 0.25
+
+PERCENTILES = (50, 95, 99)
+
+RESULT_DIR = join(ROOT, 'dbs', 'benchmarks')
+
+# weight, scenario of the mixed scanner workload
+SCANNER_MIX = [
+    (30, 'filter /core/goods/'),
+    (20, 'filter /core/bin/'),
+    (25, 'filter /core/stock/'),
+    (10, 'update /core/stock/update/'),
+    (10, 'patch /wms/example/patch/'),
+    (5, 'create /core/dn/create/'),
+]
+
+
+class Workload:
+    """
+    Seeded ids and the random source of one run
+    Updates pick ids before the delete share, deletes walk through it and the position is kept in the manifest
+    """
+    def __init__(self, manifest: dict, seed_value: int):
+        self.rows = manifest.get('rows', 0)
+        self.ids = manifest.get('ids', {})
+        self.deleted = manifest.setdefault('deleted', {})
+        self.rng = random.Random(seed_value)
+        self.requests = 0
+
+    def seeded(self, resource: str) -> bool:
+        return self.rows > 0 and self.ids.get(resource, [None])[0] is not None
+
+    def delete_start(self, resource: str) -> int:
+        first, last = self.ids[resource]
+        return last - int((last - first + 1) * DELETE_SHARE) + 1
+
+    def exhausted(self) -> bool:
+        return any(self.delete_start(resource) + self.deleted.get(resource, 0) > self.ids[resource][1]
+                   for resource in self.ids if self.seeded(resource))
+
+    def index(self) -> int:
+        return self.rng.randrange(max(self.rows, 1))
+
+    def row(self, resource: str, index: int = None) -> dict:
+        return build_row(resource, self.index() if index is None else index, self.rng, max(self.rows, 1))
+
+    def update_id(self, resource: str) -> int:
+        return self.rng.randint(self.ids[resource][0], self.delete_start(resource) - 1)
+
+    def delete_id(self, resource: str) -> int:
+        """
+        Next undeleted id of the delete share, the last id again when it is used up
+        """
+        record_id = min(self.delete_start(resource) + self.deleted.get(resource, 0), self.ids[resource][1])
+        self.deleted[resource] = self.deleted.get(resource, 0) + 1
+        return record_id
+
+    def address(self) -> str:
+        """
+        X-Forwarded-For of the next request, for a --url server which runs bomiot's CoreThrottle with [throttle] disabled,
+        it limits every address to 10 requests a second
+        """
+        self.requests += 1
+        n = self.requests
+        return f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'
+
+
+class Scenario:
+    """
+    A named request pattern, build(state) returns (method, path, body), after(state, data) reads the answer
+    state is kept per connection
+    """
+    def __init__(self, name: str, build, after=None):
+        self.name = name
+        self.build = build
+        self.after = after
+
+
+def list_scenarios(workload: Workload, api) -> list:
+    resource, path = api['resource'], api['api']
+    rng = workload.rng
+
+    pages = math.ceil(workload.rows / PAGE_SIZE) if workload.seeded(resource) else 1
+
+    def page(state):
+        return 'GET', f'{path}?page={rng.randint(1, min(5, max(pages, 1)))}&max_page={PAGE_SIZE}', None
+
+    def lookup(state):
+        if workload.seeded(resource):
+            key, kind = LOOKUPS[resource]
+            params = {f'data__{key}': code(kind, workload.index())}
+        else:
+            params = {'data__creater': CREATER}
+        return 'GET', f'{path}?params={quote(orjson.dumps(params))}&max_page={PAGE_SIZE}', None
+
+    def deep(state):
+        return 'GET', f'{path}?page={max(1, pages - rng.randrange(10))}&max_page={PAGE_SIZE}', None
+
+    def cursor(state):
+        if state.get('cursor') is None or state.get('depth', 0) >= CURSOR_DEPTH:
+            state['cursor'], state['depth'] = '', 0
+        return 'GET', f"{path}?cursor={quote(state['cursor'])}&max_page={PAGE_SIZE}", None
+
+    def cursor_after(state, data):
+        state['cursor'] = data.get('next_cursor') if isinstance(data, dict) else None
+        state['depth'] = state.get('depth', 0) + 1
+
+    scenarios = [Scenario(f'list {path}', page), Scenario(f'filter {path}', lookup)]
+    if workload.seeded(resource):
+        scenarios.append(Scenario(f'deep {path}', deep))
+    # the views of main take cursor=, bomiot's /core/ views ignore it
+    if path.startswith('/wms/'):
+        scenarios.append(Scenario(f'cursor {path}', cursor, cursor_after))
+    return scenarios
+
+
+def write_scenarios(workload: Workload, api, mode: str) -> list:
+    resource, path = api['resource'], api['api']
+    if mode == 'create':
+        return [Scenario(f'create {path}', lambda state: ('POST', path, workload.row(resource)))]
+    if mode == 'bulk_create':
+        return [Scenario(f'bulk_create {path}',
+                         lambda state: ('POST', path, [workload.row(resource) for _ in range(BATCH_SIZE)]))]
+    if not workload.seeded(resource):
+        return []
+    first = workload.ids[resource][0]
+    from main.api import API_METHOD_TABLE
+    versioned = any(api_obj['func_name'] == f'{resource}_patch' for api_obj in API_METHOD_TABLE.values())
+
+    def record(record_id):
+        # as read from the list, bomiot's update compares every key of the stored record
+        row = {'id': record_id, 'created_time': '', 'updated_time': '', **workload.row(resource, record_id - first)}
+        if versioned:
+            row['_version'] = 0
+        return row
+
+    builds = {
+        'update': lambda state: ('POST', path, record(workload.update_id(resource))),
+        'delete': lambda state: ('POST', path, {'id': workload.delete_id(resource)}),
+        'bulk_update': lambda state: ('POST', path, [record(workload.update_id(resource)) for _ in range(BATCH_SIZE)]),
+        'bulk_delete': lambda state: ('POST', path, [{'id': workload.delete_id(resource)} for _ in range(BATCH_SIZE)]),
+        'patch': lambda state: ('POST', path, {'id': workload.update_id(resource), 'qty': workload.rng.randint(0, 500)}),
+    }
+    if mode not in builds:
+        return []
+    return [Scenario(f'{mode} {path}', builds[mode])]
+
+
+def scenario_list(workload: Workload) -> list:
+    """
+    Scenarios of every API in the registry, export and import excepted, then the mixed scanner workload
+    """
+    from main.api import API_LIST
+    scenarios = []
+    for api in API_LIST:
+        mode = api['func_name'][len(api['resource']) + 1:]
+        if mode == 'get':
+            scenarios += list_scenarios(workload, api)
+        else:
+            scenarios += write_scenarios(workload, api, mode)
+    by_name = {scenario.name: scenario for scenario in scenarios}
+    mix = [(weight, by_name[name]) for weight, name in SCANNER_MIX if name in by_name]
+    if mix:
+        weights = [weight for weight, _ in mix]
+
+        def scanner(state):
+            return workload.rng.choices([scenario for _, scenario in mix], weights)[0].build(state)
+        scenarios.append(Scenario('mixed scanner', scanner))
+    return scenarios
+
+
+class Client:
+    """
+    One keep-alive HTTP/1.1 connection, no client library is needed
+    """
+    def __init__(self, host: str, port: int, token: str):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, body, address: str) -> tuple:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = b'' if body is None else orjson.dumps(body)
+        head = (f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\ntoken: {self.token}\r\n'
+                f'X-Forwarded-For: {address}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n')
+        self.writer.write(head.encode() + payload)
+        await self.writer.drain()
+        lines = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            content = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                content += chunk[:-2]
+        else:
+            content = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close':
+            self.close()
+        return status, headers, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def outcome(status: int, content: bytes) -> tuple:
+    """
+    (failed status or None, parsed body), bomiot answers most errors with HTTP 200 and status_code in the body
+    """
+    try:
+        data = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        data = None
+    if status >= 400:
+        return status, data
+    if isinstance(data, dict) and isinstance(data.get('status_code'), int) and data['status_code'] >= 400:
+        return data['status_code'], data
+    return None, data
+
+
+def percentile(values: list, p: float) -> float:
+    # nearest rank
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+
+def summary(latencies: list, seconds: float, statuses: dict, cache_hits: int) -> dict:
+    values = sorted(latencies)
+    result = {
+        'requests': len(values),
+        'errors': sum(statuses.values()),
+        'statuses': statuses,
+        'cache_hits': cache_hits,
+        'rps': round(len(values) / seconds, 2) if seconds else 0.0,
+        'mean': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'max': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+    for p in PERCENTILES:
+        result[f'p{p}'] = round(percentile(values, p) * 1000, 3)
+    return result
+
+
+async def run_scenario(scenario: Scenario, workload: Workload, host: str, port: int, token: str,
+                       requests: int, connections: int, warmup: int, timeout: float = 60) -> dict:
+    """
+    requests answers over `connections` keep-alive connections, latencies in milliseconds
+    """
+    clients = [Client(host, port, token) for _ in range(connections)]
+    latencies = []
+    statuses = {}
+    cache_hits = 0
+    issued = 0
+
+    async def send(client, state, record: bool):
+        nonlocal cache_hits
+        method, path, body = scenario.build(state)
+        start = time.perf_counter()
+        try:
+            status, headers, content = await asyncio.wait_for(client.request(method, path, body, workload.address()), timeout)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            client.close()
+            if record:
+                latencies.append(time.perf_counter() - start)
+                name = 'timeout' if isinstance(e, asyncio.TimeoutError) else 'connection'
+                statuses[name] = statuses.get(name, 0) + 1
+            return
+        seconds = time.perf_counter() - start
+        failed, data = outcome(status, content)
+        if scenario.after is not None:
+            scenario.after(state, data)
+        if not record:
+            return
+        latencies.append(seconds)
+        if failed is not None:
+            statuses[str(failed)] = statuses.get(str(failed), 0) + 1
+        if headers.get('x-cache') == 'HIT':
+            cache_hits += 1
+
+    async def worker(client):
+        nonlocal issued
+        state = {}
+        while issued < requests:
+            issued += 1
+            await send(client, state, True)
+
+    warmup_state = {}
+    for _ in range(warmup):
+        await send(clients[0], warmup_state, False)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    seconds = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return summary(latencies, seconds, statuses, cache_hits)
+
+
+def benchmark_token() -> str:
+    """
+    Token of the benchmark user, created on first use, rows it creates carry CREATER
+    """
+    from django.contrib.auth import get_user_model
+    from bomiot.server.core.jwt_auth import create_token
+    user, _ = get_user_model().objects.get_or_create(username=CREATER, defaults={'department': 0})
+    return create_token({'id': user.id, 'username': user.username, 'admin': False, 'permission': user.permission or {}})
+
+
+def start_server():
+    """
+    The ASGI application of `launcher.py serve` under uvicorn in a thread of this process
+    The token buckets of [throttle] are off, every request carries the one benchmark token and would be limited
+    """
+    import socket
+    import uvicorn
+    from launcher import APPLICATION
+    from main.throttle import rate_limiter
+    rate_limiter.enable = False
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    config = uvicorn.Config(APPLICATION, host='127.0.0.1', port=port, log_level='warning',
+                            timeout_keep_alive=60, server_header=False)
+    server = uvicorn.Server(config=config)
+    thread = threading.Thread(target=server.run, name='benchmark-server', daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError('server did not start')
+        time.sleep(0.05)
+    return server, thread, port
+
+
+def environment(url: str, rows: int, seed_value: int, requests: int, connections: int) -> dict:
+    import django
+    from django.db import connection
+    from main.__version__ import __version__
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'version': __version__,
+        'commit': commit,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+        'server': url or 'in-process',
+        'rows': rows,
+        'seed': seed_value,
+        'requests': requests,
+        'connections': connections,
+    }
+
+
+def run(rows: int, seed_value: int = 42, requests: int = 200, connections: int = 8, warmup: int = 10,
+        only: list = None, output: str = '', url: str = '', workspace: str = WORKSPACE, config: str = '') -> str:
+    """
+    Seed when the manifest differs or its delete share is used up, run every scenario and write the report
+    :param workspace: working space of the rows and the in-process server, see seed.workspace
+    :param config: setup.ini of a scratch database, the workspace gets its own sqlite database when empty
+    :return: report path
+    """
+    setup(workspace, config)
+    manifest = read_manifest()
+    if manifest.get('rows') != rows or manifest.get('seed') != seed_value or Workload(manifest, seed_value).exhausted():
+        manifest = seed(rows, seed_value)
+    workload = Workload(manifest, seed_value)
+    scenarios = [scenario for scenario in scenario_list(workload)
+                 if not only or any(fnmatch(scenario.name, pattern) for pattern in only)]
+    token = benchmark_token()
+    server = thread = None
+    if url:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        server, thread, port = start_server()
+        host = '127.0.0.1'
+    report = {**environment(url, rows, seed_value, requests, connections), 'scenarios': {}}
+    print(f'{"scenario":<44}{"requests":>10}{"errors":>8}{"rps":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    try:
+        for scenario in scenarios:
+            result = asyncio.run(run_scenario(scenario, workload, host, port, token, requests, connections, warmup))
+            report['scenarios'][scenario.name] = result
+            print(f'{scenario.name:<44}{result["requests"]:>10}{result["errors"]:>8}{result["rps"]:>10.1f}'
+                  f'{result["p50"]:>10.1f}{result["p95"]:>10.1f}{result["p99"]:>10.1f}')
+    finally:
+        write_manifest(manifest)
+        if server is not None:
+            server.should_exit = True
+            thread.join()
+    if not output:
+        os.makedirs(RESULT_DIR, exist_ok=True)
+        output = join(RESULT_DIR, f'{report["version"]}-{report["commit"] or "local"}-{rows}-{datetime.now():%Y%m%d%H%M%S}.json')
+    with open(output, 'wb') as f:
+        f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    print(f'report: {output}')
+    return output
+
+
+def compare(base_path: str, current_path: str, threshold: float = 0.1) -> int:
+    """
+    Print the change of every scenario, a scenario regresses when p95 grew or rps fell by more than threshold,
+    or it failed more often
+    :return: number of regressed scenarios
+    """
+    with open(base_path, 'rb') as f:
+        base = orjson.loads(f.read())
+    with open(current_path, 'rb') as f:
+        current = orjson.loads(f.read())
+    for key in ['rows', 'database', 'connections', 'cpus', 'server']:
+        if base.get(key) != current.get(key):
+            print(f'warning: {key} differs, {base.get(key)} / {current.get(key)}')
+    print(f'{base.get("version")} ({base.get("commit")}) -> {current.get("version")} ({current.get("commit")})')
+    print(f'{"scenario":<44}{"p95 ms":>20}{"change":>9}{"rps":>20}{"change":>9}  result')
+    regressions = 0
+    for name in sorted(set(base['scenarios']) | set(current['scenarios'])):
+        old, new = base['scenarios'].get(name), current['scenarios'].get(name)
+        if old is None or new is None:
+            print(f'{name:<44}  only in {"current" if old is None else "base"}')
+            continue
+        p95_change = new['p95'] / old['p95'] - 1 if old['p95'] else 0.0
+        rps_change = new['rps'] / old['rps'] - 1 if old['rps'] else 0.0
+        failed = []
+        if p95_change > threshold:
+            failed.append('slower')
+        if rps_change < -threshold:
+            failed.append('fewer rps')
+        if new['errors'] > old['errors']:
+            failed.append(f'{new["errors"] - old["errors"]} more errors')
+        regressions += bool(failed)
+        print(f'{name:<44}{old["p95"]:>9.1f} -> {new["p95"]:<7.1f}{p95_change:>+9.1%}'
+              f'{old["rps"]:>9.1f} -> {new["rps"]:<7.1f}{rps_change:>+9.1%}  {", ".join(failed) or "ok"}')
+    print(f'{regressions} regressed')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmarks/load.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='seed, load every scenario and write a JSON report')
+    run_parser.add_argument('--rows', default='10k', help=f'rows per seeded resource, {", ".join(SIZES)} or a number')
+    run_parser.add_argument('--seed', type=int, default=42, help='seed of the data generator and the scenarios')
+    run_parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    run_parser.add_argument('--connections', type=int, default=8, help='concurrent keep-alive connections')
+    run_parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests before each scenario')
+    run_parser.add_argument('--only', nargs='*', default=None, help="scenario name patterns, e.g. 'list *' 'mixed*'")
+    run_parser.add_argument('--output', default='', help='report path, dbs/benchmarks/<version>-<commit>-<rows>-<time>.json by default')
+    run_parser.add_argument('--url', default='', help='load a running server instead of the in-process one')
+    run_parser.add_argument('--workspace', default=WORKSPACE, help='throwaway working space, dbs/benchmark by default')
+    run_parser.add_argument('--config', default='', help='setup.ini of a scratch database, a sqlite database in the workspace by default')
+    compare_parser = commands.add_parser('compare', help='compare two reports, exit 1 on a regression')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='allowed p95 / rps change, 0.1 is 10%%')
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(rows_of(args.rows), args.seed, args.requests, args.connections, args.warmup, args.only, args.output, args.url,
+            args.workspace, args.config)
+    else:
+        sys.exit(1 if compare(args.base, args.current, args.threshold) else 0)
@@ -0,0 +1,226 @@
+import os
+import random
+import shutil
+import sys
+import time
+import orjson
+from configparser import ConfigParser
+from os.path import dirname, abspath, exists, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# every seeded and benchmark-created row carries this creater, clear() removes them by it
+CREATER = 'benchmark'
+
+BATCH_SIZE = 5000
+
+# working space the benchmark runs in, the rows never go to the database of the project
+WORKSPACE = join(ROOT, 'dbs', 'benchmark')
+
+UNITS = ['pcs', 'box', 'kg', 'pallet', 'roll']
+CLASSES = ['Food', 'Drink', 'Tool', 'Spare', 'Textile', 'Paper']
+BRANDS = [f'Brand {i}' for i in range(50)]
+ZONES = ['A', 'B', 'C', 'D', 'R', 'Q']
+PROPERTIES = ['Normal', 'Damage', 'Inspection', 'Holding']
+
+# seeded resources, the data key a scanner looks a record up by and the code kind it holds
+LOOKUPS = {
+    'example': ('goods_code', 'goods'),
+    'goods': ('goods_code', 'goods'),
+    'bin': ('bin_name', 'bin'),
+    'stock': ('goods_code', 'goods'),
+    'asn': ('asn_code', 'asn'),
+    'dn': ('dn_code', 'dn'),
+}
+
+
+def workspace(path: str = WORKSPACE, config_path: str = '') -> str:
+    """
+    Throwaway working space of the benchmark, the project package linked in and a setup.ini of its own
+    The setup.ini of the project is copied with [database] engine = sqlite, so the database is path/dbs/db.sqlite3
+    :param config_path: setup.ini to use as it is instead, for a scratch database of another engine
+    """
+    path = abspath(path)
+    if path == ROOT:
+        raise ValueError('The benchmark workspace can not be the project root')
+    os.makedirs(join(path, 'dbs'), exist_ok=True)
+    config = ConfigParser(interpolation=None)
+    config.read(config_path or join(ROOT, 'setup.ini'), encoding='utf-8')
+    if not config_path:
+        if not config.has_section('database'):
+            config.add_section('database')
+        config.set('database', 'engine', 'sqlite')
+    with open(join(path, 'setup.ini'), 'w', encoding='utf-8') as f:
+        config.write(f)
+    project = config.get('project', 'name', fallback='bomiot')
+    if exists(join(ROOT, project)) and not exists(join(path, project)):
+        try:
+            os.symlink(join(ROOT, project), join(path, project), target_is_directory=True)
+        except OSError:
+            # windows without the symlink privilege
+            shutil.copytree(join(ROOT, project), join(path, project), ignore=shutil.ignore_patterns('__pycache__', 'media'))
+    if exists(join(ROOT, 'auth_key.py')) and not exists(join(path, 'auth_key.py')):
+        shutil.copy(join(ROOT, 'auth_key.py'), join(path, 'auth_key.py'))
+    return path
+
+
+def setup(path: str = WORKSPACE, config_path: str = ''):
+    """
+    Django set up in the benchmark workspace, migrated like `launcher.py serve` does
+    """
+    os.chdir(workspace(path, config_path))
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from launcher import prepare
+    prepare()
+
+
+def manifest_path() -> str:
+    """
+    ids of the last seed, read by load.py, in the workspace next to the rows
+    """
+    from django.conf import settings
+    return join(settings.WORKING_SPACE, 'dbs', 'benchmark.json')
+
+
+def code(resource: str, index: int) -> str:
+    """
+    Code of the index-th seeded row, scenarios build lookups from it without reading the database
+    """
+    if resource == 'bin':
+        return f'{ZONES[index % len(ZONES)]}-{index:07d}'
+    if resource == 'asn':
+        return f'ASN{index:08d}'
+    if resource == 'dn':
+        return f'DN{index:08d}'
+    return f'G{index:07d}'
+
+
+def build_row(resource: str, index: int, rng: random.Random, rows: int) -> dict:
+    """
+    data of one synthetic row, codes follow the index, every other field comes from rng
+    """
+    if resource == 'goods':
+        data = {
+            'goods_code': code('goods', index),
+            'goods_name': f'Goods {index}',
+            'goods_unit': rng.choice(UNITS),
+            'goods_class': rng.choice(CLASSES),
+            'goods_brand': rng.choice(BRANDS),
+            'goods_weight': round(rng.uniform(0.1, 50), 2),
+            'goods_price': round(rng.uniform(1, 500), 2),
+        }
+    elif resource == 'bin':
+        data = {
+            'bin_name': code('bin', index),
+            'bin_zone': ZONES[index % len(ZONES)],
+            'bin_property': rng.choice(PROPERTIES),
+            'bin_size': rng.choice(['S', 'M', 'L']),
+            'empty_label': rng.random() < 0.2,
+        }
+    elif resource == 'stock':
+        onhand = rng.randint(0, 500)
+        data = {
+            'goods_code': code('goods', rng.randrange(rows)),
+            'bin_name': code('bin', rng.randrange(rows)),
+            'onhand_stock': onhand,
+            'can_order_stock': rng.randint(0, onhand),
+        }
+    elif resource in ('asn', 'dn'):
+        partner = 'supplier' if resource == 'asn' else 'customer'
+        data = {
+            f'{resource}_code': code(resource, index),
+            partner: f'{partner.capitalize()} {rng.randrange(200)}',
+            'goods_code': code('goods', rng.randrange(rows)),
+            'goods_qty': rng.randint(1, 200),
+            f'{resource}_status': rng.randint(1, 5),
+        }
+    else:
+        data = {
+            'goods_code': code('goods', index),
+            'goods_name': f'Goods {index}',
+            'bin_name': code('bin', rng.randrange(rows)),
+            'supplier': f'Supplier {rng.randrange(200)}',
+            'qty': rng.randint(0, 500),
+        }
+    data['department'] = 0
+    data['creater'] = CREATER
+    return data
+
+
+def model_of(resource: str):
+    from bomiot.server.core import models
+    from main.api import RESOURCE_TABLE
+    return getattr(models, RESOURCE_TABLE[resource])
+
+
+def clear() -> int:
+    """
+    Remove the rows written by the benchmark, seeded or created by a scenario
+    """
+    from django.conf import settings
+    removed = 0
+    for resource in LOOKUPS:
+        removed += model_of(resource).objects.filter(project=settings.PROJECT_NAME, data__creater=CREATER).delete()[0]
+    if os.path.exists(manifest_path()):
+        os.remove(manifest_path())
+    return removed
+
+
+def seed(rows: int, seed_value: int = 42) -> dict:
+    """
+    Replace the benchmark rows with `rows` synthetic rows per resource of LOOKUPS
+    The same seed writes the same rows, ids are recorded in dbs/benchmark.json of the workspace
+    """
+    from django.conf import settings
+    from django.db import transaction
+    from django.db.models import Max
+    clear()
+    manifest = {'rows': rows, 'seed': seed_value, 'ids': {}, 'deleted': {}}
+    for resource in LOOKUPS:
+        model = model_of(resource)
+        rng = random.Random(f'{seed_value}-{resource}')
+        start = time.perf_counter()
+        before = model.objects.aggregate(last=Max('id'))['last'] or 0
+        for offset in range(0, rows, BATCH_SIZE):
+            objs = [model(data=build_row(resource, index, rng, rows), project=settings.PROJECT_NAME)
+                    for index in range(offset, min(offset + BATCH_SIZE, rows))]
+            with transaction.atomic():
+                model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+        # ids are read back, not every backend returns them from bulk_create
+        ids = model.objects.filter(id__gt=before, data__creater=CREATER).order_by('id').values_list('id', flat=True)
+        manifest['ids'][resource] = [ids.first(), ids.last()]
+        print(f'{resource:<10}{rows:>10} rows{time.perf_counter() - start:>10.1f}s')
+    write_manifest(manifest)
+    return manifest
+
+
+def read_manifest() -> dict:
+    try:
+        with open(manifest_path(), 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+
+def write_manifest(manifest: dict) -> None:
+    os.makedirs(dirname(manifest_path()), exist_ok=True)
+    with open(manifest_path(), 'wb') as f:
+        f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+
+
+def rows_of(size: str) -> int:
+    return SIZES[size.lower()] if size.lower() in SIZES else int(size)
+
+
+if __name__ == '__main__':
+    # python benchmarks/seed.py 10k|100k|1m|<rows> [seed], python benchmarks/seed.py clear
+    # BENCHMARK_WORKSPACE and BENCHMARK_CONFIG move the workspace and its setup.ini, like --workspace and --config of load.py
+    argument = sys.argv[1] if len(sys.argv) > 1 else '10k'
+    setup(os.environ.get('BENCHMARK_WORKSPACE', WORKSPACE), os.environ.get('BENCHMARK_CONFIG', ''))
+    if argument == 'clear':
+        print(f'{clear()} rows removed')
+    else:
+        seed(rows_of(argument), int(sys.argv[2]) if len(sys.argv) > 2 else 42)
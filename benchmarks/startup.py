@@ -0,0 +1,57 @@
+import os
+import sys
+import socket
+import subprocess
+import time
+import urllib.request
+from os.path import dirname, abspath, join, exists
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+FINGERPRINT_PATH = join(ROOT, 'dbs', 'schema_fingerprint.json')
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def first_request(timeout: float = 300) -> float:
+    """
+    Seconds from starting `launcher.py serve` to the first answered request
+    """
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, join(ROOT, 'launcher.py'), 'serve', '--workers', '1', '--host', '127.0.0.1', '--port', str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f'launcher exited with {process.returncode}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/wms/health/', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f'no answer in {timeout} seconds')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(rounds: int = 3):
+    print(f'{"round":<8}{"schema":<10}{"first request (s)":>20}')
+    for index in range(rounds):
+        # the first round migrates, as every launch did before the fingerprint
+        if index == 0 and exists(FINGERPRINT_PATH):
+            os.remove(FINGERPRINT_PATH)
+        schema = 'changed' if index == 0 else 'current'
+        print(f'{index + 1:<8}{schema:<10}{first_request():>20.3f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
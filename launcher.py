@@ -1,20 +1,82 @@
 import os
-from time import sleep
-import uvicorn
-import socket
-import webbrowser
+import argparse
+import multiprocessing
 import threading
-from bomiot_token import encrypt_info
-from os.path import join, exists 
+from time import sleep
+from configparser import ConfigParser
+from os.path import join, exists
 from os import getcwd
-import tkinter as tk
-from PIL import Image, ImageTk
-import requests
+import uvicorn
+from uvicorn.supervisors.multiprocess import Multiprocess, Process, logger
 
 app_name = "Bomiot"
 version = "1.0.1"
 
-if __name__ == "__main__":
+APPLICATION = "bomiot_asgi:application"
+
+
+def cpu_count() -> int:
+    # 容器中按可用 CPU 计算
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def server_options(mode: str) -> tuple:
+    """
+    读取 setup.ini 的 [server], 返回 (uvicorn 参数, 滚动重启间隔)
+    desktop 模式固定 1 个 worker, serve 模式 workers = 0 时按 CPU 数量
+    """
+    config = ConfigParser()
+    config.read(join(getcwd(), 'setup.ini'), encoding='utf-8')
+    workers = config.getint('server', 'workers', fallback=0)
+    if mode != 'serve':
+        workers = 1
+    elif workers <= 0:
+        workers = cpu_count()
+    options = {
+        'host': config.get('server', 'host', fallback='0.0.0.0'),
+        'port': config.getint('server', 'port', fallback=8008),
+        'workers': workers,
+        'log_level': config.get('server', 'log_level', fallback='info'),
+        'http': config.get('server', 'http', fallback='httptools'),
+        'limit_concurrency': config.getint('server', 'limit_concurrency', fallback=1000) or None,
+        'limit_max_requests': config.getint('server', 'limit_max_requests', fallback=0) or None,
+        'backlog': config.getint('server', 'backlog', fallback=2048),
+        'timeout_keep_alive': config.getint('server', 'timeout_keep_alive', fallback=5),
+        'timeout_graceful_shutdown': config.getint('server', 'timeout_graceful_shutdown', fallback=30),
+    }
+    return options, config.getfloat('server', 'restart_delay', fallback=5)
+
+
+class RollingMultiprocess(Multiprocess):
+    """
+    SIGHUP 滚动重启, 逐个替换 worker
+    先启动新 worker, 等待 restart_delay 秒仍存活后再平滑关闭旧 worker, 任何时刻都有 workers 个进程在接收请求
+    新 worker 启动失败时停止滚动, 保留旧 worker
+    """
+    def __init__(self, config, target, sockets, restart_delay: float = 5):
+        super().__init__(config, target, sockets)
+        self.restart_delay = restart_delay
+
+    def restart_all(self) -> None:
+        for idx, process in enumerate(self.processes):
+            new_process = Process(self.config, self.target, self.sockets)
+            new_process.start()
+            sleep(self.restart_delay)
+            if not new_process.is_alive():
+                logger.error(f"Child process [{new_process.pid}] failed to start, rolling restart stopped.")
+                new_process.kill()
+                new_process.join()
+                return
+            process.terminate()
+            process.join()
+            self.processes[idx] = new_process
+
+
+def show_splash():
+    import tkinter as tk
+    from PIL import Image, ImageTk
     # 欢迎页
     splash = tk.Tk()
     window_width = 675
@@ -32,27 +94,29 @@ if __name__ == "__main__":
         # 使用PIL加载图片
         image_path = join(getcwd(), 'splash.png')
         pil_img = Image.open(image_path)
-        
+
         # 获取原始图片尺寸
         img_width, img_height = pil_img.size
-        
+
         # 计算缩放比例（保持长宽比）
         scale_width = window_width / img_width
         scale_height = window_height / img_height
         scale = min(scale_width, scale_height)  # 取最小比例，确保图片完全显示在窗口内
-        
+
         # 计算缩放后的尺寸
         new_width = int(img_width * scale)
         new_height = int(img_height * scale)
-        
+
         # 缩放图片
         resized_img = pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)  # 高质量缩放
         img = ImageTk.PhotoImage(resized_img)
-        
+        # 保留引用, 防止图片被回收
+        canvas.image = img
+
         # 计算图片居中位置
         x_pos = (window_width - new_width) // 2
         y_pos = (window_height - new_height) // 2
-        
+
         # 在画布上显示图片（居中）
         canvas.create_image(x_pos, y_pos, anchor=tk.NW, image=img)
     except Exception as e:
@@ -62,15 +126,20 @@ if __name__ == "__main__":
 
     # 强制刷新窗口，确保splash在后续操作前显示
     splash.update()
+    return splash
+
+
+def prepare(force_migrate: bool = False):
     # 设置 Django 环境变量
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bomiot.server.server.settings")
     os.environ.setdefault("RUN_MAIN", "true")
     import django
     django.setup()
-    
+
     # 生成auth_key.py
     path = join(getcwd(), 'auth_key.py')
     if not exists(join(path)):
+        from bomiot_token import encrypt_info
         while True:
             key_code = encrypt_info()
             if '/' in key_code:
@@ -80,61 +149,49 @@ if __name__ == "__main__":
         with open(path, "w", encoding="utf-8") as f:
             f.write(f'KEY = "{key_code}"\n')
 
-    from django.core.management import call_command
-    from django.apps import apps
-    from django.contrib.auth import get_user_model
+    # 模型、迁移和数据库未变化时跳过 makemigrations / migrate
+    from main.schema import migrate_schema
+    migrate_schema(force=force_migrate)
 
-    # 准备 makemigrations 命令参数
-    cmd_args = ["makemigrations"]
 
-    # 自动检测所有包含模型的应用
-    apps_with_models = []
-    for app_config in apps.get_app_configs():
-        try:
-            if app_config.models_module:
-                models = apps.get_app_config(app_config.label).get_models()
-                if models:
-                    apps_with_models.append(app_config.label)
-        except Exception:
-            continue
-
-    if apps_with_models:
-        cmd_args.extend(apps_with_models)
+def desktop(args):
+    splash = show_splash()
+    prepare()
+    # 桌面模式只有一个进程, 在本进程采样和建立文件索引
+    from main.monitor import monitor
+    from main.observer import media_indexer
+    from main.jobs import job_queue
+    monitor.start()
+    media_indexer.start()
+    job_queue.start()
+    options = server_options('desktop')[0]
+    options['host'] = args.host or options['host']
+    options['port'] = args.port or options['port']
 
-    # 执行 makemigrations 命令
-    try:
-        call_command(*cmd_args)
-        print("Migrations created successfully.")
-    except Exception as e:
-        print(f"Error creating migrations: {e}")
-    
-    # 执行 migrate 命令
-    try:
-        call_command('migrate')
-    except Exception as e:
-        print(f"Error during migration: {e}")
-    
-    # 保持欢迎页显示一段时间（原逻辑的10秒）
     print('正在启动系统')
-    
+
     # 启动 Django 开发服务器
     os.environ.setdefault("IS_LAN", "true")
     print('系统启动成功')
+    import socket
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.connect(('8.8.8.8', 80))
     ip = s.getsockname()[0]
     print('本机IP地址为:', ip)
     s.close()
-    baseurl = "http://" + ip + ":8008"
+    baseurl = "http://" + ip + f":{options['port']}"
     print('浏览器正在打开:', baseurl)
+
     def run_server():
+        import requests
+        import webbrowser
         while True:
             try:
                 response = requests.get(url=baseurl, timeout=2)
                 print(response.status_code)
                 sleep(2)
                 webbrowser.open(baseurl)
-                break 
+                break
             except:
                 print("服务器尚未准备好，正在重试...")
                 sleep(0.5)
@@ -146,23 +203,131 @@ if __name__ == "__main__":
     splash.destroy()
 
     uvicorn.run(
-            "bomiot_asgi:application",
-            host='0.0.0.0',
-            port=8008,
-            workers=1,
-            log_level="info",
+            APPLICATION,
             uds=None,
             ssl_keyfile=None,
             ssl_certfile=None,
             proxy_headers=True,
-            http="httptools",
             server_header=False,
-            limit_concurrency=1000,
-            backlog=128,
-            timeout_keep_alive=5,
-            timeout_graceful_shutdown=30,
             loop="auto",
+            **options
         )
-    
-    
-    
\ No newline at end of file
+
+
+def start_background(lockfile: str):
+    """
+    在主进程中启动定时任务、文件监听和服务器监控, 与 bomiot 按 bomiot_ready.lock 只启动一次的逻辑相同
+    主进程不会被滚动重启, 后台任务也就不会随 worker 重启而丢失
+    """
+    try:
+        fd = os.open(lockfile, os.O_CREAT | os.O_EXCL | os.O_RDWR)
+        os.close(fd)
+    except FileExistsError:
+        return
+    from bomiot.server.core.scheduler import sm
+    from bomiot.server.core.server_monitor import start_monitoring
+    from main.monitor import monitor
+    from main.observer import media_indexer
+    # 每个节点一个采样线程, [monitor] enable = False 时使用 bomiot 的监控
+    if not monitor.start():
+        start_monitoring()
+    sm.start()
+    # 归档任务由 bomiot 的调度器按 [archive] minutes 执行
+    from main.archive import archive
+    archive.schedule()
+    # 库存汇总由触发器实时维护, 按 [stock] minutes 与源数据核对
+    from main.rollup import stock_rollup
+    stock_rollup.schedule()
+    # 本节点领取并执行数据库任务队列中的任务
+    from main.jobs import job_queue
+    job_queue.start()
+    # 文件变化合并后批量写入, [observer] enable = False 时使用 bomiot 的文件监听
+    if not media_indexer.start():
+        # bomiot 的 observer 在导入时启动
+        from bomiot.server.core.observer import ob
+        ob.start()
+
+
+def serve(args):
+    """
+    无界面生产模式, 不显示欢迎页, 不打开浏览器
+    """
+    options, restart_delay = server_options('serve')
+    options['host'] = args.host or options['host']
+    options['port'] = args.port or options['port']
+    options['workers'] = args.workers or options['workers']
+
+    lockfile = join(getcwd(), 'bomiot_ready.lock')
+    if exists(lockfile):
+        os.remove(lockfile)
+    os.environ.setdefault("IS_LAN", "true")
+    prepare()
+    start_background(lockfile)
+    # bomiot 的 worker 在 WORKERS > 0 时检查 lockfile, 已被主进程占用则不再启动后台任务
+    os.environ['WORKERS'] = str(options['workers'])
+
+    print(f"系统启动成功, workers: {options['workers']}, 地址: http://{options['host']}:{options['port']}")
+    config = uvicorn.Config(
+        APPLICATION,
+        uds=None,
+        ssl_keyfile=None,
+        ssl_certfile=None,
+        proxy_headers=True,
+        server_header=False,
+        loop="auto",
+        **options
+    )
+    server = uvicorn.Server(config=config)
+    try:
+        if config.workers > 1:
+            sock = config.bind_socket()
+            RollingMultiprocess(config, target=server.run, sockets=[sock], restart_delay=restart_delay).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exists(lockfile):
+            os.remove(lockfile)
+
+
+if __name__ == "__main__":
+    # 打包后的多进程 worker 需要
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(prog=app_name)
+    parser.add_argument('mode', nargs='?', default='desktop', choices=['desktop', 'serve', 'migrate', 'archive', 'reconcile', 'worker'],
+                        help='desktop: splash and browser, serve: headless multi-worker server, '
+                             'migrate: makemigrations and migrate, then exit, '
+                             'archive: move the rows due by [archive] once, then exit, '
+                             'reconcile: correct the stock rollup from the stock, ASN and DN rows, then exit, '
+                             'worker: run the jobs of the job queue only, no server')
+    parser.add_argument('--host', default='', help='bind host, [server] host by default')
+    parser.add_argument('--port', type=int, default=0, help='bind port, [server] port by default')
+    parser.add_argument('--workers', type=int, default=0, help='serve mode workers, [server] workers by default')
+    args = parser.parse_args()
+    if args.mode == 'migrate':
+        prepare(force_migrate=True)
+    elif args.mode == 'archive':
+        prepare()
+        from main.archive import archive
+        print(archive.run())
+    elif args.mode == 'reconcile':
+        prepare()
+        from main.rollup import stock_rollup
+        print(stock_rollup.reconcile())
+    elif args.mode == 'worker':
+        prepare()
+        # 独立的队列节点, 与服务器节点通过数据库领取任务
+        from main.jobs import job_queue
+        if not job_queue.start():
+            parser.exit(1, '[queue] enable = False\n')
+        print(f'队列节点已启动: {job_queue.worker}')
+        try:
+            while True:
+                sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    elif args.mode == 'serve':
+        serve(args)
+    else:
+        desktop(args)
@@ -1,59 +1,89 @@
+from types import MappingProxyType
 
-def api_return(data):
+
+def resource(name: str, label: str, prefix: str = '/core/', bulk_prefix: str = '', export_prefix: str = '/wms/',
+             import_prefix: str = '/wms/', async_prefix: str = '', model: str = '') -> tuple:
+    """
+    Declare the get / create / update / delete / batch / patch / export / import / async APIs of one resource
+    :param name: resource name, used in path and func_name
+    :param label: display label, in the api names and permissions
+    :param prefix: path prefix of the resource
+    :param bulk_prefix: path prefix of the batch and patch APIs, none of them when empty
+    :param export_prefix: path prefix of the export API, no export API when empty
+    :param import_prefix: path prefix of the import API, no import API when empty
+    :param async_prefix: path prefix of the async get / create / update / delete APIs, none of them when empty
+    :param model: model name in bomiot.server.core.models, the label when empty
+    :return: tuple of api dict
+    """
     api_list = [
-        {'method': 'GET', 'api': '/core/example/', 'func_name': 'example_get', 'name': "Get Example List"},
-        {'method': 'POST', 'api': '/core/example/create/', 'func_name': 'example_create', 'name': "Create Example"},
-        {'method': 'POST', 'api': '/core/example/update/', 'func_name': 'example_update', 'name': "Update Example"},
-        {'method': 'POST', 'api': '/core/example/delete/', 'func_name': 'example_delete', 'name': "Delete Example"},
-        {'method': 'GET', 'api': '/core/goods/', 'func_name': 'goods_get', 'name': "Get Goods List"},
-        {'method': 'POST', 'api': '/core/goods/create/', 'func_name': 'goods_create', 'name': "Create Goods"},
-        {'method': 'POST', 'api': '/core/goods/update/', 'func_name': 'goods_update', 'name': "Update Goods"},
-        {'method': 'POST', 'api': '/core/goods/delete/', 'func_name': 'goods_delete', 'name': "Delete Goods"},
-        {'method': 'GET', 'api': '/core/bin/', 'func_name': 'bin_get', 'name': "Get Bin List"},
-        {'method': 'POST', 'api': '/core/bin/create/', 'func_name': 'bin_create', 'name': "Create Bin"},
-        {'method': 'POST', 'api': '/core/bin/update/', 'func_name': 'bin_update', 'name': "Update Bin"},
-        {'method': 'POST', 'api': '/core/bin/delete/', 'func_name': 'bin_delete', 'name': "Delete Bin"},
-        {'method': 'GET', 'api': '/core/stock/', 'func_name': 'stock_get', 'name': "Get Stock List"},
-        {'method': 'POST', 'api': '/core/stock/create/', 'func_name': 'stock_create', 'name': "Create Stock"},
-        {'method': 'POST', 'api': '/core/stock/update/', 'func_name': 'stock_update', 'name': "Update Stock"},
-        {'method': 'POST', 'api': '/core/stock/delete/', 'func_name': 'stock_delete', 'name': "Delete Stock"},
-        {'method': 'GET', 'api': '/core/capital/', 'func_name': 'capital_get', 'name': "Get Capital List"},
-        {'method': 'POST', 'api': '/core/capital/create/', 'func_name': 'capital_create', 'name': "Create Capital"},
-        {'method': 'POST', 'api': '/core/capital/update/', 'func_name': 'capital_update', 'name': "Update Capital"},
-        {'method': 'POST', 'api': '/core/capital/delete/', 'func_name': 'capital_delete', 'name': "Delete Capital"},
-        {'method': 'GET', 'api': '/core/supplier/', 'func_name': 'supplier_get', 'name': "Get Supplier List"},
-        {'method': 'POST', 'api': '/core/supplier/create/', 'func_name': 'supplier_create', 'name': "Create Supplier"},
-        {'method': 'POST', 'api': '/core/supplier/update/', 'func_name': 'supplier_update', 'name': "Update Supplier"},
-        {'method': 'POST', 'api': '/core/supplier/delete/', 'func_name': 'supplier_delete', 'name': "Delete Supplier"},
-        {'method': 'GET', 'api': '/core/customer/', 'func_name': 'customer_get', 'name': "Get Customer List"},
-        {'method': 'POST', 'api': '/core/customer/create/', 'func_name': 'customer_create', 'name': "Create Customer"},
-        {'method': 'POST', 'api': '/core/customer/update/', 'func_name': 'customer_update', 'name': "Update Customer"},
-        {'method': 'POST', 'api': '/core/customer/delete/', 'func_name': 'customer_delete', 'name': "Delete Customer"},
-        {'method': 'GET', 'api': '/core/asn/', 'func_name': 'asn_get', 'name': "Get ASN List"},
-        {'method': 'POST', 'api': '/core/asn/create/', 'func_name': 'asn_create', 'name': "Create ASN"},
-        {'method': 'POST', 'api': '/core/asn/update/', 'func_name': 'asn_update', 'name': "Update ASN"},
-        {'method': 'POST', 'api': '/core/asn/delete/', 'func_name': 'asn_delete', 'name': "Delete ASN"},
-        {'method': 'GET', 'api': '/core/dn/', 'func_name': 'dn_get', 'name': "Get DN List"},
-        {'method': 'POST', 'api': '/core/dn/create/', 'func_name': 'dn_create', 'name': "Create DN"},
-        {'method': 'POST', 'api': '/core/dn/update/', 'func_name': 'dn_update', 'name': "Update DN"},
-        {'method': 'POST', 'api': '/core/dn/delete/', 'func_name': 'dn_delete', 'name': "Delete DN"},
-        {'method': 'GET', 'api': '/core/purchase/', 'func_name': 'purchase_get', 'name': "Get Purchase List"},
-        {'method': 'POST', 'api': '/core/purchase/create/', 'func_name': 'purchase_create', 'name': "Create Purchase"},
-        {'method': 'POST', 'api': '/core/purchase/update/', 'func_name': 'purchase_update', 'name': "Update Purchase"},
-        {'method': 'POST', 'api': '/core/purchase/delete/', 'func_name': 'purchase_delete', 'name': "Delete Purchase"},
-        {'method': 'GET', 'api': '/core/bar/', 'func_name': 'bar_get', 'name': "Get Bar List"},
-        {'method': 'POST', 'api': '/core/bar/create/', 'func_name': 'bar_create', 'name': "Create Bar"},
-        {'method': 'POST', 'api': '/core/bar/update/', 'func_name': 'bar_update', 'name': "Update Bar"},
-        {'method': 'POST', 'api': '/core/bar/delete/', 'func_name': 'bar_delete', 'name': "Delete Bar"},
-        {'method': 'GET', 'api': '/core/fee/', 'func_name': 'fee_get', 'name': "Get Fee List"},
-        {'method': 'POST', 'api': '/core/fee/create/', 'func_name': 'fee_create', 'name': "Create Fee"},
-        {'method': 'POST', 'api': '/core/fee/update/', 'func_name': 'fee_update', 'name': "Update Fee"},
-        {'method': 'POST', 'api': '/core/fee/delete/', 'func_name': 'fee_delete', 'name': "Delete Fee"},
-        {'method': 'GET', 'api': '/core/driver/', 'func_name': 'driver_get', 'name': "Get Driver List"},
-        {'method': 'POST', 'api': '/core/driver/create/', 'func_name': 'driver_create', 'name': "Create Driver"},
-        {'method': 'POST', 'api': '/core/driver/update/', 'func_name': 'driver_update', 'name': "Update Driver"},
-        {'method': 'POST', 'api': '/core/driver/delete/', 'func_name': 'driver_delete', 'name': "Delete Driver"},
+        {'method': 'GET', 'api': f'{prefix}{name}/', 'func_name': f'{name}_get', 'name': f"Get {label} List"},
+        {'method': 'POST', 'api': f'{prefix}{name}/create/', 'func_name': f'{name}_create', 'name': f"Create {label}"},
+        {'method': 'POST', 'api': f'{prefix}{name}/update/', 'func_name': f'{name}_update', 'name': f"Update {label}"},
+        {'method': 'POST', 'api': f'{prefix}{name}/delete/', 'func_name': f'{name}_delete', 'name': f"Delete {label}"},
     ]
-    api_dict = {api['api']: api for api in api_list}
-    return api_dict.get(data, {})
+    if bulk_prefix:
+        api_list += [
+            {'method': 'POST', 'api': f'{bulk_prefix}{name}/bulk/{mode}/', 'func_name': f'{name}_bulk_{mode}',
+             'name': f"Bulk {mode.capitalize()} {label}"}
+            for mode in ['create', 'update', 'delete']
+        ]
+        api_list.append({'method': 'POST', 'api': f'{bulk_prefix}{name}/patch/', 'func_name': f'{name}_patch',
+                         'name': f"Patch {label}"})
+    if export_prefix:
+        api_list.append({'method': 'GET', 'api': f'{export_prefix}{name}/export/', 'func_name': f'{name}_export',
+                         'name': f"Export {label}"})
+    if import_prefix:
+        api_list.append({'method': 'POST', 'api': f'{import_prefix}{name}/import/', 'func_name': f'{name}_import',
+                         'name': f"Import {label}"})
+    if async_prefix:
+        # same func_name as the sync APIs, so both reach the same receiver functions
+        api_list.append({'method': 'GET', 'api': f'{async_prefix}{name}/', 'func_name': f'{name}_get',
+                         'name': f"Async Get {label} List"})
+        api_list += [
+            {'method': 'POST', 'api': f'{async_prefix}{name}/{mode}/', 'func_name': f'{name}_{mode}',
+             'name': f"Async {mode.capitalize()} {label}"}
+            for mode in ['create', 'update', 'delete']
+        ]
+    return tuple(MappingProxyType({**api, 'resource': name, 'model': model or label}) for api in api_list)
+
+
+RESOURCES = (
+    ('example', 'Example', '/core/', '/wms/', '/wms/', '/wms/', '/wms/'),
+    ('goods', 'Goods'),
+    ('bin', 'Bin'),
+    ('stock', 'Stock'),
+    ('capital', 'Capital'),
+    ('supplier', 'Supplier'),
+    ('customer', 'Customer'),
+    ('asn', 'ASN'),
+    ('dn', 'DN'),
+    ('purchase', 'Purchase'),
+    ('bar', 'Bar'),
+    ('fee', 'Fee'),
+    ('driver', 'Driver'),
+)
+
+API_LIST = tuple(api for item in RESOURCES for api in resource(*item))
+
+API_TABLE = MappingProxyType({api['api']: api for api in API_LIST})
+
+API_METHOD_TABLE = MappingProxyType({(api['method'], api['api']): api for api in API_LIST})
+
+# resource name -> model name
+RESOURCE_TABLE = MappingProxyType({api['resource']: api['model'] for api in API_LIST})
+
+EMPTY_API = MappingProxyType({})
+
 
+def api_return(data, method: str = ''):
+    """
+    Look up the api of a request path, registered paths only
+    :param data: request path
+    :param method: request method, any method when empty
+    :return: read-only api dict, empty when not registered
+    """
+    if method:
+        api_obj = API_METHOD_TABLE.get((method, data))
+    else:
+        api_obj = API_TABLE.get(data)
+    return api_obj or EMPTY_API
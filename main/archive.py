@@ -0,0 +1,233 @@
+import logging
+import time
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from bomiot.server.core import models
+from main.api import RESOURCE_TABLE
+from main.cache import list_cache
+from main.indexes import has_scope_columns, table_columns
+from main.jobs import job_queue, queue_task
+from main.query import QueryError, compile_condition
+from main.wms.models import ARCHIVE_MODELS
+
+
+logger = logging.getLogger(__name__)
+
+VIEW_COLUMNS = ('id', 'project', 'is_delete', 'created_time', 'updated_time', 'data')
+
+
+def closed_rules(value: str) -> dict:
+    """
+    Parse closed = asn:asn_status=5,dn:dn_status=5 into {resource: (data key, value)}
+    """
+    rules = {}
+    for item in value.replace(' ', '').split(','):
+        if not item:
+            continue
+        try:
+            resource, condition = item.split(':', 1)
+            key, status = condition.split('=', 1)
+        except ValueError:
+            raise ValueError(f"Invalid [archive] closed rule '{item}'")
+        if resource not in RESOURCE_TABLE:
+            raise ValueError(f"Unknown resource '{resource}' in [archive] closed")
+        rules[resource] = (key, int(status) if status.lstrip('-').isdigit() else status)
+    return rules
+
+
+class Archive:
+    """
+    Retention of the resource tables
+    Soft deleted rows older than deleted_days, and closed documents older than closed_days,
+    move in batches to wms_archive_<resource>, so the lists and indexes of the resource tables only carry live rows
+    Off by default, the /core/ lists of bomiot only read the resource tables and lose the moved rows
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('archive', 'enable', fallback=False)
+        self.deleted_days = config.getfloat('archive', 'deleted_days', fallback=30)
+        self.closed_days = config.getfloat('archive', 'closed_days', fallback=90)
+        self.closed = closed_rules(config.get('archive', 'closed', fallback='asn:asn_status=5,dn:dn_status=5'))
+        self.batch_size = max(config.getint('archive', 'batch_size', fallback=1000), 1)
+        self.max_batches = max(config.getint('archive', 'max_batches', fallback=100), 1)
+        self.minutes = max(config.getint('archive', 'minutes', fallback=60), 1)
+
+    def policies(self, now) -> list:
+        """
+        (resource, reason, condition) of every row which is due
+        """
+        policies = []
+        for resource in RESOURCE_TABLE:
+            if self.deleted_days >= 0:
+                policies.append((resource, 'deleted', Q(is_delete=True, updated_time__lt=now - timedelta(days=self.deleted_days))))
+            if resource in self.closed and self.closed_days >= 0:
+                key, status = self.closed[resource]
+                model = getattr(models, RESOURCE_TABLE[resource])
+                try:
+                    condition = compile_condition(f'data__{key}', status, connections[router.db_for_write(model)].vendor)
+                except QueryError as e:
+                    raise ValueError(f"Invalid [archive] closed rule for '{resource}': {e}")
+                policies.append((resource, 'closed', Q(is_delete=False, updated_time__lt=now - timedelta(days=self.closed_days)) & condition))
+        return policies
+
+    def move(self, resource: str, reason: str, condition: Q) -> int:
+        """
+        Move one batch, the rows are copied and deleted in one transaction
+        :return: rows moved
+        """
+        model = getattr(models, RESOURCE_TABLE[resource])
+        archive_model = ARCHIVE_MODELS[model.__name__][0]
+        ids = list(model.objects.filter(condition).order_by('id').values_list('id', flat=True)[:self.batch_size])
+        if not ids:
+            return 0
+        with transaction.atomic(using=router.db_for_write(model)):
+            # the condition again, a row changed since the ids were read stays
+            rows = list(model.objects.select_for_update().filter(condition, id__in=ids))
+            archive_model.objects.bulk_create([
+                archive_model(id=row.id, project=row.project, is_delete=row.is_delete, created_time=row.created_time,
+                              updated_time=row.updated_time, data=row.data, scope_department=scope_value(row.data, 'department'),
+                              scope_creater=scope_text(row.data, 'creater'), reason=reason)
+                for row in rows
+            ], batch_size=self.batch_size)
+            model.objects.filter(id__in=[row.id for row in rows]).delete()
+            for project_name in {row.project for row in rows}:
+                transaction.on_commit(lambda project_name=project_name: list_cache.invalidate(resource, project_name))
+        return len(rows)
+
+    def run(self) -> dict:
+        """
+        Move the rows which are due, at most max_batches batches per policy, the next run continues
+        :return: {resource: {reason: rows}}
+        """
+        moved = {}
+        for resource, reason, condition in self.policies(timezone.now()):
+            for _ in range(self.max_batches):
+                start = time.perf_counter()
+                count = self.move(resource, reason, condition)
+                if not count:
+                    break
+                moved.setdefault(resource, {}).setdefault(reason, 0)
+                moved[resource][reason] += count
+                logger.info(f'Archived {count} {reason} {resource} rows in {time.perf_counter() - start:.3f}s')
+                if count < self.batch_size:
+                    break
+        return moved
+
+    def schedule(self) -> None:
+        """
+        Register archive_job with bomiot's scheduler, which runs in the process of the background tasks
+        """
+        if not self.enable:
+            return
+        from bomiot.server.core.signal import bomiot_signals
+        bomiot_signals.send(sender=archive_job, msg={
+            'models': 'JobList',
+            'data': {
+                'trigger': 'interval',
+                'minutes': self.minutes,
+                'description': f'Move soft deleted and closed rows to the archive tables every {self.minutes} minutes'
+            }
+        })
+
+
+def scope_value(data, key: str):
+    # the value the generated integer column of the resource table holds
+    value = data.get(key) if isinstance(data, dict) else None
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def scope_text(data, key: str):
+    value = data.get(key) if isinstance(data, dict) else None
+    return None if value is None else str(value)
+
+
+def view_statements(vendor: str, resource: str, scope: bool) -> list:
+    """
+    DROP and CREATE of the deleted rows view of a resource, its table UNION ALL its archive
+    """
+    table = getattr(models, RESOURCE_TABLE[resource])._meta.db_table
+    columns = ', '.join(f'"{column}"' for column in VIEW_COLUMNS)
+    if scope:
+        columns += ', "scope_department", "scope_creater"'
+    view = f'wms_deleted_{resource}'
+    quote = '`' if vendor == 'mysql' else '"'
+    return [
+        f'DROP VIEW IF EXISTS "{view}"'.replace('"', quote),
+        (f'CREATE VIEW "{view}" AS SELECT {columns} FROM "{table}" WHERE "is_delete" '
+         f'UNION ALL SELECT {columns} FROM "wms_archive_{resource}" WHERE "is_delete"').replace('"', quote),
+    ]
+
+
+def ensure_archive_views(using: str = 'default') -> None:
+    """
+    Create the deleted rows views again, after the scope columns, a rebuilt table leaves a view stale
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for resource, label in RESOURCE_TABLE.items():
+            table = getattr(models, label)._meta.db_table
+            if not table_columns(cursor, connection.vendor, table):
+                continue
+            scope = has_scope_columns(table, using)
+            for statement in view_statements(connection.vendor, resource, scope):
+                cursor.execute(statement)
+
+
+def drop_archive_views(using: str = 'default') -> None:
+    connection = connections[using]
+    quote = '`' if connection.vendor == 'mysql' else '"'
+    with connection.cursor() as cursor:
+        for resource in RESOURCE_TABLE:
+            cursor.execute(f'DROP VIEW IF EXISTS {quote}wms_deleted_{resource}{quote}')
+
+
+def list_model(model, request, is_delete: bool):
+    """
+    Model a list reads, the archive for ?archive=true, the deleted rows view when deleted rows are listed
+    Other lists only read the resource table
+    Only the lists of main read it, /wms/example/ and the exports, bomiot's /core/ lists do not
+    """
+    archive_flag = request.query_params.get('archive', 'false').lower()
+    if archive_flag not in ['true', 'false']:
+        raise QueryError("'archive' must be true or false")
+    models_of = ARCHIVE_MODELS.get(model.__name__)
+    if models_of is None:
+        return model
+    if archive_flag == 'true':
+        return models_of[0]
+    if is_delete:
+        # rows archived before the archive was turned off stay listed
+        return models_of[1]
+    return model
+
+
+@queue_task('archive')
+def run_archive() -> dict:
+    return archive.run()
+
+
+def archive_job(sender=None, **kwargs):
+    """
+    Scheduler entry of the archive, bomiot calls it with the trigger arguments
+    The run goes to the job queue, where a run which is still pending takes it in
+    """
+    if job_queue.offload(run_archive, key='archive'):
+        return
+    try:
+        moved = archive.run()
+    except Exception as e:
+        logger.warning(f'Archive failed: {e}')
+        return
+    if moved:
+        logger.info(f'Archive moved {moved}')
+
+
+archive = Archive(settings.CONFIG)
@@ -0,0 +1,34 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from rest_framework.generics import GenericAPIView
+
+
+class AsyncGenericAPIView(GenericAPIView):
+    """
+    GenericAPIView with async handlers, DRF only dispatches sync views
+    Authentication, permissions and throttles run in one thread hop, the handler is awaited on the event loop
+    Under WSGI django runs the view with async_to_sync
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
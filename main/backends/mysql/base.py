@@ -0,0 +1,8 @@
+from django.db.backends.mysql import base
+from main.pool import PooledDatabaseMixin
+
+
+class DatabaseWrapper(PooledDatabaseMixin, base.DatabaseWrapper):
+    """
+    MySQL with a per process connection pool, see main.database
+    """
@@ -0,0 +1,8 @@
+from django.db.backends.postgresql import base
+from main.pool import PooledDatabaseMixin
+
+
+class DatabaseWrapper(PooledDatabaseMixin, base.DatabaseWrapper):
+    """
+    PostgreSQL with a per process connection pool, see main.database
+    """
@@ -0,0 +1,139 @@
+import re
+import orjson
+
+from datetime import date, datetime, time
+
+
+MAX_BATCH_SIZE = 10000
+
+BATCH_SIZE = 500
+
+
+def split_batch(data, need_id: bool = False) -> tuple:
+    """
+    Split a batch payload into valid records and per-item failures
+    :param data: request data, a list of records
+    :param need_id: records must carry an id
+    :return: (list of (index, record), list of failed results)
+    """
+    if not isinstance(data, list):
+        raise ValueError('Batch data must be a list')
+    if len(data) > MAX_BATCH_SIZE:
+        raise ValueError(f'Batch data can not be more than {MAX_BATCH_SIZE} records')
+    records = []
+    failed = []
+    for index, record in enumerate(data):
+        if not isinstance(record, dict):
+            failed.append(item_result(index, detail='Record must be a JSON object'))
+        elif need_id and not isinstance(record.get('id'), int):
+            failed.append(item_result(index, detail='Record id is required'))
+        else:
+            records.append((index, record))
+    return records, failed
+
+
+def item_result(index: int, record_id=None, detail: str = '') -> dict:
+    if detail:
+        return {'index': index, 'id': record_id, 'status': 'failed', 'detail': detail}
+    return {'index': index, 'id': record_id, 'status': 'success'}
+
+
+def receiver_failed(response, records: list = None) -> dict:
+    """
+    Items rejected by the receiver, {index: detail}
+    The receiver indexes the list it got, with records, the (index, record) pairs it was built from,
+    the positions become the indexes of the payload
+    """
+    failed = response.get('failed', {}) if isinstance(response, dict) else {}
+    failed = {int(index): str(detail) for index, detail in failed.items()}
+    if records is None:
+        return failed
+    return {records[position][0]: detail for position, detail in failed.items() if 0 <= position < len(records)}
+
+
+def batch_response(response: dict, results: list) -> dict:
+    results = sorted(results, key=lambda x: x['index'])
+    return {
+        **{key: value for key, value in response.items() if key != 'failed'},
+        'success': len([i for i in results if i['status'] == 'success']),
+        'failed': len([i for i in results if i['status'] == 'failed']),
+        'results': results
+    }
+
+
+def object_to_dict(obj) -> dict:
+    """
+    Same shape as queryset_to_dict, for an instance which is already loaded
+    """
+    return {
+        **obj.data,
+        'id': obj.id,
+        'created_time': obj.created_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'updated_time': obj.updated_time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+INT_PATTERN = re.compile(r'-?(0|[1-9][0-9]{0,17})')
+
+FLOAT_PATTERN = re.compile(r'-?(0|[1-9][0-9]*)\.[0-9]*[1-9]')
+
+
+def normalize_cell(value, parse_text: bool = False):
+    """
+    Spreadsheet cell to a JSON value, None for an empty cell
+    :param parse_text: csv cells are all text, convert plain numbers and the JSON written by the export
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if parse_text:
+            if INT_PATTERN.fullmatch(value):
+                return int(value)
+            if FLOAT_PATTERN.fullmatch(value):
+                return float(value)
+            if value[0] in '{[' and value[-1] in '}]':
+                try:
+                    return orjson.loads(value)
+                except orjson.JSONDecodeError:
+                    pass
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, datetime):
+        return value.isoformat(' ', 'seconds')
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def normalize_rows(header: list, rows: list, first_row: int, parse_text: bool = False) -> tuple:
+    """
+    Spreadsheet rows to data records, runs in the import process pool so only plain values go in and out
+    Blank rows are skipped
+    :param header: data key of every column, None for an ignored column
+    :param rows: list of cell lists
+    :param first_row: row number of rows[0]
+    :param parse_text: passed to normalize_cell
+    :return: (list of (row, record), list of (row, detail))
+    """
+    records = []
+    failed = []
+    width = len(header)
+    for row_number, row in enumerate(rows, first_row):
+        record = {}
+        for key, value in zip(header, row):
+            if key is None:
+                continue
+            value = normalize_cell(value, parse_text)
+            if value is not None:
+                record[key] = value
+        if len(row) > width and any(normalize_cell(value) is not None for value in row[width:]):
+            failed.append((row_number, 'Row has more cells than the header'))
+        elif record:
+            records.append((row_number, record))
+    return records, failed
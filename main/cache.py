@@ -0,0 +1,241 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import orjson
+
+from collections import OrderedDict
+from os.path import dirname, join
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.module_loading import import_string
+from bomiot.server.core.jwt_auth import parse_payload
+from main.query import QueryError, parse_params
+
+try:
+    import fcntl
+except ImportError:
+    # windows, the desktop runs one process and the counters only need the thread lock
+    fcntl = None
+
+COUNTER = struct.Struct('<Q')
+
+
+def map_file(path: str, size: int) -> tuple:
+    """
+    (fd, mmap) of a file every process of the node maps, grown to size, new bytes read as zeros
+    """
+    os.makedirs(dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    if os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+    return fd, mmap.mmap(fd, size)
+
+
+def key_digest(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+class LRUCache:
+    """
+    In-process LRU with TTL, evicts by entry count and by total bytes
+    """
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 0, ttl: int = 60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value, size = item
+            if expires < time.monotonic():
+                self._pop(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size: int = 0) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if self.max_bytes and size > self.max_bytes:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def _pop(self, key) -> None:
+        expires, value, size = self._data.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._data),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expired': self.expired,
+        }
+
+
+class SharedVersions:
+    """
+    Version counters in a file every process of the node maps, the serve workers and the background tasks
+    A key takes the counter of its hash, keys which share one only clear each other's lists more often
+    """
+    def __init__(self, path: str, slots: int = 4096):
+        self.path = path
+        self.slots = slots
+        self._fd = None
+        self._map = None
+        self._lock = threading.Lock()
+
+    def open(self) -> mmap.mmap:
+        with self._lock:
+            if self._map is None:
+                self._fd, self._map = map_file(self.path, self.slots * COUNTER.size)
+        return self._map
+
+    def get(self, key: str) -> int:
+        counters = self._map or self.open()
+        # an aligned 8 byte read, no lock
+        return COUNTER.unpack_from(counters, key_digest(key) % self.slots * COUNTER.size)[0]
+
+    def incr(self, key: str) -> int:
+        counters = self._map or self.open()
+        offset = key_digest(key) % self.slots * COUNTER.size
+        with self._lock:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, COUNTER.size, offset)
+            try:
+                version = COUNTER.unpack_from(counters, offset)[0] + 1
+                COUNTER.pack_into(counters, offset, version)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, COUNTER.size, offset)
+        return version
+
+
+class ListCache:
+    """
+    Read-through cache of list responses, keyed by
+    (resource, project, department, normalized params, page)
+    Every write of a resource bumps its version after commit, so older keys are never read again
+    The versions are shared by the processes of the node, shared_backend shares them and the entries between nodes
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('cache', 'enable', fallback=True)
+        self.resources = config.get('cache', 'resources', fallback='example,goods,bin,customer,supplier').replace(' ', '').split(',')
+        self.ttl = config.getint('cache', 'ttl', fallback=60)
+        self.local = LRUCache(max_entries=config.getint('cache', 'max_entries', fallback=1000),
+                              max_bytes=config.getint('cache', 'max_bytes', fallback=64 * 1024 * 1024),
+                              ttl=self.ttl)
+        self.shared_backend = config.get('cache', 'shared_backend', fallback='')
+        self.shared_location = config.get('cache', 'shared_location', fallback='')
+        self._shared = None
+        self.versions = SharedVersions(join(settings.WORKING_SPACE, 'dbs', 'cache', 'versions.bin'))
+        self.invalidations = 0
+
+    @property
+    def shared(self):
+        """
+        Optional shared backend, any django cache backend, so every worker sees the same versions
+        """
+        if self._shared is None and self.shared_backend:
+            self._shared = import_string(self.shared_backend)(self.shared_location, {'TIMEOUT': self.ttl})
+        return self._shared
+
+    def version(self, resource: str, project: str) -> int:
+        if self.shared is not None:
+            return self.shared.get(f'wms:list:version:{resource}:{project}', 0)
+        return self.versions.get(f'{resource}:{project}')
+
+    def invalidate(self, resource: str, project: str) -> None:
+        self.invalidations += 1
+        self.versions.incr(f'{resource}:{project}')
+        if self.shared is not None:
+            version_key = f'wms:list:version:{resource}:{project}'
+            if not self.shared.add(version_key, 1, timeout=None):
+                self.shared.incr(version_key)
+
+    def make_key(self, resource: str, project: str, department: int, request) -> str:
+        query = {}
+        for key, value in request.GET.lists():
+            if key == 'params':
+                try:
+                    value = parse_params(value[-1])
+                except QueryError:
+                    pass
+            query[key] = value
+        # the sync and async lists of a resource link to their own path
+        query['path'] = request.path
+        query['accept'] = request.META.get('HTTP_ACCEPT', '')
+        query['language'] = request.META.get('HTTP_LANGUAGE', '')
+        digest = hashlib.sha1(orjson.dumps(query, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return f'wms:list:{resource}:{project}:{self.version(resource, project)}:{department}:{digest}'
+
+    def get(self, key: str):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value, len(value[0]))
+        return value
+
+    def set(self, key: str, value: tuple) -> None:
+        self.local.set(key, value, len(value[0]))
+        if self.shared is not None:
+            self.shared.set(key, value, timeout=self.ttl)
+
+    def user_scope(self, request):
+        """
+        Department of the token owner, None when the token would not pass authentication
+        The user row is read for every list, like bomiot's authentication, so a cached list is never answered
+        to a user who was deactivated, deleted or whose permissions changed since
+        """
+        token = request.META.get('HTTP_TOKEN', '')
+        if not token:
+            return None
+        result = parse_payload(token)
+        if result.get('status') is False:
+            return None
+        user = get_user_model().objects.filter(id=result.get('data', {}).get('id'), is_delete=False,
+                                               is_active=True).values('department', 'permission').first()
+        if not user or sorted((user['permission'] or {}).items()) != sorted(result.get('data', {}).get('permission', {}).items()):
+            return None
+        return user['department']
+
+    def stats(self) -> dict:
+        return {
+            **self.local.stats(),
+            'invalidations': self.invalidations,
+            'shared': bool(self.shared_backend),
+        }
+
+
+list_cache = ListCache(settings.CONFIG)
+
@@ -0,0 +1,160 @@
+import re
+import time
+
+from django.db import connections, router, DEFAULT_DB_ALIAS
+
+
+READ_ALIAS = 'read'
+
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'main.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'main.backends.postgresql',
+    'django.db.backends.mysql': 'main.backends.mysql',
+}
+
+# [database] key: (PRAGMA, accepted values), ints when no values are listed
+SQLITE_PRAGMAS = {
+    'sqlite_journal_mode': ('journal_mode', ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')),
+    'sqlite_synchronous': ('synchronous', ('OFF', 'NORMAL', 'FULL', 'EXTRA')),
+    'sqlite_busy_timeout': ('busy_timeout', ()),
+    'sqlite_cache_size': ('cache_size', ()),
+    'sqlite_mmap_size': ('mmap_size', ()),
+    'sqlite_temp_store': ('temp_store', ('DEFAULT', 'FILE', 'MEMORY')),
+}
+
+SQLITE_DEFAULTS = {
+    'sqlite_journal_mode': 'WAL',
+    'sqlite_synchronous': 'NORMAL',
+    'sqlite_busy_timeout': '60000',
+    'sqlite_cache_size': '-65536',
+    'sqlite_mmap_size': '268435456',
+    'sqlite_temp_store': 'MEMORY',
+}
+
+
+def sqlite_pragmas(config) -> dict:
+    """
+    Validated PRAGMAs of [database], values are written into SQL so only known values pass
+    """
+    pragmas = {}
+    for key, (pragma, choices) in SQLITE_PRAGMAS.items():
+        value = config.get('database', key, fallback=SQLITE_DEFAULTS[key]).strip().upper()
+        if not value:
+            continue
+        if choices and value not in choices:
+            raise ValueError(f'{key} must be one of {", ".join(choices)}')
+        if not choices and not re.fullmatch(r'-?\d+', value):
+            raise ValueError(f'{key} must be an integer')
+        pragmas[pragma] = value
+    return pragmas
+
+
+def configure_databases(databases: dict, config) -> None:
+    """
+    Tune the database settings built by bomiot with the extra keys of [database]
+    The dicts are changed in place, django reads them again on every new connection
+    """
+    default = databases[DEFAULT_DB_ALIAS]
+    statement_timeout = config.getint('database', 'statement_timeout', fallback=0)
+    pool_size = config.getint('database', 'pool_size', fallback=0)
+    default['CONN_MAX_AGE'] = config.getint('database', 'conn_max_age', fallback=60)
+    default['CONN_HEALTH_CHECKS'] = config.getboolean('database', 'conn_health_checks', fallback=True)
+    options = default.setdefault('OPTIONS', {})
+    vendor = default['ENGINE'].rsplit('.', 1)[-1]
+    if vendor == 'sqlite3':
+        default['PRAGMAS'] = sqlite_pragmas(config)
+        default['STATEMENT_TIMEOUT'] = statement_timeout
+        if config.getboolean('database', 'sqlite_read_split', fallback=False):
+            databases[READ_ALIAS] = {
+                **default,
+                'OPTIONS': {**options},
+                'PRAGMAS': {**default['PRAGMAS'], 'query_only': 'ON'},
+                'TEST': {**default.get('TEST', {}), 'MIRROR': DEFAULT_DB_ALIAS},
+            }
+        return
+    if statement_timeout:
+        if vendor.startswith('postgresql') and 'statement_timeout' not in options.get('options', ''):
+            options['options'] = f"{options.get('options', '')} -c statement_timeout={statement_timeout}".strip()
+        elif vendor == 'mysql':
+            options['init_command'] = f'SET SESSION max_execution_time={statement_timeout}'
+    if pool_size > 0 and default['ENGINE'] in POOLED_ENGINES:
+        default['ENGINE'] = POOLED_ENGINES[default['ENGINE']]
+        default['POOL'] = {
+            'size': pool_size,
+            'timeout': config.getfloat('database', 'pool_timeout', fallback=30),
+            'recycle': config.getfloat('database', 'pool_recycle', fallback=3600),
+            'check_idle': config.getfloat('database', 'pool_check_idle', fallback=30),
+        }
+        # every request gives its connection back to the pool when it finishes
+        default['CONN_MAX_AGE'] = 0
+
+
+def reset_connections() -> None:
+    """
+    Drop connections opened before configure_databases, the next query connects with the new settings
+    """
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        del connections[connection.alias]
+    # routers are read once, DATABASE_ROUTERS may have changed
+    router.__dict__.pop('routers', None)
+
+
+class StatementTimeout:
+    """
+    SQLite has no statement timeout, a progress handler interrupts statements which run longer
+    Only the time inside cursor.execute counts, rows fetched later are not limited
+    """
+    def __init__(self, timeout: int):
+        self.timeout = timeout / 1000
+        self.deadline = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.deadline = time.monotonic() + self.timeout
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.deadline = None
+
+    def progress(self) -> int:
+        # non zero interrupts the running statement
+        return int(self.deadline is not None and time.monotonic() > self.deadline)
+
+
+def sqlite_callback(sender, connection, **kwargs):
+    """
+    connection_created receiver, runs the PRAGMAs of the alias on every new SQLite connection
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in connection.settings_dict.get('PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+    timeout = connection.settings_dict.get('STATEMENT_TIMEOUT', 0)
+    if timeout:
+        statement_timeout = getattr(connection, 'statement_timeout', None)
+        if statement_timeout is None:
+            statement_timeout = connection.statement_timeout = StatementTimeout(timeout)
+            connection.execute_wrappers.append(statement_timeout)
+        connection.connection.set_progress_handler(statement_timeout.progress, 10000)
+
+
+class ReadWriteRouter:
+    """
+    SQLite read / write split
+    Reads use the query_only 'read' connection, except inside a transaction on default,
+    so a transaction always reads its own writes
+    """
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
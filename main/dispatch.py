@@ -0,0 +1,178 @@
+import asyncio
+import importlib.util
+import inspect
+import os
+
+from os.path import join
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.dispatch.dispatcher import NO_RECEIVERS
+from bomiot_message import msg_message_return
+from bomiot.server.core.admin import data_callback
+from bomiot.server.core.utils import dynamic_import_and_call
+from main.metrics import signal_timer
+
+
+# run the receivers of one dispatch together instead of one after another
+CONCURRENT_RECEIVERS = settings.CONFIG.getboolean('async', 'concurrent_receivers', fallback=False)
+
+# sync receiver -> its async twin, used by asend_robust
+ASYNC_RECEIVERS = {}
+
+# project file path -> (mtime, module), receiver.py and files.py
+PROJECT_MODULES = {}
+
+
+def async_receiver(receiver):
+    """
+    Register the decorated coroutine function as the async twin of a connected sync receiver
+    asend_robust awaits the twin, send_robust keeps calling the receiver
+    """
+    def decorator(func):
+        ASYNC_RECEIVERS[receiver] = func
+        return func
+    return decorator
+
+
+def project_module(path: str, name: str):
+    """
+    Module of a file of the project, executed again only when the file changed
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = PROJECT_MODULES.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except SyntaxError as e:
+        print(f"'{path}' {e}")
+        return None
+    PROJECT_MODULES[path] = (mtime, module)
+    return module
+
+
+def receiver_module(request):
+    """
+    receiver.py of the request's project
+    """
+    project_name = request.COOKIES.get('project', settings.PROJECT_NAME)
+    if project_name.lower() == 'bomiot':
+        project_name = settings.PROJECT_NAME
+    return project_module(join(settings.WORKING_SPACE, project_name, 'receiver.py'), 'receiver')
+
+
+def receiver_hook(request, method: str):
+    """
+    Function or method of receiver.py named method, looked up in source order like bomiot's receiver_callback
+    A class is instantiated for every call
+    """
+    module = receiver_module(request)
+    if module is None or not method:
+        return None
+    for value in list(vars(module).values()):
+        if getattr(value, '__module__', None) != module.__name__:
+            continue
+        if inspect.isfunction(value) and value.__name__ == method:
+            return value
+        if inspect.isclass(value) and method in vars(value):
+            return getattr(value(), method)
+    return None
+
+
+def default_return(data):
+    """
+    Answer of a dispatch without receiver function, same as bomiot's receiver_callback
+    """
+    mode = data.get('mode')
+    language = data.get('request').META.get('HTTP_LANGUAGE', 'en-US')
+    if mode == 'get':
+        return [
+            ('results', data.get('data')),
+        ]
+    elif mode == 'create':
+        return msg_message_return(language, "Success Create")
+    elif mode == 'update':
+        return msg_message_return(language, "Success Update")
+    elif mode == 'delete':
+        return msg_message_return(language, "Success Delete")
+    return None
+
+
+@async_receiver(data_callback)
+async def data_acallback(**kwargs):
+    """
+    Async twin of bomiot's data_callback
+    async def a<func_name> in receiver.py is awaited first, a plain <func_name> runs in the request thread
+    """
+    request = kwargs.get('request')
+    project_name = request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+    if project_name.lower() == 'bomiot':
+        project_name = settings.PROJECT_NAME
+    api_obj = dynamic_import_and_call(f'{project_name}.api', 'api_return', f'{request.path}')
+    method = api_obj.get('func_name')
+    hook = receiver_hook(request, f'a{method}') if method else None
+    if hook is None:
+        hook = receiver_hook(request, method)
+    if hook is None:
+        return default_return(kwargs)
+    if iscoroutinefunction(hook):
+        return await hook(kwargs)
+    return await sync_to_async(hook)(kwargs)
+
+
+async def call_receiver(receiver, signal, sender, **named):
+    areceiver = ASYNC_RECEIVERS.get(receiver)
+    try:
+        if areceiver is not None:
+            response = await areceiver(signal=signal, sender=sender, **named)
+        elif iscoroutinefunction(receiver):
+            response = await receiver(signal=signal, sender=sender, **named)
+        else:
+            response = await sync_to_async(receiver)(signal=signal, sender=sender, **named)
+    except Exception as err:
+        return receiver, err
+    return receiver, response
+
+
+async def asend_robust(signal, sender, concurrent: bool = None, **named) -> list:
+    """
+    Await send_robust of a signal
+    django 4.2 signals are sync only, the receivers of the signal are awaited here in the order of connection
+    Sync receivers run in the request thread, so on_commit hooks and ORM calls join its transaction
+    Django 5 has Signal.asend_robust, it is used instead and the async twins and concurrent are not applied
+    :param signal: django Signal
+    :param sender: sender of the signal
+    :param concurrent: gather the receivers, CONCURRENT_RECEIVERS when None
+    :return: [(receiver, response or exception)] in the order of connection
+    """
+    if not signal.receivers or signal.sender_receivers_cache.get(sender) is NO_RECEIVERS:
+        return []
+    if hasattr(signal, 'asend_robust'):
+        with signal_timer():
+            return await signal.asend_robust(sender, **named)
+    # django 4.2, _live_receivers returns a list of receivers, django 5 splits it into sync and async ones
+    receivers = signal._live_receivers(sender)
+    if concurrent is None:
+        concurrent = CONCURRENT_RECEIVERS
+    with signal_timer():
+        if concurrent:
+            return list(await asyncio.gather(*(call_receiver(receiver, signal, sender, **named) for receiver in receivers)))
+        return [await call_receiver(receiver, signal, sender, **named) for receiver in receivers]
+
+
+async def run_atomic(afunc, *args, **kwargs):
+    """
+    Await afunc inside transaction.atomic, django 4.2 has no async transactions
+    The block is held by the request thread, the async ORM calls of afunc run on that thread
+    So the thread stays taken for the whole of afunc, receivers awaited in it included, like a sync write
+    """
+    def atomic():
+        with transaction.atomic():
+            return async_to_sync(afunc)(*args, **kwargs)
+    return await sync_to_async(atomic)()
@@ -1,20 +1,25 @@
-import orjson
-
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import transaction
+from django.db import transaction, connection
 from bomiot.server.core import models, serializers, filter
 from bomiot.server.core.signal import bomiot_data_signals
 from bomiot.server.core.permission import NormalPermission
 from rest_framework.filters import OrderingFilter
-from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.exceptions import MethodNotAllowed, ParseError
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from django.conf import settings
-from django.db.models import Q
 from bomiot.server.core.page import DataCorePageNumberPagination
-from bomiot.server.core.utils import all_fields_empty, queryset_to_dict, compare_dicts
+from main.page import DataCoreCursorPagination, DataCoreAsyncPageNumberPagination
+from main.bulk import BATCH_SIZE, split_batch, item_result, receiver_failed, batch_response, object_to_dict
+from bomiot.server.core.utils import queryset_to_dict
+from main.query import QueryError, list_queryset, list_row, list_values, parse_fields
+from main.patch import (VERSION_KEY, VersionConflict, document_changes, locked_versions, patch_rows, record_version,
+                        replace_rows, split_patch)
+from main.asyncview import AsyncGenericAPIView
+from main.dispatch import asend_robust, run_atomic
+from asgiref.sync import sync_to_async
 
 
 class ExampleList(ModelViewSet):
@@ -28,41 +33,23 @@ class ExampleList(ModelViewSet):
     ordering_fields = ["id", "created_time", "updated_time", ]
     filter_class = filter.ExampleFilter
 
-    def get_queryset(self):
-        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
-        if project_name.lower() == 'bomiot':
-            project_name = settings.PROJECT_NAME
-        query_params = self.request.query_params.get('params', '')
-        if query_params:
-            query_str = query_params.replace("'", '"')
-            query_str = query_str.replace("true", "True").replace("false", "False")
-            query_data = orjson.loads(query_str)
-            if all_fields_empty(query_data):
-                query_data = {}
-        else:
-            query_data = {}
-        if "is_delete" not in query_data:
-            query_data['is_delete'] = False
-        if not any(key.startswith('data__department') for key in query_data):
-            query_data = {key: value for key, value in query_data.items() if not key.startswith('data__department')}
-            if self.request.auth.department == 0:
-                department_condition = {"data__department__gte": 0}
+    @property
+    def paginator(self):
+        """
+        Keyset pagination when the request carries a cursor param, page number otherwise
+        """
+        if not hasattr(self, '_paginator'):
+            if DataCoreCursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = DataCoreCursorPagination()
             else:
-                department_condition = {"data__department__gte": self.request.auth.department}
-        else:
-            department_condition = {"data__department__gte": self.request.auth.department}
-        ordering = query_data.pop('order_by', '-id')
-        query_conditions = Q()
-        or_conditions = []
-        if len(query_data) == 1:
-            or_conditions.append(Q(**{**department_condition, "is_delete": query_data['is_delete'], "project": project_name}))
-        else:
-            for key, value in query_data.items():
-                if key != 'is_delete':
-                    or_conditions.append(Q(**{key: value, **department_condition, "is_delete": query_data['is_delete'], "project": project_name}))
-        if or_conditions:
-            query_conditions &= Q(*or_conditions, _connector=Q.OR)
-        return models.Example.objects.filter(query_conditions).order_by(ordering)
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        try:
+            return list_queryset(models.Example, self.request, connection.vendor)
+        except QueryError as e:
+            raise ParseError(str(e))
 
     def get_serializer_class(self):
         if self.action in ['list']:
@@ -71,7 +58,14 @@ class ExampleList(ModelViewSet):
             raise MethodNotAllowed(self.request.method)
         
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        try:
+            fields = parse_fields(request.query_params.get('fields', ''))
+        except QueryError as e:
+            raise ParseError(str(e))
+        # rows as dicts, the serializer is skipped
+        queryset = list_values(self.filter_queryset(self.get_queryset()), fields, connection.vendor)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response([list_row(row, fields) for row in page])
     
 
 class ExampleCreate(ModelViewSet):
@@ -138,7 +132,7 @@ class ExampleUpdate(ModelViewSet):
     queryset = models.Example.objects.filter(is_delete=False)
 
     def get_serializer_class(self):
-        if self.action in ['update']:
+        if self.action in ['update', 'partial_update']:
             return serializers.ExampleSerializer
         else:
             raise MethodNotAllowed(self.request.method)
@@ -153,7 +147,7 @@ class ExampleUpdate(ModelViewSet):
             project_name = settings.PROJECT_NAME
         db_data = models.Example.objects.filter(id=data.get('id'), is_delete=False)
         db_check_data = queryset_to_dict(db_data)
-        updated_fields = compare_dicts(db_check_data[0], data)
+        updated_fields = document_changes(db_check_data[0], data)
         try:
             with transaction.atomic():
                 responses = bomiot_data_signals.send_robust(sender=self.__class__,
@@ -169,13 +163,79 @@ class ExampleUpdate(ModelViewSet):
                         data.pop('is_delete', None)
                         data.pop('created_time', None)
                         data.pop('updated_time', None)
-                        db_data.update(data=data, project=project_name, updated_time=timezone.now())
+                        # a whole document write moves the version on too, so patches based on the old one fail
+                        # and it only holds for the version the updated_fields were compared with
+                        if not replace_rows(db_data, data, record_version(db_check_data[0]), project=project_name, updated_time=timezone.now()):
+                            if not db_data.exists():
+                                raise ValueError('Data not exists')
+                            raise VersionConflict('Data was changed by another request, please reload it')
                         return Response(response)
                     if isinstance(response, dict) and response.get("detail"):
                         return Response(response)
                     if isinstance(response, dict) and response.get("login"):
                         return Response(response)
             return Response(data, status=status.HTTP_201_CREATED)
+        except VersionConflict as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def partial_update(self, request, *args, **kwargs):
+        """
+        Write only the keys sent, a null value removes the key
+        The write only succeeds on the version the client read, with _version in the request the record is not read first
+        """
+        data = self.request.data
+        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        try:
+            record_id, version, changes, removes = split_patch(data)
+            db_data = models.Example.objects.filter(id=record_id, is_delete=False)
+            if version is None:
+                db_check_data = db_data.values_list('data', flat=True).first()
+                if db_check_data is None:
+                    raise ValueError('Data not exists')
+                version = record_version(db_check_data)
+                updated_fields = {key: (db_check_data.get(key), value) for key, value in changes.items()
+                                  if db_check_data.get(key) != value}
+                updated_fields.update({key: (db_check_data[key], None) for key in removes if key in db_check_data})
+            else:
+                # the record is not read, the old values are unknown
+                updated_fields = {key: (None, value) for key, value in changes.items()}
+                updated_fields.update({key: (None, None) for key in removes})
+            with transaction.atomic():
+                responses = bomiot_data_signals.send_robust(sender=self.__class__,
+                                                            request=self.request,
+                                                            mode='update',
+                                                            data=data,
+                                                            updated_fields=updated_fields)
+                for receiver, response in responses:
+                    if isinstance(response, Exception):
+                        raise response
+                    if isinstance(response, dict) and response.get("msg"):
+                        if not patch_rows(db_data, changes, removes, version, project=project_name, updated_time=timezone.now()):
+                            if not db_data.exists():
+                                raise ValueError('Data not exists')
+                            raise VersionConflict('Data was changed by another request, please reload it')
+                        return Response({**response, VERSION_KEY: version + 1})
+                    if isinstance(response, dict) and response.get("detail"):
+                        return Response(response)
+                    if isinstance(response, dict) and response.get("login"):
+                        return Response(response)
+            return Response(data, status=status.HTTP_201_CREATED)
+        except VersionConflict as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
         except ValueError as e:
             with transaction.atomic():
                 transaction.set_rollback(True)
@@ -235,4 +295,390 @@ class ExampleDelete(ModelViewSet):
         except Exception as e:
             with transaction.atomic():
                 transaction.set_rollback(True)
-                return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ExampleBulkCreate(ModelViewSet):
+    """
+    Create a batch of records, one signal dispatch and one transaction per batch
+    """
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ]
+    permission_classes = [NormalPermission, ]
+    ordering_fields = ['id', "created_time", "updated_time", ]
+    filter_class = filter.ExampleFilter
+    queryset = models.Example.objects.filter(is_delete=False)
+
+    def get_serializer_class(self):
+        if self.action in ['create']:
+            return serializers.ExampleSerializer
+        else:
+            raise MethodNotAllowed(self.request.method)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Override the create method, the receiver gets the list of records
+        """
+        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        try:
+            records, results = split_batch(self.request.data)
+            with transaction.atomic():
+                responses = bomiot_data_signals.send_robust(sender=self.__class__,
+                                                            request=self.request,
+                                                            mode='create',
+                                                            data=[record for index, record in records])
+                for receiver, response in responses:
+                    if isinstance(response, Exception):
+                        raise response
+                    if isinstance(response, dict) and response.get("msg"):
+                        failed = receiver_failed(response, records)
+                        objs = []
+                        for index, record in records:
+                            if index in failed:
+                                results.append(item_result(index, detail=failed[index]))
+                                continue
+                            record['department'] = self.request.auth.department if self.request.auth else 0
+                            record['creater'] = self.request.auth.username
+                            objs.append((index, models.Example(data=record, project=project_name)))
+                        models.Example.objects.bulk_create([obj for index, obj in objs], batch_size=BATCH_SIZE)
+                        results += [item_result(index, obj.id) for index, obj in objs]
+                        return Response(batch_response(response, results))
+                    if isinstance(response, dict) and response.get("detail"):
+                        return Response(response)
+                    if isinstance(response, dict) and response.get("login"):
+                        return Response(response)
+            return Response(self.request.data, status=status.HTTP_201_CREATED)
+        except ValueError as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ExampleBulkUpdate(ModelViewSet):
+    """
+    Update a batch of records, one pre-read, one signal dispatch and one transaction per batch
+    """
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ]
+    permission_classes = [NormalPermission, ]
+    ordering_fields = ['id', "created_time", "updated_time", ]
+    filter_class = filter.ExampleFilter
+    queryset = models.Example.objects.filter(is_delete=False)
+
+    def get_serializer_class(self):
+        if self.action in ['update']:
+            return serializers.ExampleSerializer
+        else:
+            raise MethodNotAllowed(self.request.method)
+
+    def update(self, request, *args, **kwargs):
+        """
+        Override the update method, the receiver gets the list of records and their updated_fields
+        """
+        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        try:
+            records, results = split_batch(self.request.data, need_id=True)
+            db_data = models.Example.objects.filter(is_delete=False).in_bulk([record['id'] for index, record in records])
+            checked = []
+            for index, record in records:
+                if record['id'] not in db_data:
+                    results.append(item_result(index, record['id'], 'Data not exists'))
+                else:
+                    checked.append((index, record))
+            updated_fields = [document_changes(object_to_dict(db_data[record['id']]), record) for index, record in checked]
+            with transaction.atomic():
+                responses = bomiot_data_signals.send_robust(sender=self.__class__,
+                                                            request=self.request,
+                                                            mode='update',
+                                                            data=[record for index, record in checked],
+                                                            updated_fields=updated_fields)
+                for receiver, response in responses:
+                    if isinstance(response, Exception):
+                        raise response
+                    if isinstance(response, dict) and response.get("msg"):
+                        failed = receiver_failed(response, checked)
+                        # the records only change when they still have the version of the pre-read
+                        versions = locked_versions(models.Example.objects.filter(id__in=[record['id'] for index, record in checked], is_delete=False))
+                        objs = []
+                        for index, record in checked:
+                            if index in failed:
+                                results.append(item_result(index, record['id'], failed[index]))
+                                continue
+                            obj = db_data[record['id']]
+                            version = record_version(obj.data)
+                            if obj.id not in versions:
+                                results.append(item_result(index, record['id'], 'Data not exists'))
+                                continue
+                            if versions[obj.id] != version:
+                                results.append(item_result(index, record['id'], 'Data was changed by another request, please reload it'))
+                                continue
+                            obj.data = {key: value for key, value in record.items() if key not in ['id', 'is_delete', 'created_time', 'updated_time']}
+                            obj.data[VERSION_KEY] = version + 1
+                            obj.project = project_name
+                            obj.updated_time = timezone.now()
+                            objs.append((index, obj))
+                        models.Example.objects.bulk_update([obj for index, obj in objs], ['data', 'project', 'updated_time'], batch_size=BATCH_SIZE)
+                        results += [item_result(index, obj.id) for index, obj in objs]
+                        return Response(batch_response(response, results))
+                    if isinstance(response, dict) and response.get("detail"):
+                        return Response(response)
+                    if isinstance(response, dict) and response.get("login"):
+                        return Response(response)
+            return Response(self.request.data, status=status.HTTP_201_CREATED)
+        except ValueError as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ExampleBulkDelete(ModelViewSet):
+    """
+    Delete a batch of records, one signal dispatch and one UPDATE per batch
+    """
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ]
+    permission_classes = [NormalPermission, ]
+    ordering_fields = ['id', "created_time", "updated_time", ]
+    filter_class = filter.ExampleFilter
+    queryset = models.Example.objects.filter(is_delete=False)
+
+    def get_serializer_class(self):
+        if self.action in ['delete']:
+            return serializers.ExampleSerializer
+        else:
+            raise MethodNotAllowed(self.request.method)
+
+    def delete(self, request, *args, **kwargs):
+        """
+        Override the delete method, the receiver gets the list of records
+        """
+        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        try:
+            records, results = split_batch(self.request.data, need_id=True)
+            db_ids = set(models.Example.objects.filter(id__in=[record['id'] for index, record in records],
+                                                       is_delete=False).values_list('id', flat=True))
+            checked = []
+            for index, record in records:
+                if record['id'] not in db_ids:
+                    results.append(item_result(index, record['id'], 'Data not exists'))
+                else:
+                    checked.append((index, record))
+            with transaction.atomic():
+                responses = bomiot_data_signals.send_robust(sender=self.__class__,
+                                                            request=self.request,
+                                                            mode='delete',
+                                                            data=[record for index, record in checked])
+                for receiver, response in responses:
+                    if isinstance(response, Exception):
+                        raise response
+                    if isinstance(response, dict) and response.get("msg"):
+                        failed = receiver_failed(response, checked)
+                        deleted = []
+                        for index, record in checked:
+                            if index in failed:
+                                results.append(item_result(index, record['id'], failed[index]))
+                            else:
+                                deleted.append((index, record['id']))
+                        models.Example.objects.filter(id__in=[record_id for index, record_id in deleted]).update(
+                            project=project_name, is_delete=True, updated_time=timezone.now())
+                        results += [item_result(index, record_id) for index, record_id in deleted]
+                        return Response(batch_response(response, results))
+                    if isinstance(response, dict) and response.get("detail"):
+                        return Response(response)
+                    if isinstance(response, dict) and response.get("login"):
+                        return Response(response)
+            return Response(self.request.data, status=status.HTTP_201_CREATED)
+        except ValueError as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            with transaction.atomic():
+                transaction.set_rollback(True)
+                return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncExampleList(AsyncGenericAPIView):
+    """
+        get:
+            Response a example data list（all）, awaited on the event loop under ASGI
+    """
+    pagination_class = DataCoreAsyncPageNumberPagination
+    permission_classes = [NormalPermission, ]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ]
+    ordering_fields = ["id", "created_time", "updated_time", ]
+    filter_class = filter.ExampleFilter
+    serializer_class = serializers.ExampleSerializer
+
+    @property
+    def paginator(self):
+        """
+        Keyset pagination when the request carries a cursor param, page number otherwise
+        """
+        if not hasattr(self, '_paginator'):
+            if DataCoreCursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = DataCoreCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        try:
+            return list_queryset(models.Example, self.request, connection.vendor)
+        except QueryError as e:
+            raise ParseError(str(e))
+
+    def values_queryset(self, fields: list):
+        """
+        Built off the event loop, the first list of a process looks the scope columns of the table up in the database
+        """
+        return list_values(self.filter_queryset(self.get_queryset()), fields, connection.vendor)
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            fields = parse_fields(request.query_params.get('fields', ''))
+        except QueryError as e:
+            raise ParseError(str(e))
+        queryset = await sync_to_async(self.values_queryset)(fields)
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        return await self.paginator.aget_paginated_response([list_row(row, fields) for row in page])
+
+
+class AsyncExampleCreate(AsyncGenericAPIView):
+    """
+    ExampleCreate awaited on the event loop, the signal dispatch and the write share one transaction
+    """
+    permission_classes = [NormalPermission, ]
+    serializer_class = serializers.ExampleSerializer
+
+    async def post(self, request, *args, **kwargs):
+        data = self.request.data
+        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        try:
+            return await run_atomic(self.perform_create, data, project_name)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def perform_create(self, data, project_name):
+        responses = await asend_robust(bomiot_data_signals, sender=self.__class__,
+                                       request=self.request,
+                                       mode='create',
+                                       data=data)
+        for receiver, response in responses:
+            if isinstance(response, Exception):
+                raise response
+            if isinstance(response, dict) and response.get("msg"):
+                data['department'] = self.request.auth.department if self.request.auth else 0
+                data['creater'] = self.request.auth.username
+                await models.Example.objects.acreate(data=data, project=project_name)
+                return Response(response)
+            if isinstance(response, dict) and response.get("detail"):
+                return Response(response)
+            if isinstance(response, dict) and response.get("login"):
+                return Response(response)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class AsyncExampleUpdate(AsyncGenericAPIView):
+    """
+    ExampleUpdate awaited on the event loop, the signal dispatch and the write share one transaction
+    """
+    permission_classes = [NormalPermission, ]
+    serializer_class = serializers.ExampleSerializer
+
+    async def post(self, request, *args, **kwargs):
+        data = self.request.data
+        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        db_data = models.Example.objects.filter(id=data.get('id'), is_delete=False)
+        try:
+            db_check_data = await sync_to_async(queryset_to_dict)(db_data)
+            if not db_check_data:
+                raise ValueError('Data not exists')
+            updated_fields = document_changes(db_check_data[0], data)
+            return await run_atomic(self.perform_update, data, project_name, db_data, db_check_data[0], updated_fields)
+        except VersionConflict as e:
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def perform_update(self, data, project_name, db_data, db_check_data, updated_fields):
+        responses = await asend_robust(bomiot_data_signals, sender=self.__class__,
+                                       request=self.request,
+                                       mode='update',
+                                       data=data,
+                                       updated_fields=updated_fields)
+        for receiver, response in responses:
+            if isinstance(response, Exception):
+                raise response
+            if isinstance(response, dict) and response.get("msg"):
+                data.pop('id', None)
+                data.pop('is_delete', None)
+                data.pop('created_time', None)
+                data.pop('updated_time', None)
+                if not await sync_to_async(replace_rows)(db_data, data, record_version(db_check_data), project=project_name, updated_time=timezone.now()):
+                    if not await db_data.aexists():
+                        raise ValueError('Data not exists')
+                    raise VersionConflict('Data was changed by another request, please reload it')
+                return Response(response)
+            if isinstance(response, dict) and response.get("detail"):
+                return Response(response)
+            if isinstance(response, dict) and response.get("login"):
+                return Response(response)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class AsyncExampleDelete(AsyncGenericAPIView):
+    """
+    ExampleDelete awaited on the event loop, the signal dispatch and the write share one transaction
+    """
+    permission_classes = [NormalPermission, ]
+    serializer_class = serializers.ExampleSerializer
+
+    async def post(self, request, *args, **kwargs):
+        data = self.request.data
+        project_name = self.request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        db_data = models.Example.objects.filter(id=data.get('id'), is_delete=False)
+        try:
+            return await run_atomic(self.perform_destroy, data, project_name, db_data)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"detail": f"An unexpected error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def perform_destroy(self, data, project_name, db_data):
+        responses = await asend_robust(bomiot_data_signals, sender=self.__class__,
+                                       request=self.request,
+                                       mode='delete',
+                                       data=data)
+        for receiver, response in responses:
+            if isinstance(response, Exception):
+                raise response
+            if isinstance(response, dict) and response.get("msg"):
+                await db_data.aupdate(project=project_name, is_delete=True, updated_time=timezone.now())
+                return Response(response)
+            if isinstance(response, dict) and response.get("detail"):
+                return Response(response)
+            if isinstance(response, dict) and response.get("login"):
+                return Response(response)
+        return Response(data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,167 @@
+import csv
+import tempfile
+import orjson
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+CHUNK_SIZE = 2000
+
+FILE_BLOCK_SIZE = 64 * 1024
+
+# one row is the header
+XLSX_MAX_ROWS = 1048575
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+BASE_COLUMNS = ('id', 'created_time', 'updated_time')
+
+
+def data_keys(queryset) -> list:
+    """
+    Keys of the data JSON over every row of the queryset, the keys of the first row keep their order
+    The distinct keys are computed by the database on SQLite and PostgreSQL
+    """
+    first = queryset.values_list('data', flat=True).first()
+    if first is None:
+        return []
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    sub_sql, sub_params = queryset.values('id').order_by().query.sql_with_params()
+    if connection.vendor == 'sqlite':
+        sql = f'SELECT DISTINCT j.key FROM {table} AS t, json_each(t.data) AS j WHERE t.id IN ({sub_sql})'
+    elif connection.vendor == 'postgresql':
+        sql = f'SELECT DISTINCT jsonb_object_keys(data) FROM {table} WHERE id IN ({sub_sql})'
+    else:
+        sql = ''
+    if sql:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, sub_params)
+            keys = {row[0] for row in cursor.fetchall()}
+    else:
+        keys = set()
+        for data in queryset.values_list('data', flat=True).order_by().iterator(chunk_size=CHUNK_SIZE):
+            keys.update(data or {})
+    ordered = [key for key in first if key in keys]
+    ordered += sorted(keys.difference(ordered))
+    return [key for key in ordered if key not in BASE_COLUMNS]
+
+
+def cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    return value
+
+
+def export_time(value) -> str:
+    # same text as '%Y-%m-%d %H:%M:%S', isoformat is several times faster than strftime
+    if timezone.is_aware(value):
+        value = timezone.localtime(value).replace(tzinfo=None)
+    return value.isoformat(' ', 'seconds')
+
+
+def export_rows(queryset, keys: list):
+    """
+    Flattened rows, same columns as the list results: data keys, id, created_time, updated_time
+    Rows are read with a database cursor in chunks, no model instances are built
+    """
+    rows = queryset.values_list('id', 'data', 'created_time', 'updated_time').iterator(chunk_size=CHUNK_SIZE)
+    for record_id, data, created_time, updated_time in rows:
+        data = data or {}
+        yield [cell(data.get(key)) for key in keys] + [record_id, export_time(created_time), export_time(updated_time)]
+
+
+class Echo:
+    """
+    File-like object for csv.writer, returns the line instead of storing it
+    """
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header: list, rows):
+    """
+    Encoded csv, one chunk per CHUNK_SIZE rows, starts with a BOM so spreadsheet apps read utf-8
+    """
+    writer = csv.writer(Echo())
+    chunk = ['\ufeff', writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+
+def xlsx_chunks(header: list, rows):
+    """
+    Workbook written in constant memory mode to a temporary file, then read back in blocks
+    A new sheet starts every XLSX_MAX_ROWS rows
+    """
+    # imported by the first xlsx export, a worker which only serves csv does not load it
+    import xlsxwriter
+    with tempfile.TemporaryFile() as file:
+        workbook = xlsxwriter.Workbook(file, {'constant_memory': True, 'strings_to_numbers': False,
+                                             'strings_to_formulas': False, 'strings_to_urls': False})
+        worksheet = None
+        row_index = XLSX_MAX_ROWS
+        for row in rows:
+            if row_index >= XLSX_MAX_ROWS:
+                worksheet = workbook.add_worksheet()
+                worksheet.write_row(0, 0, header)
+                row_index = 0
+            row_index += 1
+            worksheet.write_row(row_index, 0, row)
+        if worksheet is None:
+            workbook.add_worksheet().write_row(0, 0, header)
+        workbook.close()
+        file.seek(0)
+        while True:
+            block = file.read(FILE_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+async def async_chunks(chunks):
+    """
+    Pull the chunks in the request thread, so the database cursor stays on its connection
+    django serves a sync iterator under ASGI only after reading all of it into a list
+    """
+    pull = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await pull(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def export_response(request, queryset, file_type: str, filename: str) -> StreamingHttpResponse:
+    """
+    :param request: DRF request
+    :param queryset: scoped and ordered queryset
+    :param file_type: csv or xlsx
+    :param filename: file name without extension
+    """
+    keys = data_keys(queryset)
+    header = keys + list(BASE_COLUMNS)
+    rows = export_rows(queryset, keys)
+    chunks = csv_chunks(header, rows) if file_type == 'csv' else xlsx_chunks(header, rows)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[file_type])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_type}"'
+    return response
@@ -0,0 +1,4 @@
+# class FileClass:
+#     def file_get(self, data):
+#         for file_data in data:
+#             print(file_data.get('event'), file_data.get('owner'), file_data.get('name'))
@@ -0,0 +1,65 @@
+import os
+import time
+import psutil
+
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from main.pool import pool_stats
+
+
+STARTED = psutil.Process(os.getpid()).create_time()
+
+# aliases whose migrations were all applied, checked once per worker
+_migrated = set()
+
+
+def liveness() -> dict:
+    """
+    This worker answers, no database access
+    """
+    return {
+        'status': 'ok',
+        'pid': os.getpid(),
+        'uptime': round(time.time() - STARTED, 3)
+    }
+
+
+def database_check(using: str = 'default') -> str:
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except Exception as e:
+        return str(e)
+    return 'ok'
+
+
+def migration_check(using: str = 'default') -> str:
+    if using in _migrated:
+        return 'ok'
+    try:
+        executor = MigrationExecutor(connections[using])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    except Exception as e:
+        return str(e)
+    if plan:
+        return f'{len(plan)} migrations not applied'
+    _migrated.add(using)
+    return 'ok'
+
+
+def readiness(using: str = 'default') -> tuple:
+    """
+    This worker can take traffic, the database answers and the schema is current
+    :return: (ready, response data)
+    """
+    checks = {'database': database_check(using)}
+    if checks['database'] == 'ok':
+        checks['migrations'] = migration_check(using)
+    ready = all(value == 'ok' for value in checks.values())
+    return ready, {
+        **liveness(),
+        'status': 'ready' if ready else 'unavailable',
+        'checks': checks,
+        'pools': pool_stats()
+    }
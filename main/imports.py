@@ -0,0 +1,381 @@
+import codecs
+import csv
+import os
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+from multiprocessing import get_context
+from os.path import basename, exists, getmtime, getsize, join
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils import timezone
+from bomiot.server.core import models
+from bomiot.server.core.signal import bomiot_data_signals
+from main.api import API_LIST, RESOURCE_TABLE
+from main.bulk import BATCH_SIZE, normalize_rows, receiver_failed
+from main.cache import list_cache
+from main.export import BASE_COLUMNS
+from main.jobs import job_queue
+from main.patch import VERSION_KEY
+from main.wms.models import ImportJob
+
+
+class ImportFileError(ValueError):
+    """
+    Raised when a file can not be imported, the message is shown to the user
+    """
+    pass
+
+
+IMPORT_TYPES = ('csv', 'xlsx')
+
+# columns the import sets itself, an exported file imports again as new rows
+IGNORED_COLUMNS = set(BASE_COLUMNS) | {'is_delete', 'department', 'creater', VERSION_KEY}
+
+RESUMABLE = ('pending', 'failed')
+
+CHUNK_SIZE = settings.CONFIG.getint('import', 'chunk_size', fallback=5000)
+
+MAX_ERRORS = settings.CONFIG.getint('import', 'max_errors', fallback=1000)
+
+STALE_SECONDS = settings.CONFIG.getint('import', 'stale_seconds', fallback=120)
+
+IMPORT_PATHS = {api['resource']: api['api'] for api in API_LIST if api['func_name'] == f"{api['resource']}_import"}
+
+
+def import_workers() -> int:
+    """
+    Processes which normalize rows, one core is left to the thread which writes
+    """
+    workers = settings.CONFIG.getint('import', 'workers', fallback=0)
+    if workers > 0:
+        return workers
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus - 1, 8))
+
+
+def text_encoding(path: str) -> str:
+    """
+    utf-8 with or without BOM, else gb18030 which spreadsheet apps on Chinese Windows save
+    """
+    with open(path, 'rb') as f:
+        head = f.read(64 * 1024)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return 'gb18030'
+    return 'utf-8-sig'
+
+
+def csv_chunks(path: str, chunk_size: int):
+    """
+    (header, rows) of a csv file, chunk_size rows at a time
+    """
+    with open(path, newline='', encoding=text_encoding(path)) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            yield header, rows
+
+
+def xlsx_chunks(path: str, chunk_size: int):
+    """
+    (header, rows) of every sheet of a xlsx file, chunk_size rows at a time
+    The workbook is read in read-only mode, rows are parsed as they are read
+    """
+    # imported by the first xlsx import, a worker which only reads csv does not load it
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            reader = worksheet.iter_rows(values_only=True)
+            header = next(reader, None)
+            if header is None:
+                continue
+            while True:
+                rows = list(islice(reader, chunk_size))
+                if not rows:
+                    break
+                yield header, rows
+    finally:
+        workbook.close()
+
+
+def file_chunks(path: str, file_type: str, chunk_size: int):
+    if file_type == 'csv':
+        return csv_chunks(path, chunk_size)
+    return xlsx_chunks(path, chunk_size)
+
+
+def estimate_rows(path: str, file_type: str) -> int:
+    """
+    Data rows for the progress, line count of a csv, sheet dimensions of a xlsx
+    """
+    if file_type == 'csv':
+        lines = 0
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                lines += block.count(b'\n')
+        return max(lines - 1, 0)
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return sum(max((worksheet.max_row or 1) - 1, 0) for worksheet in workbook.worksheets)
+    finally:
+        workbook.close()
+
+
+def data_header(header) -> list:
+    """
+    Data key of every column, None for empty and ignored columns
+    """
+    keys = []
+    for name in header:
+        name = '' if name is None else str(name).strip()
+        if not name or name in IGNORED_COLUMNS:
+            keys.append(None)
+        elif name in keys:
+            raise ImportFileError(f"Duplicate column '{name}'")
+        else:
+            keys.append(name)
+    if not any(keys):
+        raise ImportFileError('No data column in the header')
+    return keys
+
+
+def create_job(resource: str, request, file_name: str) -> ImportJob:
+    """
+    New import job of a file in the media folder of the user
+    """
+    name = basename(str(file_name or ''))
+    if not name or name != file_name:
+        raise ImportFileError('Invalid file name')
+    file_type = name.rsplit('.', 1)[-1].lower()
+    if file_type not in IMPORT_TYPES:
+        raise ImportFileError(f"File type must be one of {', '.join(IMPORT_TYPES)}")
+    path = join(settings.MEDIA_ROOT, request.auth.username, name)
+    if not exists(path):
+        raise ImportFileError('File not exists')
+    project_name = request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+    if project_name.lower() == 'bomiot':
+        project_name = settings.PROJECT_NAME
+    return ImportJob.objects.create(
+        resource=resource,
+        file_name=name,
+        file_path=path,
+        file_type=file_type,
+        file_size=getsize(path),
+        file_mtime=getmtime(path),
+        project=project_name,
+        creater=request.auth.username,
+        department=request.auth.department or 0,
+        language=request.META.get('HTTP_LANGUAGE', 'en-US'),
+        total=estimate_rows(path, file_type)
+    )
+
+
+def job_to_dict(job: ImportJob, errors: bool = False) -> dict:
+    progress = 100.0 if job.status == 'done' else round(min(job.rows_done / job.total * 100, 99.9), 1) if job.total else 0.0
+    data = {
+        'id': job.id,
+        'resource': job.resource,
+        'file_name': job.file_name,
+        'status': job.status,
+        'total': job.total,
+        'rows_done': job.rows_done,
+        'created': job.created,
+        'failed': job.failed,
+        'progress': progress,
+        'rows_per_second': round(job.rows_done / job.seconds) if job.seconds else 0,
+        'detail': job.detail,
+        'creater': job.creater,
+        'created_time': job.created_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'updated_time': job.updated_time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if errors:
+        data['errors'] = job.errors
+    return data
+
+
+class ImportRequest:
+    """
+    Stands in for the HTTP request in the signals of an import, which runs after the request returned
+    Carries what the receivers read: path, META, COOKIES, auth / user
+    """
+    method = 'POST'
+
+    def __init__(self, job: ImportJob, user):
+        self.path = IMPORT_PATHS[job.resource]
+        self.META = {'HTTP_PROJECT': job.project, 'HTTP_LANGUAGE': job.language}
+        self.COOKIES = {}
+        self.GET = self.query_params = QueryDict()
+        self.user = self.auth = user
+
+
+class InlineExecutor:
+    """
+    Runs the call at once, a file of one chunk is not worth starting processes
+    """
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        pass
+
+
+def claim_job(job_id: int) -> bool:
+    """
+    Mark the job running, a running job whose heartbeat stopped can be claimed again
+    """
+    stale = timezone.now() - timedelta(seconds=STALE_SECONDS)
+    return ImportJob.objects.filter(Q(status__in=RESUMABLE) | Q(status='running', updated_time__lt=stale),
+                                    id=job_id).update(status='running', detail='', updated_time=timezone.now()) == 1
+
+
+def start_import(job_id: int) -> bool:
+    """
+    Queue the job on the imports queue, or claim it and run it in a thread of this worker when [queue] is disabled
+    :return: False when the job is done or runs somewhere else
+    """
+    if job_queue.enable:
+        stale = timezone.now() - timedelta(seconds=STALE_SECONDS)
+        if not ImportJob.objects.filter(Q(status__in=RESUMABLE) | Q(status='running', updated_time__lt=stale), id=job_id).exists():
+            return False
+        # a second start of the job while it waits is the same queue job
+        job_queue.submit(queued_import, [job_id], queue='imports', key=f'import:{job_id}', max_attempts=1)
+        return True
+    if not claim_job(job_id):
+        return False
+    threading.Thread(target=run_import, args=(job_id,), name=f'import-{job_id}', daemon=True).start()
+    return True
+
+
+def queued_import(job_id: int) -> None:
+    # the queue job of an import, failures are recorded on the import job which resumes from its checkpoint
+    if claim_job(job_id):
+        run_import(job_id)
+
+
+def signal_response(responses) -> dict:
+    """
+    Response of the receiver which accepted the rows, raises ImportFileError with the reason otherwise
+    """
+    for receiver, response in responses:
+        if isinstance(response, Exception):
+            raise response
+        if isinstance(response, dict) and response.get('msg'):
+            return response
+        if isinstance(response, dict) and response.get('detail'):
+            raise ImportFileError(str(response['detail']))
+        if isinstance(response, dict) and response.get('login'):
+            raise ImportFileError(str(response['login']))
+    raise ImportFileError('No receiver accepted the rows')
+
+
+def write_chunk(job: ImportJob, request: ImportRequest, model, records: list, failed: list, last_row: int) -> None:
+    """
+    One signal dispatch, bulk_create and the checkpoint of a chunk in one transaction
+    """
+    with transaction.atomic():
+        if records:
+            response = signal_response(bomiot_data_signals.send_robust(sender=ImportJob,
+                                                                       request=request,
+                                                                       mode='create',
+                                                                       data=[record for row, record in records]))
+            rejected = receiver_failed(response)
+            objs = []
+            for index, (row, record) in enumerate(records):
+                if index in rejected:
+                    failed.append((row, rejected[index]))
+                    continue
+                record['department'] = job.department
+                record['creater'] = job.creater
+                objs.append(model(data=record, project=job.project))
+            model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+            job.created += len(objs)
+            if objs:
+                transaction.on_commit(lambda: list_cache.invalidate(job.resource, job.project))
+        room = MAX_ERRORS - len(job.errors)
+        if failed and room > 0:
+            job.errors += [{'row': row, 'detail': detail} for row, detail in sorted(failed)[:room]]
+        job.failed += len(failed)
+        job.rows_done = last_row
+        job.save(update_fields=['rows_done', 'created', 'failed', 'errors', 'seconds', 'updated_time'])
+
+
+def run_import(job_id: int) -> None:
+    """
+    Read the file in chunks, normalize them in a process pool and write them in order
+    Chunks before the checkpoint are read again but not written, so a failed or interrupted job resumes
+    Row numbers count data rows from 1, the header rows are not counted
+    """
+    job = ImportJob.objects.get(id=job_id)
+    started = time.monotonic()
+    seconds = job.seconds
+    executor = InlineExecutor()
+    try:
+        if not exists(job.file_path) or getsize(job.file_path) != job.file_size or getmtime(job.file_path) != job.file_mtime:
+            raise ImportFileError('File changed since the import started')
+        user = get_user_model().objects.filter(username=job.creater).first()
+        request = ImportRequest(job, user)
+        model = getattr(models, RESOURCE_TABLE[job.resource])
+        workers = import_workers()
+        if workers > 1 and job.total - job.rows_done > CHUNK_SIZE:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+        parse_text = job.file_type == 'csv'
+        pending = deque()
+        header = keys = None
+        read = 0
+        touched = started
+        for chunk_header, rows in file_chunks(job.file_path, job.file_type, CHUNK_SIZE):
+            first_row = read + 1
+            read += len(rows)
+            if read <= job.rows_done:
+                # nothing is written while skipping, keep the heartbeat so the job is not claimed again
+                if time.monotonic() - touched > STALE_SECONDS / 4:
+                    touched = time.monotonic()
+                    ImportJob.objects.filter(id=job.id).update(updated_time=timezone.now())
+                continue
+            if first_row <= job.rows_done:
+                rows = rows[job.rows_done - first_row + 1:]
+                first_row = job.rows_done + 1
+            if chunk_header is not header:
+                header, keys = chunk_header, data_header(chunk_header)
+            pending.append((read, executor.submit(normalize_rows, keys, rows, first_row, parse_text)))
+            # keep every process busy while the oldest chunk is written
+            while len(pending) > workers:
+                last_row, future = pending.popleft()
+                job.seconds = seconds + time.monotonic() - started
+                write_chunk(job, request, model, *future.result(), last_row)
+        while pending:
+            last_row, future = pending.popleft()
+            job.seconds = seconds + time.monotonic() - started
+            write_chunk(job, request, model, *future.result(), last_row)
+        job.status = 'done'
+        job.total = max(job.total, job.rows_done)
+    except Exception as e:
+        job.status = 'failed'
+        job.detail = str(e)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        job.seconds = seconds + time.monotonic() - started
+        ImportJob.objects.filter(id=job.id).update(status=job.status, detail=job.detail, total=job.total,
+                                                   seconds=job.seconds, updated_time=timezone.now())
+        connections.close_all()
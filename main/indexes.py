@@ -0,0 +1,260 @@
+import re
+import sqlite3
+
+from django.db import connections
+from bomiot.server.core import models
+from bomiot.server.core.models import Example
+from main.api import RESOURCE_TABLE
+
+
+INDEX_PREFIX = 'wms_json_'
+
+SCOPE_PREFIX = 'wms_scope_'
+
+SCOPE_COLUMN_PREFIX = 'scope_'
+
+SQL_TYPES = {
+    'sqlite': {'text': 'TEXT', 'int': 'INTEGER', 'number': 'REAL'},
+    'postgresql': {'text': 'text', 'int': 'bigint', 'number': 'double precision'},
+}
+
+KEY_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+PG_CASTS = {
+    'text': '',
+    'int': '::bigint',
+    'number': '::double precision',
+}
+
+
+class JsonIndex:
+    """
+    A hot JSON path of Example.data which gets an expression index
+    """
+    def __init__(self, key: str, type: str = 'text'):
+        if not KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid json index key '{key}'")
+        if type not in PG_CASTS:
+            raise ValueError(f"Unsupported json index type '{type}'")
+        self.key = key
+        self.type = type
+
+    @property
+    def name(self) -> str:
+        return f'{INDEX_PREFIX}{self.key}'
+
+    def expression(self, vendor: str, column: str = 'data') -> str:
+        """
+        SQL expression of the path, the query compiler renders exactly the same text
+        :param vendor: database vendor
+        :param column: quoted json column
+        :return: SQL expression
+        """
+        if vendor == 'sqlite':
+            return f"JSON_EXTRACT({column}, '$.{self.key}')"
+        if vendor == 'postgresql':
+            return f"(({column} ->> '{self.key}'){PG_CASTS[self.type]})"
+        return ''
+
+
+def json_index_list() -> list:
+    """
+    Declare the hot JSON paths here, one JsonIndex per data__<key> filter that lists use
+    The declared type must hold for every row, text paths are compared as strings
+    """
+    return [
+        JsonIndex('department', 'int'),
+        JsonIndex('creater'),
+        JsonIndex('goods_code'),
+        JsonIndex('goods_name'),
+        JsonIndex('bin_name'),
+        JsonIndex('asn_code'),
+        JsonIndex('dn_code'),
+        JsonIndex('supplier'),
+        JsonIndex('customer'),
+    ]
+
+
+JSON_INDEXES = {index.key: index for index in json_index_list()}
+
+
+def hot_path(key: str):
+    return JSON_INDEXES.get(key)
+
+
+def index_statements(vendor: str) -> list:
+    """
+    CREATE INDEX statements for every declared path
+    :param vendor: database vendor
+    :return: list of SQL
+    """
+    table = Example._meta.db_table
+    statements = []
+    for index in JSON_INDEXES.values():
+        expression = index.expression(vendor)
+        if not expression:
+            continue
+        statements.append(
+            f'CREATE INDEX IF NOT EXISTS "{index.name}" ON "{table}" ("project", {expression})'
+        )
+    return statements
+
+
+def existing_indexes(cursor, vendor: str) -> list:
+    table = Example._meta.db_table
+    if vendor == 'sqlite':
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s", [table])
+    elif vendor == 'postgresql':
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+    else:
+        return []
+    return [row[0] for row in cursor.fetchall() if row[0].startswith(INDEX_PREFIX)]
+
+
+def ensure_json_indexes(using: str = 'default') -> None:
+    """
+    Create declared indexes and drop the ones which are not declared any more
+    :param using: database alias
+    """
+    connection = connections[using]
+    vendor = connection.vendor
+    if vendor not in ['sqlite', 'postgresql']:
+        return
+    with connection.cursor() as cursor:
+        declared = [index.name for index in JSON_INDEXES.values()]
+        existing = existing_indexes(cursor, vendor)
+        for name in existing:
+            if name not in declared:
+                cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+        for statement in index_statements(vendor):
+            cursor.execute(statement)
+        if set(declared).difference(existing):
+            # refresh planner statistics so new indexes get picked
+            cursor.execute(f'ANALYZE "{Example._meta.db_table}"')
+
+
+def scope_column_list() -> list:
+    """
+    data keys every list is scoped by, materialized as generated columns of the resource tables
+    The database computes them on every insert and update, bomiot's own writes included
+    """
+    return [
+        JsonIndex('department', 'int'),
+        JsonIndex('creater'),
+    ]
+
+
+SCOPE_COLUMNS = {index.key: index for index in scope_column_list()}
+
+# (database alias, table) -> the scope columns exist
+SCOPE_TABLES = {}
+
+
+def scope_column(key: str) -> str:
+    return f'{SCOPE_COLUMN_PREFIX}{key}'
+
+
+def scope_supported(vendor: str) -> bool:
+    # sqlite adds generated columns since 3.31
+    if vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 31, 0)
+    return vendor == 'postgresql'
+
+
+def scope_tables() -> list:
+    return [getattr(models, label)._meta.db_table for label in RESOURCE_TABLE.values()]
+
+
+def scope_statements(vendor: str, table: str, existing: list = ()) -> list:
+    """
+    ADD COLUMN statements of the missing scope columns and CREATE INDEX statements of one table
+    :param vendor: database vendor
+    :param table: resource table
+    :param existing: columns the table already has
+    :return: list of SQL
+    """
+    if not scope_supported(vendor):
+        return []
+    statements = []
+    for index in SCOPE_COLUMNS.values():
+        column = scope_column(index.key)
+        if column in existing:
+            continue
+        # virtual on sqlite, which can not add stored columns, stored on postgresql, which only has those
+        storage = 'VIRTUAL' if vendor == 'sqlite' else 'STORED'
+        expression = index.expression(vendor, '"data"')
+        statements.append(
+            f'ALTER TABLE "{table}" ADD COLUMN "{column}" {SQL_TYPES[vendor][index.type]} '
+            f'GENERATED ALWAYS AS ({expression}) {storage}'
+        )
+    department = scope_column('department')
+    creater = scope_column('creater')
+    statements += [
+        f'CREATE INDEX IF NOT EXISTS "{SCOPE_PREFIX}{table}" ON "{table}" ("project", "is_delete", "{department}", "id")',
+        f'CREATE INDEX IF NOT EXISTS "{SCOPE_PREFIX}creater_{table}" ON "{table}" ("project", "{creater}")',
+    ]
+    return statements
+
+
+def table_columns(cursor, vendor: str, table: str) -> list:
+    if vendor == 'sqlite':
+        # table_info leaves generated columns out
+        cursor.execute(f'PRAGMA table_xinfo("{table}")')
+        return [row[1] for row in cursor.fetchall()]
+    cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = %s", [table])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_scope_columns(using: str = 'default') -> None:
+    """
+    Add the scope columns and their indexes to every resource table which misses them
+    Adding a stored column rewrites a postgresql table, which is the backfill of the existing rows
+    :param using: database alias
+    """
+    connection = connections[using]
+    vendor = connection.vendor
+    if not scope_supported(vendor):
+        return
+    with connection.cursor() as cursor:
+        for table in scope_tables():
+            existing = table_columns(cursor, vendor, table)
+            if not existing:
+                continue
+            statements = scope_statements(vendor, table, existing)
+            for statement in statements:
+                cursor.execute(statement)
+            if len(statements) > 2:
+                cursor.execute(f'ANALYZE "{table}"')
+            SCOPE_TABLES[(using, table)] = True
+
+
+def drop_scope_columns(using: str = 'default') -> None:
+    connection = connections[using]
+    vendor = connection.vendor
+    if not scope_supported(vendor):
+        return
+    with connection.cursor() as cursor:
+        for table in scope_tables():
+            existing = table_columns(cursor, vendor, table)
+            cursor.execute(f'DROP INDEX IF EXISTS "{SCOPE_PREFIX}{table}"')
+            cursor.execute(f'DROP INDEX IF EXISTS "{SCOPE_PREFIX}creater_{table}"')
+            for index in SCOPE_COLUMNS.values():
+                if scope_column(index.key) in existing:
+                    cursor.execute(f'ALTER TABLE "{table}" DROP COLUMN "{scope_column(index.key)}"')
+            SCOPE_TABLES[(using, table)] = False
+
+
+def has_scope_columns(table: str, using: str = 'default') -> bool:
+    """
+    The table has every scope column, looked up once per process and alias
+    """
+    key = (using, table)
+    if key not in SCOPE_TABLES:
+        connection = connections[using]
+        if not scope_supported(connection.vendor):
+            SCOPE_TABLES[key] = False
+        else:
+            with connection.cursor() as cursor:
+                existing = table_columns(cursor, connection.vendor, table)
+            SCOPE_TABLES[key] = all(scope_column(name) in existing for name in SCOPE_COLUMNS)
+    return SCOPE_TABLES[key]
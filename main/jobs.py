@@ -0,0 +1,335 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import orjson
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+from multiprocessing import get_context
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('pending', 'running', 'done', 'failed', 'cancelled')
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+QUEUE_KINDS = ('thread', 'process')
+
+# task name -> dotted path of the function, the only functions the submit API runs
+TASKS = {}
+
+
+def queue_task(name: str, queue: str = 'default'):
+    """
+    Register the decorated module level function as a task of the submit API
+    The task exists once its module is imported, in receiver.py for the functions of the project
+    """
+    def decorator(func):
+        TASKS[name] = (task_path(func), queue)
+        return func
+    return decorator
+
+
+def task_path(func) -> str:
+    """
+    Dotted path a worker imports the function by, receiver.py and files.py are modules of the project package
+    """
+    if isinstance(func, str):
+        return func
+    module = func.__module__
+    if module in ['receiver', 'files']:
+        module = f'{settings.PROJECT_NAME}.{module}'
+    if '<' in func.__qualname__:
+        raise ValueError(f"'{func.__qualname__}' is not a module level function")
+    return f'{module}.{func.__qualname__}'
+
+
+def queue_specs(value: str) -> dict:
+    """
+    Parse queues = default:thread:4,process:process:2 into {name: (kind, concurrency)}
+    """
+    specs = {}
+    for item in value.replace(' ', '').split(','):
+        if not item:
+            continue
+        try:
+            name, kind, concurrency = item.split(':')
+            concurrency = int(concurrency)
+        except ValueError:
+            raise ValueError(f"Invalid [queue] queues item '{item}'")
+        if kind not in QUEUE_KINDS:
+            raise ValueError(f"Queue '{name}' must be one of {', '.join(QUEUE_KINDS)}")
+        specs[name] = (kind, max(concurrency, 1))
+    return specs
+
+
+def setup_process() -> None:
+    # initializer of the process pool, spawned processes start without django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bomiot.server.server.settings')
+    import django
+    django.setup()
+
+
+def json_value(value):
+    """
+    The result as stored, values JSON can not hold become strings
+    """
+    return orjson.loads(orjson.dumps(value, default=str))
+
+
+def call_task(path: str, args: list, kwargs: dict):
+    """
+    Run one job, in a thread of the worker or in a process of the pool
+    """
+    try:
+        return json_value(import_string(path)(*args, **kwargs))
+    finally:
+        connections.close_all()
+
+
+class JobQueue:
+    """
+    Durable job queue in the database, no broker
+    Every queue has its own thread or process pool, so a queue never runs more than its concurrency jobs per worker
+    Pending jobs start by priority, then by run_after. A pending job with the same key takes the duplicates in
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('queue', 'enable', fallback=True)
+        self.queues = queue_specs(config.get('queue', 'queues', fallback='default:thread:4,imports:thread:2,process:process:2'))
+        self.poll = max(config.getfloat('queue', 'poll', fallback=1), 0.1)
+        self.max_attempts = max(config.getint('queue', 'max_attempts', fallback=3), 1)
+        self.backoff = max(config.getfloat('queue', 'backoff', fallback=10), 0)
+        self.backoff_max = max(config.getfloat('queue', 'backoff_max', fallback=600), self.backoff)
+        self.stale_seconds = max(config.getint('queue', 'stale_seconds', fallback=300), 10)
+        self.keep_days = config.getfloat('queue', 'keep_days', fallback=7)
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        # job id -> queue of the jobs this worker runs
+        self._running = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def submit(self, func, args: list = (), kwargs: dict = None, queue: str = 'default', priority: int = 0,
+               key: str = '', delay: float = 0, max_attempts: int = 0, project: str = '', creater: str = ''):
+        """
+        Queue a call of func, which is a module level function or its dotted path
+        Arguments must be JSON values, the job is visible to the workers when the transaction commits
+        :param key: coalesce key, a pending job with the same key is returned instead, with the higher priority
+        :param delay: seconds before the job may start
+        :return: QueueJob
+        """
+        from main.wms.models import QueueJob
+        if queue not in self.queues:
+            raise ValueError(f"Unknown queue '{queue}'")
+        path = task_path(func)
+        args = json_value(list(args))
+        kwargs = json_value(kwargs or {})
+        run_after = timezone.now() + timedelta(seconds=delay)
+        with transaction.atomic():
+            job = None
+            if key:
+                job = QueueJob.objects.select_for_update().filter(key=key, status='pending').order_by('id').first()
+            if job is not None:
+                if priority > job.priority or run_after < job.run_after:
+                    job.priority = max(job.priority, priority)
+                    job.run_after = min(job.run_after, run_after)
+                    job.save(update_fields=['priority', 'run_after', 'updated_time'])
+            else:
+                job = QueueJob.objects.create(queue=queue, func=path, args=args, kwargs=kwargs, priority=priority, key=key,
+                                              max_attempts=max_attempts or self.max_attempts, run_after=run_after,
+                                              project=project or settings.PROJECT_NAME, creater=creater)
+            transaction.on_commit(self._wake.set)
+        return job
+
+    def offload(self, func, *args, key: str = '', queue: str = 'default', **kwargs) -> bool:
+        """
+        Submit func(*args, **kwargs) when the queue is enabled, the caller runs it itself on False
+        """
+        if not self.enable:
+            return False
+        self.submit(func, args, kwargs, queue=queue, key=key)
+        return True
+
+    def cancel(self, job_id: int, creater: str = None) -> bool:
+        """
+        Cancel a pending job, a running job finishes
+        """
+        from main.wms.models import QueueJob
+        queryset = QueueJob.objects.filter(id=job_id, status='pending')
+        if creater is not None:
+            queryset = queryset.filter(creater=creater)
+        return queryset.update(status='cancelled', updated_time=timezone.now()) == 1
+
+    def start(self) -> bool:
+        """
+        Start the dispatcher of this worker, False when [queue] is disabled
+        """
+        if not self.enable:
+            return False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='job-queue', daemon=True)
+            self._thread.start()
+        return True
+
+    def pool(self, queue: str):
+        if queue not in self._pools:
+            kind, concurrency = self.queues[queue]
+            if kind == 'process':
+                self._pools[queue] = ProcessPoolExecutor(max_workers=concurrency, mp_context=get_context('spawn'),
+                                                         initializer=setup_process)
+            else:
+                self._pools[queue] = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'queue-{queue}')
+        return self._pools[queue]
+
+    def run(self) -> None:
+        beat = purged = 0.0
+        while True:
+            self._wake.wait(self.poll)
+            self._wake.clear()
+            try:
+                now = time.monotonic()
+                if now - beat > self.stale_seconds / 4:
+                    beat = now
+                    self.heartbeat()
+                    self.recover()
+                if now - purged > 3600:
+                    purged = now
+                    self.purge()
+                self.dispatch()
+            except Exception as e:
+                logger.warning(f'Job queue failed: {e}')
+            finally:
+                connections.close_all()
+
+    def dispatch(self) -> None:
+        """
+        Claim the next jobs of every queue with a free slot and hand them to its pool
+        """
+        from django.db.models import F
+        from main.wms.models import QueueJob
+        for queue, (kind, concurrency) in self.queues.items():
+            with self._lock:
+                free = concurrency - sum(1 for name in self._running.values() if name == queue)
+            if free <= 0:
+                continue
+            candidates = QueueJob.objects.filter(status='pending', queue=queue, run_after__lte=timezone.now()) \
+                .order_by('-priority', 'run_after', 'id').values_list('id', 'func', 'args', 'kwargs')[:free]
+            for job_id, path, args, kwargs in candidates:
+                now = timezone.now()
+                # a conditional update, the job runs on one worker only
+                if not QueueJob.objects.filter(id=job_id, status='pending').update(
+                        status='running', worker=self.worker, attempts=F('attempts') + 1, updated_time=now):
+                    continue
+                with self._lock:
+                    self._running[job_id] = queue
+                future = self.pool(queue).submit(call_task, path, args, kwargs)
+                future.add_done_callback(partial(self.finish, job_id, time.monotonic()))
+
+    def finish(self, job_id: int, started: float, future) -> None:
+        """
+        Store the result, or queue the job again after backoff until max_attempts runs failed
+        """
+        from main.wms.models import QueueJob
+        try:
+            seconds = time.monotonic() - started
+            error = future.exception()
+            job = QueueJob.objects.filter(id=job_id, status='running', worker=self.worker).first()
+            if job is None:
+                # recovered by another worker meanwhile
+                return
+            if error is None:
+                job.status, job.result, job.detail = 'done', future.result(), ''
+            elif job.attempts < job.max_attempts:
+                wait = min(self.backoff * 2 ** (job.attempts - 1), self.backoff_max)
+                job.status, job.detail = 'pending', f'{type(error).__name__}: {error}'
+                job.run_after = timezone.now() + timedelta(seconds=wait * random.uniform(0.8, 1.2))
+            else:
+                job.status, job.detail = 'failed', f'{type(error).__name__}: {error}'
+            if isinstance(error, BrokenProcessPool):
+                # a process of the pool died, the next job of the queue starts a new pool
+                self._pools.pop(self._running.get(job_id), None)
+            if error is not None:
+                logger.warning(f'Queue job {job_id} {job.func} failed on attempt {job.attempts}: {error}')
+            job.seconds += seconds
+            job.save(update_fields=['status', 'result', 'detail', 'run_after', 'seconds', 'updated_time'])
+        except Exception as e:
+            logger.warning(f'Queue job {job_id} could not be finished: {e}')
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._wake.set()
+            connections.close_all()
+
+    def heartbeat(self) -> None:
+        from main.wms.models import QueueJob
+        with self._lock:
+            running = list(self._running)
+        if running:
+            QueueJob.objects.filter(id__in=running, worker=self.worker).update(updated_time=timezone.now())
+
+    def recover(self) -> None:
+        """
+        Jobs of a worker which stopped, run again until max_attempts
+        """
+        from django.db.models import F
+        from main.wms.models import QueueJob
+        now = timezone.now()
+        stale = QueueJob.objects.filter(status='running', updated_time__lt=now - timedelta(seconds=self.stale_seconds))
+        stale.filter(attempts__gte=F('max_attempts')).update(status='failed', detail='Worker lost', updated_time=now)
+        count = stale.update(status='pending', detail='Worker lost', run_after=now, updated_time=now)
+        if count:
+            logger.warning(f'{count} queue jobs of lost workers queued again')
+
+    def purge(self) -> None:
+        from main.wms.models import QueueJob
+        if self.keep_days < 0:
+            return
+        QueueJob.objects.filter(status__in=FINISHED, updated_time__lt=timezone.now() - timedelta(days=self.keep_days)).delete()
+
+    def stats(self) -> dict:
+        """
+        Jobs per queue and status
+        """
+        from django.db.models import Count
+        from main.wms.models import QueueJob
+        stats = {queue: dict.fromkeys(STATUSES, 0) for queue in self.queues}
+        for row in QueueJob.objects.values('queue', 'status').annotate(count=Count('id')).order_by():
+            stats.setdefault(row['queue'], dict.fromkeys(STATUSES, 0))[row['status']] = row['count']
+        return stats
+
+
+def queue_job_to_dict(job) -> dict:
+    return {
+        'id': job.id,
+        'queue': job.queue,
+        'func': job.func,
+        'args': job.args,
+        'kwargs': job.kwargs,
+        'priority': job.priority,
+        'key': job.key,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_after': job.run_after.strftime('%Y-%m-%d %H:%M:%S'),
+        'worker': job.worker,
+        'result': job.result,
+        'detail': job.detail,
+        'seconds': round(job.seconds, 3),
+        'creater': job.creater,
+        'created_time': job.created_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'updated_time': job.updated_time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+job_queue = JobQueue(settings.CONFIG)
@@ -0,0 +1,342 @@
+import logging
+import os
+import threading
+import time
+import orjson
+import psutil
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from os.path import join
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    # windows, the desktop runs one process and no worker stops under a scrape
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+# seconds, the prometheus client defaults
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+OTHER = 'other'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# counters of the stopped workers, kept so the sums never go down
+RETIRED = 'retired.json'
+
+
+class RequestStats:
+    """
+    Database and signal work of one request, shared with the threads the request runs code in
+    """
+    __slots__ = ('queries', 'query_seconds', 'signal_queries', 'signal_seconds', 'signal_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.signal_queries = 0
+        self.signal_seconds = 0.0
+        self.signal_depth = 0
+
+
+current = ContextVar('request_stats', default=None)
+
+
+class EndpointStats:
+    """
+    Counters of one (func_name, method), buckets are not cumulative, the last one is +Inf
+    """
+    __slots__ = ('count', 'seconds', 'buckets', 'queries', 'query_seconds', 'signal_queries', 'signal_seconds',
+                 'bytes', 'slow', 'statuses')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.signal_queries = 0
+        self.signal_seconds = 0.0
+        self.bytes = 0
+        self.slow = 0
+        self.statuses = {}
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def merge(self, data: dict) -> None:
+        for name in self.__slots__:
+            if name == 'buckets':
+                self.buckets = [a + b for a, b in zip(self.buckets, data['buckets'])]
+            elif name == 'statuses':
+                for status, count in data['statuses'].items():
+                    self.statuses[str(status)] = self.statuses.get(str(status), 0) + count
+            else:
+                setattr(self, name, getattr(self, name) + data[name])
+
+
+def merge_snapshot(endpoints: dict, snapshot: dict) -> dict:
+    """
+    Add a snapshot {"func_name method": counters} to {"func_name method": EndpointStats}
+    """
+    for key, data in snapshot.items():
+        endpoint = endpoints.get(key)
+        if endpoint is None:
+            endpoint = endpoints[key] = EndpointStats()
+        endpoint.merge(data)
+    return endpoints
+
+
+def read_snapshot(file_path: str) -> dict:
+    with open(file_path, 'rb') as f:
+        return orjson.loads(f.read())
+
+
+def label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    Per process request metrics keyed by the func_name of the API registry
+    Every worker writes its counters to dbs/metrics/<pid>.json, a scrape adds up the live workers
+    The last counters of a stopped worker are added to dbs/metrics/retired.json, like the prometheus client multiprocess mode
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('metrics', 'enable', fallback=True)
+        self.slow_seconds = config.getfloat('metrics', 'slow_seconds', fallback=1)
+        self.slow_queries = config.getint('metrics', 'slow_queries', fallback=100)
+        self.flush_seconds = config.getfloat('metrics', 'flush_seconds', fallback=5)
+        self.path = join(settings.WORKING_SPACE, 'dbs', 'metrics')
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._changed = False
+        self._flusher = None
+
+    def record(self, func_name: str, method: str, status: int, seconds: float, stats: RequestStats, size: int) -> bool:
+        slow = (self.slow_seconds and seconds >= self.slow_seconds) or (self.slow_queries and stats.queries >= self.slow_queries)
+        with self._lock:
+            endpoint = self._endpoints.get((func_name, method))
+            if endpoint is None:
+                endpoint = self._endpoints[(func_name, method)] = EndpointStats()
+            endpoint.count += 1
+            endpoint.seconds += seconds
+            endpoint.buckets[bisect_left(BUCKETS, seconds)] += 1
+            endpoint.queries += stats.queries
+            endpoint.query_seconds += stats.query_seconds
+            endpoint.signal_queries += stats.signal_queries
+            endpoint.signal_seconds += stats.signal_seconds
+            endpoint.bytes += size
+            endpoint.statuses[str(status)] = endpoint.statuses.get(str(status), 0) + 1
+            if slow:
+                endpoint.slow += 1
+            self._changed = True
+        if self._flusher is None or self._flusher[0] != os.getpid():
+            self.start_flusher()
+        return slow
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {f'{func_name} {method}': endpoint.to_dict() for (func_name, method), endpoint in self._endpoints.items()}
+
+    def flush(self) -> None:
+        if not self._changed:
+            return
+        self._changed = False
+        os.makedirs(self.path, exist_ok=True)
+        file_path = join(self.path, f'{os.getpid()}.json')
+        with open(f'{file_path}.tmp', 'wb') as f:
+            f.write(orjson.dumps(self.snapshot()))
+        os.replace(f'{file_path}.tmp', file_path)
+
+    def start_flusher(self) -> None:
+        """
+        One daemon thread per worker, started by the first request so forked workers get their own
+        """
+        def run():
+            while True:
+                time.sleep(self.flush_seconds)
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.warning(f'Metrics not written: {e}')
+        thread = threading.Thread(target=run, name='metrics-flush', daemon=True)
+        self._flusher = (os.getpid(), thread)
+        thread.start()
+
+    def retire(self, file_path: str) -> None:
+        """
+        Add the counters of a stopped worker to the retired ones and remove its file
+        The workers scraping at the same time take turns on the lock file, the first one moves the counters
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(join(self.path, 'retired.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.lockf(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    snapshot = read_snapshot(file_path)
+                except FileNotFoundError:
+                    return
+                except (OSError, orjson.JSONDecodeError):
+                    # a file cut short when the worker was killed, its counters are lost
+                    snapshot = {}
+                retired_path = join(self.path, RETIRED)
+                try:
+                    retired = merge_snapshot({}, read_snapshot(retired_path))
+                except FileNotFoundError:
+                    retired = {}
+                merge_snapshot(retired, snapshot)
+                with open(f'{retired_path}.tmp', 'wb') as f:
+                    f.write(orjson.dumps({key: endpoint.to_dict() for key, endpoint in retired.items()}))
+                os.replace(f'{retired_path}.tmp', retired_path)
+                os.remove(file_path)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(lock, fcntl.LOCK_UN)
+
+    def merged(self) -> dict:
+        """
+        Counters of this worker, the last written counters of the other live workers and the retired counters
+        The files of stopped workers are added to the retired counters
+        """
+        endpoints = {}
+        snapshots = [self.snapshot()]
+        pid = os.getpid()
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            names = []
+        for name in names:
+            if not name.endswith('.json') or not name[:-5].isdigit() or int(name[:-5]) == pid:
+                continue
+            file_path = join(self.path, name)
+            if not psutil.pid_exists(int(name[:-5])):
+                try:
+                    self.retire(file_path)
+                except OSError as e:
+                    logger.warning(f'Metrics of worker {name[:-5]} not retired: {e}')
+                continue
+            try:
+                snapshots.append(read_snapshot(file_path))
+            except (OSError, orjson.JSONDecodeError):
+                continue
+        # read after the retiring, a file moved by another worker meanwhile is then in it
+        try:
+            snapshots.append(read_snapshot(join(self.path, RETIRED)))
+        except (OSError, orjson.JSONDecodeError):
+            pass
+        for snapshot in snapshots:
+            merge_snapshot(endpoints, snapshot)
+        return endpoints
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format
+        """
+        endpoints = sorted(self.merged().items())
+        lines = [
+            '# HELP wms_http_requests_total Requests by func_name, method and status',
+            '# TYPE wms_http_requests_total counter',
+        ]
+        for key, endpoint in endpoints:
+            func_name, method = key.rsplit(' ', 1)
+            labels = f'func_name="{label(func_name)}",method="{method}"'
+            for status, count in sorted(endpoint.statuses.items()):
+                lines.append(f'wms_http_requests_total{{{labels},status="{status}"}} {count}')
+        lines += [
+            '# HELP wms_http_request_duration_seconds Request latency, from the first middleware to the response',
+            '# TYPE wms_http_request_duration_seconds histogram',
+        ]
+        for key, endpoint in endpoints:
+            func_name, method = key.rsplit(' ', 1)
+            labels = f'func_name="{label(func_name)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, endpoint.buckets):
+                cumulative += count
+                lines.append(f'wms_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'wms_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {endpoint.count}')
+            lines.append(f'wms_http_request_duration_seconds_sum{{{labels}}} {endpoint.seconds}')
+            lines.append(f'wms_http_request_duration_seconds_count{{{labels}}} {endpoint.count}')
+        for name, attribute, kind, help_text in [
+            ('wms_db_queries_total', 'queries', 'counter', 'SQL queries run by the requests'),
+            ('wms_db_query_seconds_total', 'query_seconds', 'counter', 'Time spent in SQL queries'),
+            ('wms_signal_queries_total', 'signal_queries', 'counter', 'SQL queries run by the signal receivers'),
+            ('wms_signal_seconds_total', 'signal_seconds', 'counter', 'Time spent in bomiot_data_signals dispatches'),
+            ('wms_http_response_bytes_total', 'bytes', 'counter', 'Response body bytes, streamed bodies are not counted'),
+            ('wms_http_slow_requests_total', 'slow', 'counter', 'Requests over the slow_seconds or slow_queries threshold'),
+        ]:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for key, endpoint in endpoints:
+                func_name, method = key.rsplit(' ', 1)
+                lines.append(f'{name}{{func_name="{label(func_name)}",method="{method}"}} {getattr(endpoint, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics(settings.CONFIG)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper, counts the queries of the current request
+    """
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - start
+        if stats.signal_depth:
+            stats.signal_queries += 1
+
+
+def metrics_callback(sender, connection, **kwargs):
+    """
+    connection_created receiver, every new connection counts its queries
+    """
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+@contextmanager
+def signal_timer():
+    """
+    Time a signal dispatch of the current request, queries run inside it are receiver queries
+    """
+    stats = current.get()
+    if stats is None:
+        yield
+        return
+    stats.signal_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.signal_depth -= 1
+        stats.signal_seconds += time.perf_counter() - start
+
+
+def instrument_signal(signal) -> None:
+    """
+    Time every send_robust of the signal, the views of bomiot call it too
+    """
+    send_robust = signal.send_robust
+    if getattr(send_robust, 'instrumented', False):
+        return
+
+    @wraps(send_robust)
+    def timed_send_robust(sender, **named):
+        with signal_timer():
+            return send_robust(sender, **named)
+    timed_send_robust.instrumented = True
+    signal.send_robust = timed_send_robust
@@ -0,0 +1,289 @@
+import math
+import time
+import orjson
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from main.api import API_METHOD_TABLE
+from main.cache import list_cache
+from main.metrics import OTHER, RequestStats, current, logger, metrics
+from main.throttle import LOGIN_PATH, rate_limiter
+
+
+def project_of(request) -> str:
+    project_name = request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+    if project_name.lower() == 'bomiot':
+        return settings.PROJECT_NAME
+    return project_name
+
+
+class ListCacheMiddleware:
+    """
+    Serve the registered *_get lists from list_cache
+    Only successful responses which went through authentication are stored
+    A write API of a cached resource clears its lists once it answered that a receiver accepted the write,
+    the view committed by then. Imports and the archive clear them when their transactions commit
+    Sync and async capable, under ASGI the async views are not moved to a thread by this middleware
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        write_obj = self.write_api(request)
+        if write_obj is not None:
+            response = self.get_response(request)
+            if self.written(response):
+                list_cache.invalidate(write_obj['resource'], project_of(request))
+            return response
+        api_obj = self.list_api(request)
+        if api_obj is None:
+            return self.get_response(request)
+        key, cached = self.cached(api_obj, request)
+        if key is None:
+            return self.get_response(request)
+        if cached is not None:
+            return self.cached_response(cached)
+        response = self.get_response(request)
+        if self.cacheable(response):
+            list_cache.set(key, (response.content, response['Content-Type']))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def __acall__(self, request):
+        write_obj = self.write_api(request)
+        if write_obj is not None:
+            response = await self.get_response(request)
+            if self.written(response):
+                if list_cache.shared is not None:
+                    await sync_to_async(list_cache.invalidate)(write_obj['resource'], project_of(request))
+                else:
+                    list_cache.invalidate(write_obj['resource'], project_of(request))
+            return response
+        api_obj = self.list_api(request)
+        if api_obj is None:
+            return await self.get_response(request)
+        # the user row and the shared backend are only read in a thread
+        key, cached = await sync_to_async(self.cached)(api_obj, request)
+        if key is None:
+            return await self.get_response(request)
+        if cached is not None:
+            return self.cached_response(cached)
+        response = await self.get_response(request)
+        if self.cacheable(response):
+            value = (response.content, response['Content-Type'])
+            if list_cache.shared is not None:
+                await sync_to_async(list_cache.set)(key, value)
+            else:
+                list_cache.set(key, value)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    @staticmethod
+    def list_api(request):
+        if request.method != 'GET' or not list_cache.enable:
+            return None
+        api_obj = API_METHOD_TABLE.get(('GET', request.path))
+        if api_obj is None or api_obj['resource'] not in list_cache.resources:
+            return None
+        if api_obj['func_name'] != f"{api_obj['resource']}_get":
+            return None
+        return api_obj
+
+    @staticmethod
+    def write_api(request):
+        if request.method != 'POST' or not list_cache.enable:
+            return None
+        api_obj = API_METHOD_TABLE.get(('POST', request.path))
+        if api_obj is None or api_obj['resource'] not in list_cache.resources:
+            return None
+        # an import only starts its job, write_chunk clears the lists
+        if api_obj['func_name'] == f"{api_obj['resource']}_import":
+            return None
+        return api_obj
+
+    @staticmethod
+    def written(response) -> bool:
+        """
+        A receiver answered msg, without it, or with detail, the views do not write
+        """
+        if response.status_code >= 400 or response.streaming:
+            return False
+        try:
+            data = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            return False
+        return isinstance(data, dict) and bool(data.get('msg')) and 'detail' not in data and data.get('success', 1) != 0
+
+    @staticmethod
+    def cache_key(api_obj, request):
+        department = list_cache.user_scope(request)
+        if department is None:
+            return None
+        return list_cache.make_key(api_obj['resource'], project_of(request), department, request)
+
+    def cached(self, api_obj, request) -> tuple:
+        """
+        (key, cached value) of a list request, (None, None) when it is not cached for this token
+        """
+        key = self.cache_key(api_obj, request)
+        return key, None if key is None else list_cache.get(key)
+
+    @staticmethod
+    def cached_response(cached):
+        response = HttpResponse(cached[0], content_type=cached[1])
+        response['X-Cache'] = 'HIT'
+        return response
+
+    @staticmethod
+    def cacheable(response) -> bool:
+        if response.status_code != 200 or response.streaming:
+            return False
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return False
+        try:
+            data = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            return False
+        return isinstance(data, dict) and 'results' in data and 'status_code' not in data
+
+
+class ThrottleMiddleware:
+    """
+    Token buckets of rate_limiter, a request over its rate gets 429 with Retry-After
+    Only the APIs of API_METHOD_TABLE and the login, the pages and static files of the front end are not limited
+    Before ListCacheMiddleware, so cached lists take tokens too, and after CorsMiddleware, so browsers read the 429
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.is_login(request):
+            wait = self.check(rate_limiter.check_login, request)
+            if wait:
+                return self.throttled(wait)
+            response = self.get_response(request)
+            self.check(rate_limiter.charge_login, request, response)
+            return response
+        func_name = self.func_name(request)
+        if func_name is None:
+            return self.get_response(request)
+        wait = self.check(rate_limiter.check, request, func_name, rate_limiter.owner(request))
+        if wait:
+            return self.throttled(wait)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_login(request):
+            wait = self.check(rate_limiter.check_login, request)
+            if wait:
+                return self.throttled(wait)
+            response = await self.get_response(request)
+            self.check(rate_limiter.charge_login, request, response)
+            return response
+        func_name = self.func_name(request)
+        if func_name is None:
+            return await self.get_response(request)
+        owner = rate_limiter.known_owner(request)
+        if owner is None:
+            # the token is checked against the database once, then cached
+            owner = await sync_to_async(rate_limiter.owner)(request)
+        wait = self.check(rate_limiter.check, request, func_name, owner)
+        if wait:
+            return self.throttled(wait)
+        return await self.get_response(request)
+
+    @staticmethod
+    def is_login(request) -> bool:
+        return rate_limiter.enable and request.method == 'POST' and request.path == LOGIN_PATH
+
+    @staticmethod
+    def func_name(request):
+        if not rate_limiter.enable:
+            return None
+        api_obj = API_METHOD_TABLE.get((request.method, request.path))
+        return api_obj['func_name'] if api_obj is not None else None
+
+    @staticmethod
+    def check(method, *args) -> float:
+        try:
+            return method(*args) or 0.0
+        except OSError as e:
+            # the buckets file can not be mapped, requests are not limited rather than failed
+            logger.warning(f'Throttle failed: {e}')
+            return 0.0
+
+    @staticmethod
+    def throttled(wait: float):
+        response = JsonResponse({'detail': 'Request was throttled', 'status_code': 429}, status=429)
+        response['Retry-After'] = str(max(math.ceil(wait), 1))
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Latency, status, SQL queries, signal time and response size of every request, keyed by func_name
+    First in MIDDLEWARE, so cached lists and rejected requests are measured too
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics.enable:
+            return self.get_response(request)
+        stats = RequestStats()
+        token = current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics.enable:
+            return await self.get_response(request)
+        stats = RequestStats()
+        token = current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    @staticmethod
+    def record(request, response, seconds: float, stats: RequestStats) -> None:
+        api_obj = API_METHOD_TABLE.get((request.method, request.path))
+        func_name = api_obj['func_name'] if api_obj is not None else OTHER
+        size = 0 if response.streaming else len(response.content)
+        if metrics.record(func_name, request.method, response.status_code, seconds, stats, size):
+            logger.warning(f'Slow request {func_name} {request.method} {request.get_full_path()} {response.status_code} '
+                           f'{seconds:.3f}s, {stats.queries} queries {stats.query_seconds:.3f}s, '
+                           f'signal {stats.signal_seconds:.3f}s {stats.signal_queries} queries, {size} bytes')
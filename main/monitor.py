@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import orjson
+import psutil
+
+from datetime import datetime
+from os.path import dirname, join
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# columns of the ring after time, one value per sample
+SERIES = ('cpu_usage', 'memory_used', 'memory_free', 'memory_percent', 'swap_percent',
+          'bytes_sent', 'bytes_recv', 'sent_rate', 'recv_rate')
+
+# seq, count, capacity, columns as unsigned 64 bit words before the values
+HEADER = struct.Struct('<4Q')
+
+# rows kept in bomiot's CPU / Memory / Network tables, as bomiot's monitor does
+KEEP_ROWS = 10080
+
+
+class RingBuffer:
+    """
+    Fixed size ring of samples in a memory mapped file, a time column and one double column per series
+    The sampler writes, the workers of the node map the same file and read, seq is odd while a sample is written
+    """
+    def __init__(self, path: str, capacity: int, series: tuple = SERIES):
+        self.path = path
+        self.capacity = capacity
+        self.columns = len(series) + 1
+        # (inode, words, values, capacity, columns) of the mapped file, swapped as a whole when it is mapped again
+        self._view = None
+
+    def create(self) -> None:
+        """
+        Map the ring for writing, the samples of the last run are kept when the layout did not change
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            header = None
+        if header is None or header[2:] != (self.capacity, self.columns):
+            os.makedirs(dirname(self.path), exist_ok=True)
+            with open(f'{self.path}.tmp', 'wb') as f:
+                f.write(HEADER.pack(0, 0, self.capacity, self.columns))
+                f.truncate(HEADER.size + self.columns * self.capacity * 8)
+            os.replace(f'{self.path}.tmp', self.path)
+        self._open(writable=True)
+
+    def _open(self, writable: bool = False) -> bool:
+        # the old map is closed by the garbage collector once no read uses it
+        try:
+            with open(self.path, 'r+b' if writable else 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                shared = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        words = memoryview(shared)[:HEADER.size].cast('Q')
+        values = memoryview(shared)[HEADER.size:].cast('d')
+        self._view = (inode, words, values, words[2], words[3])
+        return True
+
+    def attach(self) -> bool:
+        """
+        Map the ring for reading, again when the sampler replaced the file
+        """
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            return self._view is not None
+        if self._view is None or inode != self._view[0]:
+            return self._open()
+        return True
+
+    def last(self) -> int:
+        return self._view[1][1]
+
+    def write(self, timestamp: float, values) -> int:
+        _, words, column_values, capacity, _ = self._view
+        count = words[1]
+        slot = count % capacity
+        words[0] += 1
+        column_values[slot] = timestamp
+        for column, value in enumerate(values, 1):
+            column_values[column * capacity + slot] = value
+        words[1] = count + 1
+        words[0] += 1
+        return count + 1
+
+    @staticmethod
+    def _column(values, capacity: int, column: int, first: int, count: int) -> list:
+        base = column * capacity
+        start, size = first % capacity, count - first
+        if start + size <= capacity:
+            return values[base + start:base + start + size].tolist()
+        return values[base + start:base + capacity].tolist() + values[base:base + start + size - capacity].tolist()
+
+    def read(self, since: int = 0) -> tuple:
+        """
+        (id of the newest sample, [column values]) of the samples after the sample id since
+        A read which overlapped a write is repeated
+        """
+        _, words, values, capacity, column_count = self._view
+        count, columns = 0, [[] for _ in range(column_count)]
+        for _ in range(100):
+            seq = words[0]
+            if seq % 2:
+                time.sleep(0)
+                continue
+            count = words[1]
+            first = min(max(since, count - capacity, 0), count)
+            columns = [self._column(values, capacity, column, first, count) for column in range(column_count)]
+            if words[0] == seq:
+                return count, columns
+        return count, columns
+
+
+class Monitor:
+    """
+    One psutil sampler per node, in the process which runs the background tasks
+    The workers serve history and pushes from the shared ring, so sampling costs the same for any number of dashboards
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('monitor', 'enable', fallback=True)
+        self.interval = max(config.getfloat('monitor', 'interval', fallback=5), 0.5)
+        self.history_size = max(config.getint('monitor', 'history', fallback=720), 2)
+        self.snapshot_seconds = config.getfloat('monitor', 'snapshot_seconds', fallback=60)
+        self.persist_seconds = config.getfloat('monitor', 'persist_seconds', fallback=300)
+        self.stream_seconds = config.getfloat('monitor', 'stream_seconds', fallback=300)
+        self.path = join(settings.WORKING_SPACE, 'dbs', 'monitor')
+        self.ring = RingBuffer(join(self.path, 'ring.bin'), self.history_size)
+        self.snapshot_path = join(self.path, 'snapshot.json')
+        self._snapshot = (None, {})
+        self._network = None
+        self._thread = None
+
+    def start(self) -> bool:
+        """
+        Start the sampler thread once, False when [monitor] is disabled
+        """
+        if not self.enable:
+            return False
+        if self._thread is None:
+            self.ring.create()
+            self._thread = threading.Thread(target=self.run, name='monitor-sampler', daemon=True)
+            self._thread.start()
+        return True
+
+    def run(self) -> None:
+        # the first cpu_percent only starts the measured span
+        psutil.cpu_percent(interval=None)
+        next_tick = time.monotonic()
+        last_snapshot = last_persist = 0.0
+        snapshot = {}
+        while True:
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+            try:
+                now = time.time()
+                values = self.sample(now)
+                self.ring.write(now, values)
+                if now - last_snapshot >= self.snapshot_seconds:
+                    snapshot = self.take_snapshot(now)
+                    last_snapshot = now
+                if self.persist_seconds and now - last_persist >= self.persist_seconds:
+                    self.persist(dict(zip(SERIES, values)), snapshot)
+                    last_persist = now
+            except Exception as e:
+                logger.warning(f'Monitor sample failed: {e}')
+
+    def sample(self, now: float) -> list:
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        network = psutil.net_io_counters()
+        sent_rate = recv_rate = 0.0
+        if self._network is not None:
+            seconds = now - self._network[0]
+            if seconds > 0:
+                sent_rate = max(network.bytes_sent - self._network[1], 0) / seconds
+                recv_rate = max(network.bytes_recv - self._network[2], 0) / seconds
+        self._network = (now, network.bytes_sent, network.bytes_recv)
+        return [psutil.cpu_percent(interval=None), memory.used, memory.free, memory.percent, swap.percent,
+                network.bytes_sent, network.bytes_recv, sent_rate, recv_rate]
+
+    def take_snapshot(self, now: float) -> dict:
+        """
+        CPU facts, disks and processes, slower to read than the ring series, written to snapshot.json
+        """
+        cpu_freq = psutil.cpu_freq()
+        disks = []
+        for partition in psutil.disk_partitions():
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except OSError:
+                continue
+            disks.append({
+                'device': partition.device,
+                'mountpoint': partition.mountpoint,
+                'total': int(usage.total),
+                'used': int(usage.used),
+                'free': int(usage.free),
+                'percent': float(f'{usage.percent:.2f}')
+            })
+        pids = []
+        for proc in psutil.process_iter(['pid', 'name', 'memory_info', 'create_time', 'memory_percent', 'cpu_percent']):
+            info = proc.info
+            if not info['pid'] or info['memory_info'] is None:
+                continue
+            pids.append({
+                'pid': int(info['pid']),
+                'name': str(info['name']),
+                'memory': int(info['memory_info'].rss),
+                'create_time': info['create_time'],
+                'memory_usage': round(float(info['memory_percent'] or 0), 2),
+                'cpu_usage': round(float(info['cpu_percent'] or 0), 2)
+            })
+        pids.sort(key=lambda item: (-item['memory'], -item['cpu_usage']))
+        snapshot = {
+            'time': now,
+            'cpu': {
+                'physical_cores': psutil.cpu_count(logical=False) or 0,
+                'logical_cores': psutil.cpu_count(logical=True) or 0,
+                'cpu_frequency': f"{cpu_freq.current:.2f} MHz" if cpu_freq else '',
+                'min_cpu_frequency': f"{cpu_freq.min:.2f} MHz" if cpu_freq else '',
+                'max_cpu_frequency': f"{cpu_freq.max:.2f} MHz" if cpu_freq else ''
+            },
+            'disks': disks,
+            'pids': pids
+        }
+        with open(f'{self.snapshot_path}.tmp', 'wb') as f:
+            f.write(orjson.dumps(snapshot))
+        os.replace(f'{self.snapshot_path}.tmp', self.snapshot_path)
+        return snapshot
+
+    def persist(self, values: dict, snapshot: dict) -> None:
+        """
+        Write the rows of bomiot's monitor tables, read by the /core/ cpu, memory, disk, network and pid lists
+        """
+        from bomiot.server.core.models import CPU, Memory, Disk, Network, Pids
+        from bomiot.server.core.signal import bomiot_signals
+        swap = psutil.swap_memory()
+        total = psutil.virtual_memory().total
+        cpu_info = snapshot.get('cpu', {})
+        cpu_data = {
+            'cpu_usage': float(f"{values['cpu_usage']:.2f}"),
+            'physical_cores': int(cpu_info.get('physical_cores', 0)),
+            'logical_cores': int(cpu_info.get('logical_cores', 0)),
+            'cpu_frequency': cpu_info.get('cpu_frequency', ''),
+            'min_cpu_frequency': cpu_info.get('min_cpu_frequency', ''),
+            'max_cpu_frequency': cpu_info.get('max_cpu_frequency', '')
+        }
+        cpu = CPU.objects.create(**cpu_data)
+        CPU.objects.filter(id__lte=cpu.id - KEEP_ROWS).delete()
+        bomiot_signals.send(sender=CPU, msg={'models': 'CPU', 'type': 'created', 'data': {'id': cpu.id, **cpu_data}})
+        memory_data = {
+            'total': int(total),
+            'used': int(values['memory_used']),
+            'free': int(values['memory_free']),
+            'percent': float(f"{values['memory_percent']:.2f}"),
+            'swap_total': int(swap.total),
+            'swap_used': int(swap.used),
+            'swap_free': int(swap.free),
+            'swap_percent': float(f'{swap.percent:.2f}')
+        }
+        memory = Memory.objects.create(**memory_data)
+        Memory.objects.filter(id__lte=memory.id - KEEP_ROWS).delete()
+        bomiot_signals.send(sender=Memory, msg={'models': 'Memory', 'type': 'created', 'data': {'id': memory.id, **memory_data}})
+        network = Network.objects.create(bytes_sent=int(values['bytes_sent']), bytes_recv=int(values['bytes_recv']))
+        Network.objects.filter(id__lte=network.id - KEEP_ROWS).delete()
+        if snapshot:
+            Disk.objects.all().delete()
+            Disk.objects.bulk_create([Disk(**disk) for disk in snapshot['disks']], batch_size=100)
+            Pids.objects.all().delete()
+            Pids.objects.bulk_create([Pids(**{**pid, 'create_time': datetime.fromtimestamp(pid['create_time'])})
+                                      for pid in snapshot['pids']], batch_size=200)
+
+    def history(self, since: int = None, seconds: float = None) -> dict:
+        """
+        Samples after the sample id since, or of the last seconds, as columns
+        last is the id of the newest sample, the since of the next request
+        """
+        data = {'interval': self.interval, 'last': 0, 'time': [], **{name: [] for name in SERIES}}
+        if not self.ring.attach():
+            return data
+        last = self.ring.last()
+        # ids of a replaced ring start over
+        if since is None or since > last:
+            since = last - int(seconds / self.interval) if seconds else 0
+        last, columns = self.ring.read(since)
+        data['last'] = last
+        data['time'] = columns[0]
+        for name, column in zip(SERIES, columns[1:]):
+            data[name] = column
+        return data
+
+    def snapshot(self) -> dict:
+        """
+        Last snapshot.json, read again when the sampler wrote a new one
+        """
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+        except OSError:
+            return {}
+        if self._snapshot[0] != mtime:
+            try:
+                with open(self.snapshot_path, 'rb') as f:
+                    self._snapshot = (mtime, orjson.loads(f.read()))
+            except (OSError, orjson.JSONDecodeError):
+                return self._snapshot[1]
+        return self._snapshot[1]
+
+    def poll(self, state: dict) -> str:
+        """
+        Server-sent events of the samples and the snapshot a stream has not sent yet
+        """
+        parts = []
+        history = self.history(since=state['since'], seconds=state.pop('seconds', None))
+        if history['time']:
+            state['since'] = history['last']
+            parts.append(f"id: {history['last']}\nevent: sample\ndata: {orjson.dumps(history).decode()}\n\n")
+        snapshot = self.snapshot()
+        if snapshot and snapshot.get('time') != state.get('snapshot'):
+            state['snapshot'] = snapshot.get('time')
+            parts.append(f"event: snapshot\ndata: {orjson.dumps(snapshot).decode()}\n\n")
+        return ''.join(parts) or ': ping\n\n'
+
+    def stream(self, since: int = None, seconds: float = None):
+        """
+        Event stream for WSGI, holds a thread, ends after stream_seconds and the browser reconnects with Last-Event-ID
+        """
+        state = {'since': since, 'seconds': seconds}
+        end = time.monotonic() + self.stream_seconds
+        yield f'retry: {int(self.interval * 1000)}\n\n'
+        while True:
+            yield self.poll(state)
+            if time.monotonic() + self.interval > end:
+                return
+            time.sleep(self.interval)
+
+    async def astream(self, since: int = None, seconds: float = None):
+        """
+        Event stream for ASGI, only sleeps on the event loop between two reads of the ring
+        """
+        state = {'since': since, 'seconds': seconds}
+        end = time.monotonic() + self.stream_seconds
+        yield f'retry: {int(self.interval * 1000)}\n\n'
+        while True:
+            yield self.poll(state)
+            if time.monotonic() + self.interval > end:
+                return
+            await asyncio.sleep(self.interval)
+
+
+monitor = Monitor(settings.CONFIG)
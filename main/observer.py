@@ -0,0 +1,319 @@
+import hashlib
+import logging
+import os
+import stat
+import threading
+import time
+import orjson
+
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, join, relpath
+from pathlib import PurePosixPath
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from watchdog.events import EVENT_TYPE_CLOSED_NO_WRITE, EVENT_TYPE_OPENED, FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+logger = logging.getLogger(__name__)
+
+# events of reads, hashing a file fires them too
+IGNORED_EVENTS = (EVENT_TYPE_OPENED, EVENT_TYPE_CLOSED_NO_WRITE)
+
+HASH_CHUNK = 1024 * 1024
+
+
+def file_key(path: str, root: str):
+    """
+    Path relative to the media folder with / separators, None outside of it
+    """
+    key = relpath(path, root).replace(os.sep, '/')
+    if key == '.':
+        return ''
+    if key == '..' or key.startswith('../'):
+        return None
+    return key
+
+
+def file_owner(key: str) -> str:
+    # media/<user>/<file_name>, the folder holding the file is the owner like bomiot's observer
+    return PurePosixPath(key).parent.name
+
+
+class MediaHandler(FileSystemEventHandler):
+    """
+    Collect the changed paths, the indexer reads them once the folder is quiet
+    """
+    def __init__(self, indexer):
+        super().__init__()
+        self.indexer = indexer
+
+    def on_any_event(self, event):
+        if event.event_type in IGNORED_EVENTS:
+            return
+        self.indexer.touch(event.src_path)
+        if event.dest_path:
+            self.indexer.touch(event.dest_path)
+
+
+class MediaIndexer:
+    """
+    Files table of the media folder, written in batches
+    Events are coalesced until the folder is quiet for debounce seconds, or max_wait after the first one
+    index.json keeps (mtime, size, sha256, id) of every indexed file, a restart only reads the files changed meanwhile
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('observer', 'enable', fallback=True)
+        self.debounce = max(config.getfloat('observer', 'debounce', fallback=0.5), 0.05)
+        self.max_wait = max(config.getfloat('observer', 'max_wait', fallback=5), self.debounce)
+        self.batch_size = max(config.getint('observer', 'batch_size', fallback=500), 1)
+        self.workers = config.getint('observer', 'workers', fallback=0)
+        self.hash = config.getboolean('observer', 'hash', fallback=True)
+        self.root = settings.MEDIA_ROOT
+        self.index_path = join(settings.WORKING_SPACE, 'dbs', 'observer', 'index.json')
+        # media key -> [mtime_ns, size, sha256, id], only used by the indexer thread
+        self.index = {}
+        self._pending = set()
+        self._first = self._last = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = None
+        self._observer = None
+        self._thread = None
+
+    def start(self) -> bool:
+        """
+        Rescan the media folder against the index and watch it, False when [observer] is disabled
+        """
+        if not self.enable:
+            return False
+        if self._thread is None:
+            self.index = self.load_index()
+            workers = self.workers if self.workers > 0 else min(4, os.cpu_count() or 1)
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-describe')
+            self.touch(self.root)
+            self._observer = Observer()
+            self._observer.schedule(MediaHandler(self), self.root, recursive=True)
+            self._observer.start()
+            self._thread = threading.Thread(target=self.run, name='media-indexer', daemon=True)
+            self._thread.start()
+        return True
+
+    def touch(self, path: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not self._pending:
+                self._first = now
+            self._pending.add(path)
+            self._last = now
+            self._wake.set()
+
+    def run(self) -> None:
+        while True:
+            self._wake.wait()
+            with self._lock:
+                delay = min(self._last + self.debounce, self._first + self.max_wait) - time.monotonic()
+                if delay <= 0:
+                    paths, self._pending = self._pending, set()
+                    self._wake.clear()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            try:
+                self.flush(paths)
+            except Exception as e:
+                # the index is not saved, the next rescan picks the paths up again
+                logger.warning(f'Media index failed: {e}')
+
+    def expand(self, paths: set) -> dict:
+        """
+        key -> stat of the files under the paths, None for the indexed files which are gone
+        """
+        found = {}
+        for path in paths:
+            key = file_key(path, self.root)
+            if key is None:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is not None and not stat.S_ISDIR(st.st_mode):
+                found[key] = st
+                continue
+            if key in self.index:
+                found.setdefault(key, None)
+                continue
+            # a folder, the indexed files below it are gone unless the walk finds them
+            prefix = f'{key}/' if key else ''
+            for indexed in self.index:
+                if indexed.startswith(prefix):
+                    found.setdefault(indexed, None)
+            if st is None:
+                continue
+            for folder, _, names in os.walk(path):
+                for name in names:
+                    file_path = join(folder, name)
+                    try:
+                        found[file_key(file_path, self.root)] = os.stat(file_path)
+                    except OSError:
+                        continue
+        return found
+
+    def digest(self, path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def describe(self, key: str, st) -> dict:
+        """
+        Row of one changed file, run in the pool
+        """
+        name = PurePosixPath(key).name
+        try:
+            digest = self.digest(join(self.root, key)) if self.hash else ''
+        except OSError:
+            return None
+        return {
+            'key': key,
+            'name': name,
+            'type': name.split('.')[-1].lower(),
+            'size': st.st_size,
+            'owner': file_owner(key),
+            'mtime': st.st_mtime_ns,
+            'sha256': digest
+        }
+
+    def flush(self, paths: set) -> None:
+        from django.contrib.auth import get_user_model
+        found = self.expand(paths)
+        owners = {file_owner(key) for key in found}
+        owners.discard('')
+        users = set(get_user_model().objects.filter(username__in=owners).values_list('username', flat=True))
+        changed = []
+        deleted = []
+        for key, st in found.items():
+            entry = self.index.get(key)
+            if st is None:
+                if entry is not None:
+                    deleted.append(key)
+            elif file_owner(key) in users and (entry is None or entry[:2] != [st.st_mtime_ns, st.st_size]):
+                changed.append((key, st))
+        if not changed and not deleted:
+            return
+        described = [row for row in self._pool.map(lambda item: self.describe(*item), changed) if row is not None]
+        events = []
+        # deletes first, a moved file is the delete of its old key and the create of its new one
+        for offset in range(0, len(deleted), self.batch_size):
+            events += self.write([], deleted[offset:offset + self.batch_size])
+        for offset in range(0, len(described), self.batch_size):
+            events += self.write(described[offset:offset + self.batch_size], [])
+        self.save_index()
+        self.deliver(events)
+
+    def write(self, described: list, deleted: list) -> list:
+        """
+        One transaction for a batch of changed and deleted files, the file events of the rows it wrote
+        """
+        from bomiot.server.core.models import Files
+        keys = [row['key'] for row in described] + deleted
+        names = {PurePosixPath(key).name for key in keys}
+        existing = {}
+        for file_data in Files.objects.filter(owner__in={file_owner(key) for key in keys}, name__in=names).order_by('updated_time', 'id'):
+            existing[(file_data.owner, file_data.name)] = file_data
+        created = []
+        updated = []
+        removed = []
+        now = timezone.now()
+        for row in described:
+            entry = self.index.get(row['key'])
+            file_data = existing.get((row['owner'], row['name']))
+            if file_data is None:
+                file_data = Files(name=row['name'], type=row['type'], size=row['size'], owner=row['owner'], shared_to='')
+                created.append((row, file_data))
+                continue
+            # a touched file, or a file indexed for the first time which the table already holds
+            if file_data.size == row['size'] and not file_data.is_delete and (entry is None or (row['sha256'] and entry[2] == row['sha256'])):
+                self.index[row['key']] = [row['mtime'], row['size'], row['sha256'], file_data.id]
+                continue
+            file_data.size = row['size']
+            file_data.is_delete = False
+            file_data.updated_time = now
+            updated.append((row, file_data))
+        for key in deleted:
+            file_data = existing.get((file_owner(key), PurePosixPath(key).name))
+            if file_data is not None:
+                removed.append((key, file_data))
+        with transaction.atomic():
+            if created:
+                Files.objects.bulk_create([file_data for _, file_data in created], batch_size=self.batch_size)
+                if created[0][1].pk is None:
+                    # backends which do not return the ids of bulk_create
+                    ids = {(file_data.owner, file_data.name): file_data.id for file_data in Files.objects.filter(
+                        owner__in={row['owner'] for row, _ in created}, name__in={row['name'] for row, _ in created}).order_by('id')}
+                    for row, file_data in created:
+                        file_data.id = ids.get((row['owner'], row['name']))
+            if updated:
+                Files.objects.bulk_update([file_data for _, file_data in updated], ['size', 'is_delete', 'updated_time'],
+                                          batch_size=self.batch_size)
+            if removed:
+                Files.objects.filter(id__in=[file_data.id for _, file_data in removed]).delete()
+        events = []
+        for event, rows in (('create', created), ('update', updated)):
+            for row, file_data in rows:
+                self.index[row['key']] = [row['mtime'], row['size'], row['sha256'], file_data.id]
+                events.append(self.event(event, file_data, row['sha256']))
+        for key, file_data in removed:
+            events.append(self.event('delete', file_data, self.index[key][2]))
+        for key in deleted:
+            self.index.pop(key, None)
+        return events
+
+    @staticmethod
+    def event(event: str, file_data, digest: str) -> dict:
+        return {
+            'event': event,
+            'id': file_data.id,
+            'name': file_data.name,
+            'type': file_data.type,
+            'size': file_data.size,
+            'owner': file_data.owner,
+            'shared_to': file_data.shared_to,
+            'sha256': digest
+        }
+
+    def deliver(self, events: list) -> None:
+        """
+        FileClass.file_get of the project's files.py, called with a list of at most batch_size file events
+        """
+        if not events:
+            return
+        from main.dispatch import project_module
+        module = project_module(join(settings.WORKING_SPACE, settings.PROJECT_NAME, 'files.py'), 'files')
+        file_class = getattr(module, 'FileClass', None)
+        if file_class is None:
+            return
+        for offset in range(0, len(events), self.batch_size):
+            try:
+                file_class().file_get(events[offset:offset + self.batch_size])
+            except Exception as e:
+                logger.warning(f'files.py FileClass.file_get failed: {e}')
+
+    def load_index(self) -> dict:
+        try:
+            with open(self.index_path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+
+    def save_index(self) -> None:
+        os.makedirs(dirname(self.index_path), exist_ok=True)
+        with open(f'{self.index_path}.tmp', 'wb') as f:
+            f.write(orjson.dumps(self.index))
+        os.replace(f'{self.index_path}.tmp', self.index_path)
+
+
+media_indexer = MediaIndexer(settings.CONFIG)
@@ -0,0 +1,245 @@
+import orjson
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from bomiot.server.core.page import DataCorePageNumberPagination
+from bomiot.server.core.utils import flatten_json, all_fields_empty
+from bomiot.server.core.signal import bomiot_data_signals
+from main.dispatch import asend_robust
+from main.query import QueryError, parse_params
+
+
+def receiver_query_params(request) -> dict:
+    """
+    query_params of a get dispatch, params parsed
+    """
+    origin = request.query_params.dict()
+    try:
+        params_dict = parse_params(request.query_params.get('params', ''))
+    except QueryError:
+        params_dict = {}
+    origin['params'] = {} if all_fields_empty(params_dict) else params_dict
+    return origin
+
+
+def receiver_results(response_data: list, data_list: list, responses) -> list:
+    """
+    Merge the get receivers' answers into the response, results stay the page when no receiver sets them
+    """
+    for receiver, response in responses:
+        if isinstance(response, Exception):
+            raise response
+        if isinstance(response, list):
+            if not any(i[0] == 'results' for i in response):
+                response_data += [('results', data_list)]
+            response_data += response
+        if response is None:
+            response_data += [('results', data_list)]
+    return response_data
+
+
+class DataCoreCursorPagination(BasePagination):
+    """
+    Keyset pagination, seek on (ordering field, id) instead of OFFSET
+    Every page costs the same, count is only returned with count=true
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size = 30
+    page_size_query_param = "max_page"
+    max_page_size = 1000
+    ordering_fields = ['id', 'created_time', 'updated_time']
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset) -> tuple:
+        """
+        resolve (field, descending) from the ordered queryset
+        :param queryset: ordered queryset
+        :return: (field, descending)
+        """
+        ordering = queryset.query.order_by or ('-id',)
+        if not isinstance(ordering[0], str) or ordering[0].lstrip('-') not in self.ordering_fields:
+            raise ParseError(f"Cursor pagination only orders by {', '.join(self.ordering_fields)}")
+        return ordering[0].lstrip('-'), ordering[0].startswith('-')
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        value = row[self.field]
+        if self.field != 'id':
+            value = value.isoformat() if value else None
+        position = orjson.dumps({'v': value, 'id': row['id'], 'r': reverse})
+        return urlsafe_b64encode(position).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor: str):
+        if not cursor:
+            return None
+        try:
+            position = orjson.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            value = position['v']
+            if self.field != 'id':
+                value = parse_datetime(value)
+            return value, int(position['id']), bool(position['r'])
+        except (ValueError, TypeError, KeyError):
+            raise NotFound('Invalid cursor')
+
+    def seek_queryset(self, queryset, request) -> tuple:
+        """
+        Queryset of the page, one row more than the page size to know if there is a next page
+        :return: (queryset to count or None, queryset of the page)
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, descending = self.get_ordering(queryset)
+        count_queryset = None
+        if str(request.query_params.get(self.count_query_param, '')).lower() == 'true':
+            count_queryset = queryset
+        self.position = self.decode_cursor(request.query_params.get(self.cursor_query_param, ''))
+        self.reverse = self.position[2] if self.position else False
+        seek_descending = descending != self.reverse
+        lookup = 'lt' if seek_descending else 'gt'
+        if self.position:
+            value, pk = self.position[0], self.position[1]
+            if self.field == 'id':
+                queryset = queryset.filter(**{f'id__{lookup}': pk})
+            else:
+                queryset = queryset.filter(Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'id__{lookup}': pk}))
+        prefix = '-' if seek_descending else ''
+        order_by = [f'{prefix}{self.field}', f'{prefix}id'] if self.field != 'id' else [f'{prefix}id']
+        return count_queryset, queryset.order_by(*order_by)[:self.page_size + 1]
+
+    def page_results(self, results: list) -> list:
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+        self.next_cursor = None
+        self.previous_cursor = None
+        if results:
+            # model instances, or the rows of list_values
+            rows = [obj if isinstance(obj, dict) else {'id': obj.id, self.field: getattr(obj, self.field)}
+                    for obj in (results[0], results[-1])]
+            if (has_more and not self.reverse) or (self.position and self.reverse):
+                self.next_cursor = self.encode_cursor(rows[1], False)
+            if (has_more and self.reverse) or (self.position and not self.reverse):
+                self.previous_cursor = self.encode_cursor(rows[0], True)
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count_queryset, page_queryset = self.seek_queryset(queryset, request)
+        self.count = count_queryset.count() if count_queryset is not None else None
+        return self.page_results(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        count_queryset, page_queryset = self.seek_queryset(queryset, request)
+        self.count = await count_queryset.acount() if count_queryset is not None else None
+        return self.page_results([obj async for obj in page_queryset])
+
+    def _build_absolute_url(self, cursor):
+        """
+        resoleve absolute URL
+        :param cursor: cursor
+        :return: full URL
+        """
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        ssl_scheme = self.request.scheme
+        url_parts = str(url).split(':', 1)
+        if url_parts[0] != ssl_scheme:
+            # Fix URL SSL scheme
+            url = f"{ssl_scheme}:{url_parts[1]}"
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def query_data_add(self) -> list:
+        return []
+
+    def get_paginated_data(self, data) -> tuple:
+        response_data = [
+            ('count', self.count),
+            ('next', self._build_absolute_url(self.next_cursor)),
+            ('previous', self._build_absolute_url(self.previous_cursor)),
+            ('next_cursor', self.next_cursor),
+            ('previous_cursor', self.previous_cursor),
+        ]
+        return response_data, list(map(lambda x: flatten_json(x) if isinstance(x, dict) else x, data))
+
+    def get_paginated_response(self, data):
+        response_data, data_list = self.get_paginated_data(data)
+        responses = bomiot_data_signals.send_robust(sender=self.__class__,
+                                                    request=self.request,
+                                                    mode='get',
+                                                    query_params=receiver_query_params(self.request),
+                                                    data=data_list)
+        response_data = receiver_results(response_data, data_list, responses)
+        response_data += self.query_data_add()
+        return Response(OrderedDict(response_data))
+
+    async def aget_paginated_response(self, data):
+        response_data, data_list = self.get_paginated_data(data)
+        responses = await asend_robust(bomiot_data_signals, sender=self.__class__,
+                                       request=self.request,
+                                       mode='get',
+                                       query_params=receiver_query_params(self.request),
+                                       data=data_list)
+        response_data = receiver_results(response_data, data_list, responses)
+        response_data += self.query_data_add()
+        return Response(OrderedDict(response_data))
+
+
+class DataCoreAsyncPageNumberPagination(DataCorePageNumberPagination):
+    """
+    DataCorePageNumberPagination for the async views, the count and the page are read with the async ORM
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, set it so the page lookup does not count synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_data(self, data) -> tuple:
+        response_data = [
+            ('count', self.page.paginator.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ]
+        return response_data, list(map(lambda x: flatten_json(x) if isinstance(x, dict) else x, data))
+
+    async def aget_paginated_response(self, data):
+        response_data, data_list = self.get_paginated_data(data)
+        responses = await asend_robust(bomiot_data_signals, sender=self.__class__,
+                                       request=self.request,
+                                       mode='get',
+                                       query_params=receiver_query_params(self.request),
+                                       data=data_list)
+        response_data = receiver_results(response_data, data_list, responses)
+        response_data += self.query_data_add()
+        return Response(OrderedDict(response_data))
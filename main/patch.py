@@ -0,0 +1,263 @@
+import orjson
+
+from django.db import connections, router
+from django.db.models import F, Func, JSONField, BigIntegerField
+from django.db.models.lookups import Exact
+from bomiot.server.core import models
+from bomiot.server.core.utils import compare_dicts
+
+
+# version of a record, a data key so the lists, exports and receivers carry it without a change of bomiot's serializers
+# a trigger moves it on with every write of data, whoever writes the record
+VERSION_KEY = '_version'
+
+VERSION_TRIGGER = 'wms_version_'
+
+# keys a patch never writes, same as the update flow pops
+PATCH_IGNORED = ('id', 'is_delete', 'created_time', 'updated_time')
+
+PATCH_VENDORS = ('sqlite', 'postgresql', 'mysql')
+
+
+class VersionConflict(Exception):
+    """
+    The record was written since the client read it
+    """
+    pass
+
+
+def record_version(data) -> int:
+    version = data.get(VERSION_KEY, 0) if isinstance(data, dict) else 0
+    return version if isinstance(version, int) and not isinstance(version, bool) else 0
+
+
+def document_changes(old: dict, data: dict) -> dict:
+    """
+    updated_fields of a whole document write, the keys it does not send are removed and change to None
+    :param old: record as queryset_to_dict returns it
+    :param data: request data
+    """
+    updated_fields = compare_dicts(old, {**old, **data})
+    updated_fields.update({key: (old[key], None) for key in old
+                           if key not in data and key not in PATCH_IGNORED and key != VERSION_KEY})
+    return updated_fields
+
+
+def split_patch(data) -> tuple:
+    """
+    Split a patch payload, a null value removes the key
+    :param data: request data, {"id": 1, "_version": 3, "qty": 5}
+    :return: (id, expected version or None, {key: value}, [removed keys])
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Patch data must be a JSON object')
+    record_id = data.get('id')
+    if not isinstance(record_id, int) or isinstance(record_id, bool):
+        raise ValueError('Record id is required')
+    version = data.get(VERSION_KEY)
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool) or version < 0):
+        raise ValueError(f"'{VERSION_KEY}' must be a non-negative integer")
+    changes = {}
+    removes = []
+    for key, value in data.items():
+        if key in PATCH_IGNORED or key == VERSION_KEY:
+            continue
+        if not key or '"' in key or '\\' in key:
+            raise ValueError(f"Invalid key '{key}'")
+        if value is None:
+            removes.append(key)
+        else:
+            changes[key] = value
+    if not changes and not removes:
+        raise ValueError('Nothing to update')
+    return record_id, version, changes, removes
+
+
+def json_path(key: str) -> str:
+    return f'$."{key}"'
+
+
+class JsonVersion(Func):
+    """
+    Version of Example.data, 0 when the record was never versioned
+    """
+    output_field = BigIntegerField()
+
+    def __init__(self, **extra):
+        super().__init__(F('data'), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        return f"COALESCE(json_extract({column_sql}, %s), 0)", [*params, json_path(VERSION_KEY)]
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        return f"COALESCE(({column_sql} ->> %s)::bigint, 0)", [*params, VERSION_KEY]
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        return f"COALESCE(CAST(JSON_EXTRACT({column_sql}, %s) AS SIGNED), 0)", [*params, json_path(VERSION_KEY)]
+
+
+class JsonPatch(Func):
+    """
+    Example.data with the changed keys set and the removed keys dropped, the rest of the document is not sent
+    SQLite json_set / json_remove, PostgreSQL jsonb || and -, MySQL JSON_SET / JSON_REMOVE
+    """
+    output_field = JSONField()
+
+    def __init__(self, changes: dict, removes: list, **extra):
+        self.changes = changes
+        self.removes = removes
+        super().__init__(F('data'), **extra)
+
+    def json_set(self, column_sql: str, value_sql: str, params: list) -> tuple:
+        """
+        JSON_REMOVE / JSON_SET, same names and path syntax on SQLite and MySQL
+        :param value_sql: placeholder which turns JSON text into a JSON value
+        """
+        sql = column_sql
+        if self.removes:
+            sql = f"JSON_REMOVE({sql}, {', '.join(['%s'] * len(self.removes))})"
+            params += [json_path(key) for key in self.removes]
+        if self.changes:
+            sql = f"JSON_SET({sql}, {', '.join([f'%s, {value_sql}'] * len(self.changes))})"
+            for key, value in self.changes.items():
+                params += [json_path(key), orjson.dumps(value).decode()]
+        return sql, params
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        return self.json_set(column_sql, 'json(%s)', list(params))
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        return self.json_set(column_sql, 'CAST(%s AS JSON)', list(params))
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        sql = f"({column_sql} || %s::jsonb)"
+        params = [*params, orjson.dumps(self.changes).decode()]
+        if self.removes:
+            sql = f"({sql} - %s::text[])"
+            params.append(list(self.removes))
+        return sql, params
+
+
+def patch_rows(queryset, changes: dict, removes: list, version: int, **fields) -> int:
+    """
+    Write the changed keys of the record of the queryset when it still has the expected version
+    The version goes up by one in the same statement
+    :param queryset: queryset of one record
+    :param changes: {key: value} to set
+    :param removes: keys to drop
+    :param version: expected version
+    :param fields: model fields to update too, like updated_time
+    :return: updated rows, 0 when the record is gone or has another version
+    """
+    changes = {**changes, VERSION_KEY: version + 1}
+    if connections[router.db_for_write(queryset.model)].vendor in PATCH_VENDORS:
+        return queryset.filter(Exact(JsonVersion(), version)).update(data=JsonPatch(changes, removes), **fields)
+    # other databases read and write the locked row
+    obj = queryset.select_for_update().first()
+    if obj is None or record_version(obj.data) != version:
+        return 0
+    obj.data = {key: value for key, value in obj.data.items() if key not in removes}
+    obj.data.update(changes)
+    for name, value in fields.items():
+        setattr(obj, name, value)
+    obj.save(update_fields=['data', *fields])
+    return 1
+
+
+def replace_rows(queryset, data: dict, version: int, **fields) -> int:
+    """
+    Write the whole document of the record of the queryset when it still has the expected version
+    The version goes up by one in the same statement
+    :param queryset: queryset of one record
+    :param data: new document
+    :param version: expected version, the one of the document the request read
+    :param fields: model fields to update too, like updated_time
+    :return: updated rows, 0 when the record is gone or has another version
+    """
+    data = {**data, VERSION_KEY: version + 1}
+    if connections[router.db_for_write(queryset.model)].vendor in PATCH_VENDORS:
+        return queryset.filter(Exact(JsonVersion(), version)).update(data=data, **fields)
+    obj = queryset.select_for_update().first()
+    if obj is None or record_version(obj.data) != version:
+        return 0
+    obj.data = data
+    for name, value in fields.items():
+        setattr(obj, name, value)
+    obj.save(update_fields=['data', *fields])
+    return 1
+
+
+def locked_versions(queryset) -> dict:
+    """
+    {id: version} of the records of the queryset, locked until the transaction ends
+    Call it inside transaction.atomic, before a write which only holds for the versions read earlier
+    """
+    queryset = queryset.select_for_update()
+    if connections[router.db_for_write(queryset.model)].vendor in PATCH_VENDORS:
+        return dict(queryset.values_list('id', JsonVersion()))
+    return {record_id: record_version(data) for record_id, data in queryset.values_list('id', 'data')}
+
+
+def version_trigger_statements(vendor: str, create: bool = True) -> list:
+    """
+    DROP and CREATE of the trigger which moves the version on, for every write of Example.data
+    bomiot's handlers and receivers which write data without the version can not take it back to 0
+    """
+    table = models.Example._meta.db_table
+    name = f'{VERSION_TRIGGER}{table}'
+    statements = []
+    if vendor == 'sqlite':
+        statements.append(f'DROP TRIGGER IF EXISTS "{name}"')
+    elif vendor == 'postgresql':
+        statements.append(f'DROP TRIGGER IF EXISTS "{name}" ON "{table}"')
+        statements.append(f'DROP FUNCTION IF EXISTS "{name}"()')
+    elif vendor == 'mysql':
+        statements.append(f'DROP TRIGGER IF EXISTS `{name}`')
+    if not create:
+        return statements
+    if vendor == 'sqlite':
+        # the UPDATE of the trigger does not fire it again, recursive_triggers is off
+        version = f"(CASE WHEN json_type(OLD.\"data\", '{json_path(VERSION_KEY)}') = 'integer' THEN json_extract(OLD.\"data\", '{json_path(VERSION_KEY)}') ELSE 0 END)"
+        statements.append(
+            f'CREATE TRIGGER "{name}" AFTER UPDATE OF "data" ON "{table}" WHEN json_type(NEW."data") = \'object\' BEGIN '
+            f'UPDATE "{table}" SET "data" = json_set(NEW."data", \'{json_path(VERSION_KEY)}\', {version} + 1) WHERE "id" = NEW."id"; END')
+    elif vendor == 'postgresql':
+        version = f"(CASE WHEN jsonb_typeof(OLD.\"data\" -> '{VERSION_KEY}') = 'number' THEN (OLD.\"data\" ->> '{VERSION_KEY}')::numeric::bigint ELSE 0 END)"
+        statements += [
+            f'CREATE FUNCTION "{name}"() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+            f"IF jsonb_typeof(NEW.\"data\") = 'object' THEN "
+            f"NEW.\"data\" := jsonb_set(NEW.\"data\", '{{{VERSION_KEY}}}', to_jsonb({version} + 1)); END IF; "
+            f'RETURN NEW; END $$',
+            f'CREATE TRIGGER "{name}" BEFORE UPDATE OF "data" ON "{table}" FOR EACH ROW EXECUTE FUNCTION "{name}"()',
+        ]
+    elif vendor == 'mysql':
+        # mysql has no UPDATE OF, a write which leaves data as it was keeps the version
+        version = f"COALESCE(CAST(JSON_EXTRACT(OLD.`data`, '{json_path(VERSION_KEY)}') AS SIGNED), 0)"
+        statements.append(
+            f'CREATE TRIGGER `{name}` BEFORE UPDATE ON `{table}` FOR EACH ROW '
+            f"SET NEW.`data` = IF(JSON_TYPE(NEW.`data`) = 'OBJECT' AND NOT (NEW.`data` <=> OLD.`data`), "
+            f"JSON_SET(NEW.`data`, '{json_path(VERSION_KEY)}', {version} + 1), NEW.`data`)")
+    return statements
+
+
+def ensure_version_trigger(using: str = 'default') -> None:
+    """
+    Create the trigger again, a rebuilt sqlite table loses its triggers
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for statement in version_trigger_statements(connection.vendor):
+            cursor.execute(statement)
+
+
+def drop_version_trigger(using: str = 'default') -> None:
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for statement in version_trigger_statements(connection.vendor, create=False):
+            cursor.execute(statement)
@@ -0,0 +1,164 @@
+import threading
+import time
+
+from collections import deque
+from django.db.utils import OperationalError
+
+
+class ConnectionPool:
+    """
+    Per process pool of raw DB-API connections, shared by every thread of a worker
+    Last released is handed out first, so idle connections stay warm
+    """
+    def __init__(self, size: int = 10, timeout: float = 30, recycle: float = 3600, check_idle: float = 30):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.check_idle = check_idle
+        self.opened = 0
+        self.created = 0
+        self.acquired = 0
+        self.recycled = 0
+        self.failed_checks = 0
+        self.waits = 0
+        self.timeouts = 0
+        self._idle = deque()
+        self._created = {}
+        self._cond = threading.Condition()
+
+    def acquire(self, connect, ping):
+        """
+        Idle connection or a new one when the pool is not full, waits up to timeout seconds
+        :param connect: callable which opens a new connection
+        :param ping: callable(connection) -> bool, run on connections idle for more than check_idle seconds
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            item = None
+            with self._cond:
+                while not self._idle and self.opened >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise OperationalError(f'No free database connection in {self.timeout} seconds, pool size is {self.size}')
+                    self.waits += 1
+                    self._cond.wait(remaining)
+                if self._idle:
+                    item = self._idle.pop()
+                else:
+                    self.opened += 1
+                self.acquired += 1
+            if item is None:
+                try:
+                    connection = connect()
+                except Exception:
+                    self._discard(None)
+                    raise
+                self._created[id(connection)] = time.monotonic()
+                self.created += 1
+                return connection
+            connection, created, released = item
+            now = time.monotonic()
+            if self.recycle and now - created > self.recycle:
+                self.recycled += 1
+                self._discard(connection)
+                continue
+            if now - released > self.check_idle and not ping(connection):
+                self.failed_checks += 1
+                self._discard(connection)
+                continue
+            return connection
+
+    def release(self, connection, reuse: bool = True) -> None:
+        if not reuse:
+            self._discard(connection)
+            return
+        now = time.monotonic()
+        with self._cond:
+            self._idle.append((connection, self._created.get(id(connection), now), now))
+            self._cond.notify()
+
+    def _discard(self, connection) -> None:
+        if connection is not None:
+            self._created.pop(id(connection), None)
+            try:
+                connection.close()
+            except Exception:
+                pass
+        with self._cond:
+            self.opened -= 1
+            self._cond.notify()
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, created, released in idle:
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'opened': self.opened,
+            'idle': len(self._idle),
+            'created': self.created,
+            'acquired': self.acquired,
+            'recycled': self.recycled,
+            'failed_checks': self.failed_checks,
+            'waits': self.waits,
+            'timeouts': self.timeouts,
+        }
+
+
+POOLS = {}
+
+_pools_lock = threading.Lock()
+
+
+def connection_pool(alias: str, options: dict) -> ConnectionPool:
+    pool = POOLS.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = POOLS.get(alias)
+            if pool is None:
+                pool = POOLS[alias] = ConnectionPool(**options)
+    return pool
+
+
+def pool_stats() -> dict:
+    return {alias: pool.stats() for alias, pool in POOLS.items()}
+
+
+class PooledDatabaseMixin:
+    """
+    DatabaseWrapper mixin, connect borrows from the pool of the alias and close gives the connection back
+    Pool options are read from the POOL key of the database settings
+    """
+    def get_new_connection(self, conn_params):
+        pool = connection_pool(self.alias, self.settings_dict['POOL'])
+        return pool.acquire(lambda: super(PooledDatabaseMixin, self).get_new_connection(conn_params), self.ping)
+
+    @staticmethod
+    def ping(connection) -> bool:
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+            cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = connection_pool(self.alias, self.settings_dict['POOL'])
+        # a connection closed inside atomic stays referenced by the wrapper, never hand it out again
+        reuse = not self.in_atomic_block and (not self.errors_occurred or self.is_usable())
+        if reuse:
+            try:
+                self.connection.rollback()
+            except Exception:
+                reuse = False
+        with self.wrap_database_errors:
+            pool.release(self.connection, reuse)
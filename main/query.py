@@ -0,0 +1,366 @@
+import ast
+import orjson
+
+from django.conf import settings
+from django.db import router
+from django.db.models import Q, F, Func, Expression, CharField, IntegerField, FloatField, TextField
+from django.db.models import lookups
+from bomiot.server.core.utils import all_fields_empty
+from main.indexes import hot_path, has_scope_columns, scope_column, KEY_PATTERN, SCOPE_COLUMNS
+
+
+class QueryError(ValueError):
+    """
+    Raised when the params payload can not be compiled
+    """
+    pass
+
+
+OPERATORS = {
+    'exact': lookups.Exact,
+    'iexact': lookups.IExact,
+    'ne': lookups.Exact,
+    'lt': lookups.LessThan,
+    'lte': lookups.LessThanOrEqual,
+    'gt': lookups.GreaterThan,
+    'gte': lookups.GreaterThanOrEqual,
+    'in': lookups.In,
+    'contains': lookups.Contains,
+    'icontains': lookups.IContains,
+    'startswith': lookups.StartsWith,
+    'istartswith': lookups.IStartsWith,
+    'isnull': lookups.IsNull,
+}
+
+GROUPS = {
+    '$and': Q.AND,
+    '$or': Q.OR,
+}
+
+RESERVED = ['is_delete', 'order_by']
+
+MODEL_FIELDS = ['id', 'created_time', 'updated_time']
+
+SCALARS = (str, int, float, bool, type(None))
+
+MAX_FIELDS = 100
+
+# vendors which select a data key as JSON text, the others read data and project it in python
+JSON_TEXT_VENDORS = ['sqlite', 'postgresql', 'mysql']
+
+OUTPUT_FIELDS = {
+    'text': CharField,
+    'int': IntegerField,
+    'number': FloatField,
+}
+
+
+class JsonValue(Func):
+    """
+    JSON path of Example.data rendered exactly like its expression index
+    """
+    def __init__(self, index, **extra):
+        self.index = index
+        super().__init__(F('data'), output_field=OUTPUT_FIELDS[index.type](), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        return self.index.expression(connection.vendor, column_sql), params
+
+
+class ScopeValue(Expression):
+    """
+    Generated scope column of a resource table, the model does not declare it
+    """
+    def __init__(self, index):
+        self.index = index
+        super().__init__(output_field=OUTPUT_FIELDS[index.type]())
+
+    def as_sql(self, compiler, connection, **extra_context):
+        table = compiler.quote_name_unless_alias(compiler.query.base_table)
+        return f'{table}.{connection.ops.quote_name(scope_column(self.index.key))}', []
+
+
+class JsonText(Func):
+    """
+    One key of Example.data as JSON text, NULL when data does not have the key
+    Strings stay quoted, so '123' is not read back as a number like a key transform on sqlite
+    """
+    def __init__(self, key, **extra):
+        self.key = key
+        super().__init__(F('data'), output_field=TextField(), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.source_expressions[0])
+        return json_text_sql(connection, column_sql, self.key), params
+
+
+def json_text_sql(connection, column: str, key: str) -> str:
+    # the key matched KEY_PATTERN, it is safe in the SQL text
+    if connection.vendor == 'postgresql':
+        return f"({column} -> '{key}')::text"
+    if connection.vendor == 'mysql':
+        return f"CAST(JSON_EXTRACT({column}, '$.\"{key}\"') AS CHAR)"
+    if connection.Database.sqlite_version_info >= (3, 38):
+        return f"({column} -> '$.{key}')"
+    path = f"'$.{key}'"
+    return (f"(CASE JSON_TYPE({column}, {path}) WHEN 'text' THEN JSON_QUOTE(JSON_EXTRACT({column}, {path})) "
+            f"WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' WHEN 'null' THEN 'null' "
+            f"ELSE CAST(JSON_EXTRACT({column}, {path}) AS TEXT) END)")
+
+
+def parse_params(params: str) -> dict:
+    """
+    Strict parser of the params query string
+    Accept JSON, and the single quoted payload which the old frontend sends
+    :param params: raw params string
+    :return: dict
+    """
+    if not params:
+        return {}
+    query_data = None
+    for loader in (orjson.loads, lambda x: orjson.loads(x.replace("'", '"')), ast.literal_eval):
+        try:
+            query_data = loader(params)
+            break
+        except (ValueError, SyntaxError):
+            continue
+    if not isinstance(query_data, dict):
+        raise QueryError('params must be a JSON object')
+    return query_data
+
+
+def split_field(field: str) -> tuple:
+    """
+    Split data__qty__gte into (['data', 'qty'], 'gte')
+    :param field: filter key
+    :return: (path, operator)
+    """
+    parts = field.split('__')
+    operator = 'exact'
+    if len(parts) > 1 and parts[-1] in OPERATORS:
+        operator = parts.pop()
+    if not all(KEY_PATTERN.match(part) for part in parts):
+        raise QueryError(f"Invalid filter field '{field}'")
+    if parts[0] == 'data':
+        if len(parts) < 2:
+            raise QueryError(f"Invalid filter field '{field}'")
+    elif len(parts) != 1 or parts[0] not in MODEL_FIELDS:
+        raise QueryError(f"Unsupported filter field '{field}'")
+    return parts, operator
+
+
+def parse_fields(value: str):
+    """
+    Parse fields=goods_code,goods_name into the data keys a list returns, None without fields
+    id, created_time and updated_time are always returned
+    """
+    if not value:
+        return None
+    fields = []
+    for key in value.replace(' ', '').split(','):
+        if not key or key in MODEL_FIELDS or key in fields:
+            continue
+        if not KEY_PATTERN.match(key):
+            raise QueryError(f"Invalid field '{key}'")
+        fields.append(key)
+    if len(fields) > MAX_FIELDS:
+        raise QueryError(f'fields takes at most {MAX_FIELDS} keys')
+    return fields
+
+
+def check_value(field: str, operator: str, value):
+    """
+    Type check the value against its operator
+    """
+    if operator == 'isnull':
+        valid = isinstance(value, bool)
+    elif operator == 'in':
+        valid = isinstance(value, list) and len(value) > 0 and all(
+            isinstance(item, SCALARS) and item is not None for item in value)
+    elif operator in ['lt', 'lte', 'gt', 'gte']:
+        valid = isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    elif operator in ['iexact', 'contains', 'icontains', 'startswith', 'istartswith']:
+        valid = isinstance(value, str)
+    else:
+        valid = isinstance(value, SCALARS)
+    if not valid:
+        raise QueryError(f"Invalid value for '{field}'")
+    return value
+
+
+def coerce_value(index, field: str, value):
+    """
+    Convert the value to the declared type of a hot path
+    """
+    if isinstance(value, list):
+        return [coerce_value(index, field, item) for item in value]
+    if isinstance(value, bool):
+        if index.type == 'text':
+            raise QueryError(f"Invalid value for '{field}'")
+        return int(value)
+    try:
+        if index.type == 'int':
+            return int(value)
+        if index.type == 'number':
+            return float(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"Invalid value for '{field}'")
+    return str(value)
+
+
+def compile_condition(field: str, value, vendor: str) -> Q:
+    """
+    Compile one filter into Q, hot paths use their indexed expression
+    :param field: filter key, like data__goods_code__icontains
+    :param value: filter value
+    :param vendor: database vendor
+    :return: Q
+    """
+    path, operator = split_field(field)
+    check_value(field, operator, value)
+    if value is None and operator in ['exact', 'ne']:
+        value = operator == 'exact'
+        operator = 'isnull'
+    index = hot_path(path[1]) if len(path) == 2 and vendor in ['sqlite', 'postgresql'] else None
+    if index is not None:
+        if operator != 'isnull':
+            value = coerce_value(index, field, value)
+        query = Q(OPERATORS[operator](JsonValue(index), value))
+    elif operator == 'ne':
+        query = Q(**{'__'.join(path): value})
+    else:
+        query = Q(**{'__'.join(path + [operator]): value})
+    if operator == 'ne':
+        return ~query
+    return query
+
+
+def compile_node(node: dict, vendor: str, connector: str = Q.AND) -> Q:
+    """
+    Compile a group of filters
+    Plain filters are joined by the connector, $and / $or groups are ANDed with them
+    :param node: filter dict
+    :param vendor: database vendor
+    :param connector: Q.AND or Q.OR
+    :return: Q
+    """
+    if not isinstance(node, dict):
+        raise QueryError('Filter group must be a JSON object')
+    conditions = []
+    groups = []
+    for key, value in node.items():
+        if key in GROUPS:
+            if not isinstance(value, list) or not value:
+                raise QueryError(f"'{key}' must be a non-empty list")
+            groups.append(Q(*[compile_node(item, vendor) for item in value], _connector=GROUPS[key]))
+        elif key in RESERVED:
+            raise QueryError(f"'{key}' is only allowed at the top level")
+        else:
+            conditions.append(compile_condition(key, value, vendor))
+    query = Q(*conditions, _connector=connector) if conditions else Q()
+    for group in groups:
+        query &= group
+    return query
+
+
+def compile_ordering(ordering, vendor: str) -> list:
+    """
+    Compile order_by, hot paths order by their indexed expression
+    :param ordering: like -id or data__goods_code
+    :param vendor: database vendor
+    :return: order_by arguments
+    """
+    if not isinstance(ordering, str) or not ordering:
+        raise QueryError('order_by must be a field name')
+    descending = ordering.startswith('-')
+    path, operator = split_field(ordering.lstrip('-'))
+    if operator != 'exact' or ordering.lstrip('-') != '__'.join(path):
+        raise QueryError(f"Invalid order_by '{ordering}'")
+    index = hot_path(path[1]) if len(path) == 2 and vendor in ['sqlite', 'postgresql'] else None
+    if index is None:
+        return [ordering]
+    if descending:
+        return [JsonValue(index).desc()]
+    return [JsonValue(index).asc()]
+
+
+def compile_query(query_data: dict, vendor: str) -> tuple:
+    """
+    Compile the params payload of a list request
+    Top level filters keep the old OR behaviour, use $and / $or for grouping
+    :param query_data: parsed params
+    :param vendor: database vendor
+    :return: (is_delete, ordering, Q)
+    """
+    query_data = dict(query_data)
+    is_delete = query_data.pop('is_delete', False)
+    if not isinstance(is_delete, bool):
+        raise QueryError("'is_delete' must be true or false")
+    ordering = compile_ordering(query_data.pop('order_by', '-id'), vendor)
+    return is_delete, ordering, compile_node(query_data, vendor, Q.OR)
+
+
+def scope_condition(model, project_name: str, is_delete: bool, department: int, vendor: str) -> Q:
+    """
+    Project / delete label / department scoping shared by every list
+    The department is compared on its scope column when the table has them, on data otherwise
+    """
+    if has_scope_columns(model._meta.db_table, router.db_for_read(model)):
+        # is_delete = false renders as NOT is_delete, which sqlite can not match to the second column of the index
+        return Q(project=project_name, is_delete__in=[is_delete]) & Q(
+            lookups.GreaterThanOrEqual(ScopeValue(SCOPE_COLUMNS['department']), department))
+    return Q(project=project_name, is_delete=is_delete) & compile_condition('data__department__gte', department, vendor)
+
+
+def list_queryset(model, request, vendor: str):
+    """
+    Rows of a list request: project header, params filter and ordering, department scoping
+    Deleted rows and ?archive=true also read the archive of the resource
+    Raises QueryError when the params payload can not be compiled
+    """
+    from main.archive import list_model
+    project_name = request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+    if project_name.lower() == 'bomiot':
+        project_name = settings.PROJECT_NAME
+    query_data = parse_params(request.query_params.get('params', ''))
+    if all_fields_empty(query_data):
+        query_data = {}
+    is_delete, ordering, query_conditions = compile_query(query_data, vendor)
+    model = list_model(model, request, is_delete)
+    department = request.auth.department if request.auth else 0
+    scope = scope_condition(model, project_name, is_delete, department, vendor)
+    return model.objects.filter(scope).filter(query_conditions).order_by(*ordering)
+
+
+def list_values(queryset, fields, vendor: str):
+    """
+    Rows of a list as dicts, no model instances
+    With fields only those keys of data are selected, the rest of data does not leave the database
+    """
+    if fields is None or vendor not in JSON_TEXT_VENDORS:
+        return queryset.values(*MODEL_FIELDS, 'data')
+    return queryset.values(*MODEL_FIELDS, **{f'json_{i}': JsonText(key) for i, key in enumerate(fields)})
+
+
+def list_row(row: dict, fields) -> dict:
+    """
+    A row of list_values in the shape of ExampleSerializer, which flatten_json takes
+    Keys data does not have are left out, like in the whole data
+    """
+    if 'data' in row:
+        data = row['data']
+        if fields is not None:
+            data = {key: data[key] for key in fields if key in data}
+    else:
+        data = {}
+        for i, key in enumerate(fields):
+            value = row[f'json_{i}']
+            if value is not None:
+                data[key] = orjson.loads(value)
+    return {
+        'id': row['id'],
+        'data': data,
+        'created_time': row['created_time'].strftime('%Y-%m-%d %H:%M:%S'),
+        'updated_time': row['updated_time'].strftime('%Y-%m-%d %H:%M:%S'),
+    }
@@ -0,0 +1,58 @@
+import orjson
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# datetimes and the types orjson does not know are encoded like DRF does
+ENCODER = JSONEncoder()
+
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+REPLACED = {
+    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer', 'main.renderers.ORJSONRenderer'),
+    'DEFAULT_PARSER_CLASSES': ('rest_framework.parsers.JSONParser', 'main.renderers.ORJSONParser'),
+}
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson, the same JSON for the data DRF views return
+    Data orjson can not encode, like integers above 64 bits, goes to JSONRenderer
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        try:
+            return orjson.dumps(data, default=ENCODER.default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser decoding with orjson, NaN and Infinity are rejected like STRICT_JSON does
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+def use_orjson(rest_framework: dict) -> None:
+    """
+    Swap JSONRenderer and JSONParser of the DRF defaults for the orjson ones, in place
+    """
+    for name, (origin, replacement) in REPLACED.items():
+        classes = rest_framework.get(name)
+        if classes and origin in classes:
+            rest_framework[name] = [replacement if path == origin else path for path in classes]
@@ -0,0 +1,358 @@
+import logging
+import time
+import orjson
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from bomiot.server.core import models
+from main.archive import closed_rules
+from main.indexes import JsonIndex
+from main.jobs import job_queue, queue_task
+from main.wms.models import StockRollup
+
+
+logger = logging.getLogger(__name__)
+
+TRIGGER_PREFIX = 'wms_rollup_'
+
+# quantity columns of the rollup
+QUANTITIES = ('onhand', 'can_order', 'inbound', 'outbound')
+
+# width of the goods_code and bin_name columns
+KEY_LENGTH = 255
+
+
+def quote(vendor: str, name: str) -> str:
+    return f'`{name}`' if vendor == 'mysql' else f'"{name}"'
+
+
+def literal(value) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def json_text(vendor: str, row: str, key: str) -> str:
+    if vendor == 'postgresql':
+        return f"({row}.\"data\" ->> '{key}')"
+    if vendor == 'mysql':
+        return f"JSON_UNQUOTE(JSON_EXTRACT({row}.`data`, '$.{key}'))"
+    return f"CAST(JSON_EXTRACT({row}.\"data\", '$.{key}') AS TEXT)"
+
+
+def json_number(vendor: str, row: str, key: str) -> str:
+    """
+    A JSON number, 0 for anything else, a bad value never fails the write of its row
+    """
+    if vendor == 'postgresql':
+        return f"(CASE WHEN jsonb_typeof({row}.\"data\" -> '{key}') = 'number' THEN ({row}.\"data\" ->> '{key}')::double precision ELSE 0 END)"
+    if vendor == 'mysql':
+        return (f"(CASE WHEN JSON_TYPE(JSON_EXTRACT({row}.`data`, '$.{key}')) IN ('INTEGER', 'UNSIGNED INTEGER', 'DOUBLE', 'DECIMAL') "
+                f"THEN JSON_EXTRACT({row}.`data`, '$.{key}') + 0 ELSE 0 END)")
+    return f"(CASE WHEN JSON_TYPE({row}.\"data\", '$.{key}') IN ('integer', 'real') THEN JSON_EXTRACT({row}.\"data\", '$.{key}') ELSE 0 END)"
+
+
+def json_is_not(vendor: str, row: str, key: str, value) -> str:
+    # a missing key is not the value
+    if vendor == 'postgresql':
+        return f"({row}.\"data\" -> '{key}') IS DISTINCT FROM {literal(to_json(value))}::jsonb"
+    if vendor == 'mysql':
+        return f"NOT (JSON_EXTRACT({row}.`data`, '$.{key}') <=> CAST({literal(to_json(value))} AS JSON))"
+    return f"JSON_EXTRACT({row}.\"data\", '$.{key}') IS NOT {literal(value)}"
+
+
+def to_json(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+class Rollup:
+    """
+    Stock on hand per (project, goods, bin), wms_stock_rollup
+    Triggers on the stock, ASN and DN tables apply the change of every written row in the transaction of the write,
+    so bomiot's handlers, the batch APIs, imports and the archive keep it current without any code of their own
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('stock', 'enable', fallback=True)
+        self.goods = JsonIndex(config.get('stock', 'goods', fallback='goods_code'))
+        self.bin = JsonIndex(config.get('stock', 'bin', fallback='bin_name'))
+        self.onhand = JsonIndex(config.get('stock', 'onhand', fallback='onhand_stock')).key
+        self.can_order = JsonIndex(config.get('stock', 'can_order', fallback='can_order_stock')).key
+        self.qty = JsonIndex(config.get('stock', 'qty', fallback='goods_qty')).key
+        self.closed = closed_rules(config.get('stock', 'closed', fallback='asn:asn_status=5,dn:dn_status=5'))
+        for key, _ in self.closed.values():
+            JsonIndex(key)
+        self.minutes = max(config.getint('stock', 'minutes', fallback=1440), 1)
+
+    def supported(self, vendor: str) -> bool:
+        return self.enable and vendor in ['sqlite', 'postgresql']
+
+    def sources(self) -> dict:
+        """
+        resource -> (model, {rollup column: data key}) of every table the rollup sums
+        Open ASN lines are inbound and open DN lines outbound, a closed line is already in the stock rows
+        """
+        return {
+            'stock': (models.Stock, {'onhand': self.onhand, 'can_order': self.can_order}),
+            'asn': (models.ASN, {'inbound': self.qty}),
+            'dn': (models.DN, {'outbound': self.qty}),
+        }
+
+    def contribution(self, vendor: str, resource: str, row: str) -> tuple:
+        """
+        (condition, goods, bin, {rollup column: quantity}) of a row, row is NEW, OLD or a table alias
+        """
+        is_delete = quote(vendor, 'is_delete')
+        goods = f'SUBSTR({json_text(vendor, row, self.goods.key)}, 1, {KEY_LENGTH})'
+        conditions = [f'NOT {row}.{is_delete}', f'{goods} IS NOT NULL', f"{goods} <> ''"]
+        if resource in self.closed:
+            conditions.append(json_is_not(vendor, row, *self.closed[resource]))
+        bin_name = f"COALESCE(SUBSTR({json_text(vendor, row, self.bin.key)}, 1, {KEY_LENGTH}), '')"
+        columns = self.sources()[resource][1]
+        quantities = {column: json_number(vendor, row, columns[column]) if column in columns else '0' for column in QUANTITIES}
+        return f"({' AND '.join(conditions)})", goods, bin_name, quantities
+
+    def upsert(self, vendor: str, resource: str, row: str, sign: str) -> str:
+        """
+        Add (sign +) or take (sign -) the contribution of a row to its rollup row
+        """
+        table = StockRollup._meta.db_table
+        _, goods, bin_name, quantities = self.contribution(vendor, resource, row)
+        columns = ', '.join(f'"{column}"' for column in QUANTITIES)
+        values = ', '.join(f'{sign}{quantities[column]}' for column in QUANTITIES)
+        updates = ', '.join(f'"{column}" = "{table}"."{column}" + EXCLUDED."{column}"' for column in QUANTITIES + ('records',))
+        return (f'INSERT INTO "{table}" ("project", "goods_code", "bin_name", {columns}, "records") '
+                f'VALUES ({row}."project", {goods}, {bin_name}, {values}, {sign}1) '
+                f'ON CONFLICT ("project", "goods_code", "bin_name") DO UPDATE SET {updates}')
+
+    def cleanup(self, vendor: str, resource: str, row: str) -> str:
+        # the last row of a goods in a bin is gone
+        _, goods, bin_name, _ = self.contribution(vendor, resource, row)
+        return (f'DELETE FROM "{StockRollup._meta.db_table}" WHERE "project" = {row}."project" '
+                f'AND "goods_code" = {goods} AND "bin_name" = {bin_name} AND "records" = 0')
+
+    def trigger_statements(self, vendor: str, create: bool = True) -> list:
+        """
+        DROP and CREATE of the triggers of every source table, only the DROP when the rollup is not maintained here
+        """
+        statements = []
+        for resource, (model, _) in self.sources().items():
+            table = model._meta.db_table
+            name = f'{TRIGGER_PREFIX}{table}'
+            if vendor == 'sqlite':
+                for event in ['insert', 'delete', 'update_old', 'update_new']:
+                    statements.append(f'DROP TRIGGER IF EXISTS "{name}_{event}"')
+            elif vendor == 'postgresql':
+                statements.append(f'DROP TRIGGER IF EXISTS "{name}" ON "{table}"')
+                statements.append(f'DROP FUNCTION IF EXISTS "{name}"()')
+            if not create or not self.supported(vendor):
+                continue
+            old_condition = self.contribution(vendor, resource, 'OLD')[0]
+            new_condition = self.contribution(vendor, resource, 'NEW')[0]
+            take = f"{self.upsert(vendor, resource, 'OLD', '-')}; {self.cleanup(vendor, resource, 'OLD')};"
+            add = f"{self.upsert(vendor, resource, 'NEW', '')};"
+            # only writes of these columns change a contribution, updated_time alone does not
+            update_of = 'UPDATE OF "data", "is_delete", "project"'
+            if vendor == 'sqlite':
+                # two update triggers, sqlite has no branches in a trigger body
+                statements += [
+                    f'CREATE TRIGGER "{name}_insert" AFTER INSERT ON "{table}" WHEN {new_condition} BEGIN {add} END',
+                    f'CREATE TRIGGER "{name}_delete" AFTER DELETE ON "{table}" WHEN {old_condition} BEGIN {take} END',
+                    f'CREATE TRIGGER "{name}_update_old" AFTER {update_of} ON "{table}" WHEN {old_condition} BEGIN {take} END',
+                    f'CREATE TRIGGER "{name}_update_new" AFTER {update_of} ON "{table}" WHEN {new_condition} BEGIN {add} END',
+                ]
+            else:
+                statements += [
+                    f'CREATE FUNCTION "{name}"() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+                    f"IF TG_OP <> 'INSERT' THEN IF {old_condition} THEN {take} END IF; END IF; "
+                    f"IF TG_OP <> 'DELETE' THEN IF {new_condition} THEN {add} END IF; END IF; "
+                    f'RETURN NULL; END $$',
+                    f'CREATE TRIGGER "{name}" AFTER INSERT OR DELETE OR {update_of} ON "{table}" '
+                    f'FOR EACH ROW EXECUTE FUNCTION "{name}"()',
+                ]
+        return statements
+
+    def source_sql(self, vendor: str) -> str:
+        """
+        SELECT of the rollup rows computed from the source tables, what the triggers keep
+        """
+        q = lambda name: quote(vendor, name)
+        selects = []
+        for resource, (model, _) in self.sources().items():
+            condition, goods, bin_name, quantities = self.contribution(vendor, resource, 'R')
+            columns = ', '.join(f'{quantities[column]} AS {q(column)}' for column in QUANTITIES)
+            selects.append(f'SELECT R.{q("project")} AS {q("project")}, {goods} AS {q("goods_code")}, '
+                           f'{bin_name} AS {q("bin_name")}, {columns} FROM {q(model._meta.db_table)} R WHERE {condition}')
+        sums = ', '.join(f'SUM({q(column)})' for column in QUANTITIES)
+        # no placeholders in it, a % of a closed value must survive the parameter formatting
+        union = ' UNION ALL '.join(selects).replace('%', '%%')
+        return (f'SELECT {q("project")}, {q("goods_code")}, {q("bin_name")}, {sums}, COUNT(*) FROM ({union}) S '
+                f'WHERE {{where}} GROUP BY {q("project")}, {q("goods_code")}, {q("bin_name")}')
+
+    def source_rows(self, using: str, project: str = None, goods_codes: list = None, bin_name: str = None) -> list:
+        """
+        Rollup rows summed from the source tables, the read of a database without triggers
+        :return: list of (project, goods_code, bin_name, onhand, can_order, inbound, outbound, records)
+        """
+        connection = connections[using]
+        q = lambda name: quote(connection.vendor, name)
+        where = ['1 = 1']
+        params = []
+        if project is not None:
+            where.append(f'{q("project")} = %s')
+            params.append(project)
+        if goods_codes:
+            where.append(f'{q("goods_code")} IN ({", ".join(["%s"] * len(goods_codes))})')
+            params += goods_codes
+        if bin_name is not None:
+            where.append(f'{q("bin_name")} = %s')
+            params.append(bin_name)
+        with connection.cursor() as cursor:
+            cursor.execute(self.source_sql(connection.vendor).replace('{where}', ' AND '.join(where)), params)
+            return [(*row[:3], *(float(value or 0) for value in row[3:7]), row[7]) for row in cursor.fetchall()]
+
+    def ensure_triggers(self, using: str = 'default') -> None:
+        """
+        Create the triggers again, a rebuilt sqlite table loses its triggers and [stock] may have changed
+        """
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            for statement in self.trigger_statements(connection.vendor):
+                cursor.execute(statement)
+
+    def drop_triggers(self, using: str = 'default') -> None:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            for statement in self.trigger_statements(connection.vendor, create=False):
+                cursor.execute(statement)
+
+    def reconcile(self, using: str = None) -> dict:
+        """
+        Compare the rollup with the sums of the source tables and correct the rows which drifted
+        The rollup is locked meanwhile, writes of stock, ASN and DN wait for it
+        :return: {'rows': rollup rows, 'fixed': rows written, 'removed': rows deleted}
+        """
+        using = using or router.db_for_write(StockRollup)
+        connection = connections[using]
+        if not self.supported(connection.vendor):
+            return {'rows': 0, 'fixed': 0, 'removed': 0}
+        start = time.perf_counter()
+        table = StockRollup._meta.db_table
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(f'LOCK TABLE "{table}" IN EXCLUSIVE MODE')
+                else:
+                    # a write takes the database lock before the sums are read
+                    cursor.execute(f'UPDATE "{table}" SET "records" = "records" WHERE 1 = 0')
+            expected = {row[:3]: row[3:] for row in self.source_rows(using)}
+            current = {}
+            for rollup in StockRollup.objects.using(using).all():
+                current[(rollup.project, rollup.goods_code, rollup.bin_name)] = rollup
+            built = bool(current)
+            created = []
+            updated = []
+            for key, values in expected.items():
+                rollup = current.pop(key, None)
+                if rollup is None:
+                    created.append(StockRollup(project=key[0], goods_code=key[1], bin_name=key[2],
+                                               **dict(zip(QUANTITIES + ('records',), values))))
+                elif drifted(rollup, values):
+                    for column, value in zip(QUANTITIES + ('records',), values):
+                        setattr(rollup, column, value)
+                    updated.append(rollup)
+            StockRollup.objects.using(using).bulk_create(created, batch_size=1000)
+            StockRollup.objects.using(using).bulk_update(updated, QUANTITIES + ('records',), batch_size=1000)
+            StockRollup.objects.using(using).filter(id__in=[rollup.id for rollup in current.values()]).delete()
+        result = {'rows': len(expected), 'fixed': len(created) + len(updated), 'removed': len(current)}
+        if built and (result['fixed'] or result['removed']):
+            logger.warning(f'Stock rollup drifted, {result} in {time.perf_counter() - start:.3f}s')
+        elif not built:
+            logger.info(f'Stock rollup built, {result} in {time.perf_counter() - start:.3f}s')
+        return result
+
+    def rows(self, project: str, goods_codes: list = None, bin_name: str = None):
+        """
+        Rollup rows of a project, one index lookup per goods and bin where the triggers keep the rollup
+        Summed from the source tables on databases without triggers, or when [stock] enable = False
+        :return: StockRollup queryset or list of source_rows
+        """
+        using = router.db_for_read(StockRollup)
+        if not self.supported(connections[using].vendor):
+            return sorted(self.source_rows(using, project, goods_codes, bin_name), key=lambda row: row[1:3])
+        queryset = StockRollup.objects.using(using).filter(project=project)
+        if goods_codes:
+            queryset = queryset.filter(goods_code__in=goods_codes)
+        if bin_name is not None:
+            queryset = queryset.filter(bin_name=bin_name)
+        return queryset
+
+    def totals(self, project: str, goods_codes: list) -> list:
+        """
+        Stock of every goods over all of its bins
+        """
+        totals = {}
+        for row in self.rows(project, goods_codes):
+            row = rollup_to_dict(row)
+            total = totals.setdefault(row['goods_code'], {'goods_code': row['goods_code'], **dict.fromkeys(QUANTITIES, 0), 'bins': 0})
+            for column in QUANTITIES:
+                total[column] += row[column]
+            total['bins'] += 1
+        return [totals[code] for code in goods_codes if code in totals]
+
+    def schedule(self) -> None:
+        """
+        Register reconcile_job with bomiot's scheduler
+        """
+        if not self.enable:
+            return
+        from bomiot.server.core.signal import bomiot_signals
+        bomiot_signals.send(sender=reconcile_job, msg={
+            'models': 'JobList',
+            'data': {
+                'trigger': 'interval',
+                'minutes': self.minutes,
+                'description': f'Reconcile the stock rollup with the stock, ASN and DN rows every {self.minutes} minutes'
+            }
+        })
+
+
+def drifted(rollup, values) -> bool:
+    *quantities, records = values
+    if rollup.records != records:
+        return True
+    return any(abs(getattr(rollup, column) - value) > 1e-6 for column, value in zip(QUANTITIES, quantities))
+
+
+def rollup_to_dict(row) -> dict:
+    """
+    Response shape of a rollup row, a StockRollup or a row of source_rows
+    """
+    if isinstance(row, StockRollup):
+        row = (row.project, row.goods_code, row.bin_name, *(getattr(row, column) for column in QUANTITIES), row.records)
+    return {
+        'goods_code': row[1],
+        'bin_name': row[2],
+        **dict(zip(QUANTITIES, row[3:7])),
+        'records': row[7],
+    }
+
+
+@queue_task('stock_reconcile')
+def run_reconcile() -> dict:
+    return stock_rollup.reconcile()
+
+
+def reconcile_job(sender=None, **kwargs):
+    """
+    Scheduler entry of the reconcile, bomiot calls it with the trigger arguments
+    The run goes to the job queue, where a run which is still pending takes it in
+    """
+    if job_queue.offload(run_reconcile, key='stock_reconcile'):
+        return
+    try:
+        stock_rollup.reconcile()
+    except Exception as e:
+        logger.warning(f'Stock rollup reconcile failed: {e}')
+
+
+stock_rollup = Rollup(settings.CONFIG)
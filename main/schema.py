@@ -0,0 +1,143 @@
+import hashlib
+import os
+import orjson
+import django
+
+from importlib.util import find_spec
+from os.path import join, exists, dirname, isdir
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections, DEFAULT_DB_ALIAS, DatabaseError
+from django.db.migrations.loader import MigrationLoader
+from main.indexes import index_statements, scope_statements, scope_tables
+from main.rollup import stock_rollup
+
+
+FINGERPRINT_PATH = join(settings.WORKING_SPACE, 'dbs', 'schema_fingerprint.json')
+
+
+def module_files(module_name: str) -> list:
+    """
+    Source files of a module, every .py file of the folder for a package
+    """
+    try:
+        spec = find_spec(module_name)
+    except (ImportError, ValueError):
+        return []
+    if spec is None or not spec.origin or not exists(spec.origin):
+        return []
+    if not spec.submodule_search_locations:
+        return [spec.origin]
+    folder = dirname(spec.origin)
+    return sorted(join(folder, name) for name in os.listdir(folder) if name.endswith('.py'))
+
+
+def schema_fingerprint(using: str = DEFAULT_DB_ALIAS) -> str:
+    """
+    Hash of everything makemigrations and migrate read:
+    the database, django and bomiot versions, installed apps, model and migration sources, json indexes
+    """
+    connection = connections[using]
+    digest = hashlib.sha1()
+    db = connection.settings_dict
+    digest.update(orjson.dumps([db['ENGINE'], str(db['NAME']), db.get('HOST', ''), str(db.get('PORT', '')),
+                                django.get_version(), settings.PROJECT_NAME]))
+    try:
+        from importlib.metadata import version
+        digest.update(version('bomiot').encode())
+    except Exception:
+        pass
+    for app_config in apps.get_app_configs():
+        files = module_files(app_config.models_module.__name__) if app_config.models_module else []
+        migrations_module = MigrationLoader.migrations_module(app_config.label)[0]
+        if migrations_module:
+            files += module_files(migrations_module)
+        digest.update(app_config.label.encode())
+        for path in files:
+            digest.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    digest.update(orjson.dumps(index_statements(connection.vendor)))
+    digest.update(orjson.dumps([scope_statements(connection.vendor, table) for table in scope_tables()]))
+    # [stock] is compiled into the triggers, a change runs migrate and post_migrate creates them again
+    digest.update(orjson.dumps(stock_rollup.trigger_statements(connection.vendor)))
+    return digest.hexdigest()
+
+
+def applied_count(using: str = DEFAULT_DB_ALIAS):
+    """
+    Rows of django_migrations, None when the table can not be read
+    """
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_migrations')
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+
+def read_fingerprint() -> dict:
+    if not exists(FINGERPRINT_PATH):
+        return {}
+    try:
+        with open(FINGERPRINT_PATH, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+
+def write_fingerprint(fingerprint: str, applied: int) -> None:
+    folder = dirname(FINGERPRINT_PATH)
+    isdir(folder) or os.makedirs(folder)
+    with open(FINGERPRINT_PATH, 'wb') as f:
+        f.write(orjson.dumps({'fingerprint': fingerprint, 'applied': applied}))
+
+
+def schema_current(fingerprint: str, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Sources are unchanged since the last migrate, and the database still holds those migrations
+    """
+    record = read_fingerprint()
+    if record.get('fingerprint') != fingerprint:
+        return False
+    return applied_count(using) == record.get('applied')
+
+
+def make_migrations() -> None:
+    # 自动检测所有包含模型的应用
+    cmd_args = ["makemigrations"]
+    apps_with_models = []
+    for app_config in apps.get_app_configs():
+        try:
+            if app_config.models_module and list(app_config.get_models()):
+                apps_with_models.append(app_config.label)
+        except Exception:
+            continue
+    cmd_args.extend(apps_with_models)
+    try:
+        call_command(*cmd_args)
+        print("Migrations created successfully.")
+    except Exception as e:
+        print(f"Error creating migrations: {e}")
+
+
+def migrate_schema(force: bool = False, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    makemigrations and migrate, skipped when the schema fingerprint is unchanged
+    :param force: run both commands even if the fingerprint is unchanged
+    :param using: database alias
+    :return: True when the commands ran
+    """
+    if not force and schema_current(schema_fingerprint(using), using):
+        print("Schema is current, migrations skipped.")
+        return False
+    make_migrations()
+    try:
+        call_command('migrate', database=using)
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        return True
+    # makemigrations may have written new files, fingerprint the result
+    write_fingerprint(schema_fingerprint(using), applied_count(using))
+    return True
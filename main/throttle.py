@@ -0,0 +1,270 @@
+import ipaddress
+import logging
+import math
+import mmap
+import struct
+import threading
+import time
+import orjson
+
+from fnmatch import fnmatchcase
+from os.path import join
+from django.conf import settings
+from bomiot.server.core.jwt_auth import parse_payload
+from main.cache import LRUCache, key_digest, list_cache, map_file
+
+try:
+    import fcntl
+except ImportError:
+    # windows, the desktop runs one process and the buckets only need the thread locks
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+# key digest, tokens, last refill as unix time
+SLOT = struct.Struct('<Qdd')
+
+# slots a key may take, the least recently used one of its set is reused
+WAYS = 4
+
+SET_SIZE = SLOT.size * WAYS
+
+LOCK_STRIPES = 64
+
+LOGIN_PATH = '/login/'
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# the identity of a token which does not pass authentication, cached like a user
+ANONYMOUS = ('', None)
+
+
+def bucket_classes(value: str, default: tuple) -> dict:
+    """
+    Parse classes = write:20:60,report:1:5 into {name: (tokens per allocation_seconds, burst)}
+    read and write default to the throttle_seconds of [throttle]
+    """
+    classes = {'read': default, 'write': default}
+    for item in value.replace(' ', '').split(','):
+        if not item:
+            continue
+        try:
+            name, rate, burst = item.split(':')
+            rate, burst = float(rate), float(burst)
+        except ValueError:
+            raise ValueError(f"Invalid [throttle] classes item '{item}'")
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Throttle class '{name}' needs a rate above 0 and a burst of at least 1")
+        classes[name] = (rate, burst)
+    return classes
+
+
+def trusted_networks(value: str) -> tuple:
+    """
+    Parse trusted_proxies = 127.0.0.1,10.0.0.0/8 into the networks whose X-Forwarded-For is believed
+    """
+    networks = []
+    for item in value.replace(' ', '').split(','):
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            raise ValueError(f"Invalid [throttle] trusted_proxies item '{item}'")
+    return tuple(networks)
+
+
+def route_rules(value: str, classes: dict) -> list:
+    """
+    Parse routes = *_export:report,stock_rollup*:report into [(func_name pattern, class)], the first match wins
+    """
+    rules = []
+    for item in value.replace(' ', '').split(','):
+        if not item:
+            continue
+        pattern, _, name = item.rpartition(':')
+        if not pattern:
+            raise ValueError(f"Invalid [throttle] routes item '{item}'")
+        if name not in classes:
+            raise ValueError(f"Unknown throttle class '{name}' in [throttle] routes")
+        rules.append((pattern, name))
+    return rules
+
+
+class TokenBuckets:
+    """
+    Token buckets in a file every worker of the node maps, a fixed table of 4-way sets of slots
+    A take reads and writes the slots of one set under a lock of its byte range, so workers only wait on the same set
+    A key pushed out of a full set starts again with a full bucket
+    """
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.sets = max(slots // WAYS, 1)
+        self.size = self.sets * SET_SIZE
+        self._map = None
+        self._fd = None
+        self._open_lock = threading.Lock()
+        # fcntl locks belong to the process, the threads of a worker take a stripe first
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def open(self) -> mmap.mmap:
+        with self._open_lock:
+            if self._map is None:
+                # new pages read as zeros, the empty slots
+                self._fd, self._map = map_file(self.path, self.size)
+        return self._map
+
+    def take(self, key: str, rate: float, burst: float, cost: int = 1) -> float:
+        """
+        Take cost tokens from the bucket of key, cost 0 only checks that it holds one
+        :param rate: tokens per second
+        :return: 0 when the bucket held a token, else the seconds until it holds one
+        """
+        digest = key_digest(key) or 1
+        buckets = self._map or self.open()
+        offset = (digest % self.sets) * SET_SIZE
+        with self._locks[digest % LOCK_STRIPES]:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, SET_SIZE, offset)
+            try:
+                now = time.time()
+                position, oldest = offset, math.inf
+                for slot in range(offset, offset + SET_SIZE, SLOT.size):
+                    slot_digest, tokens, stamp = SLOT.unpack_from(buckets, slot)
+                    if slot_digest == digest:
+                        position = slot
+                        break
+                    if stamp < oldest:
+                        position, oldest = slot, stamp
+                else:
+                    tokens, stamp = burst, now
+                # a clock which went back does not add tokens
+                tokens = min(burst, tokens + max(now - stamp, 0.0) * rate)
+                if tokens >= 1:
+                    SLOT.pack_into(buckets, position, digest, tokens - cost, now)
+                    return 0.0
+                SLOT.pack_into(buckets, position, digest, tokens, now)
+                return (1 - tokens) / rate
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, SET_SIZE, offset)
+
+
+class RateLimiter:
+    """
+    Token bucket per (user, department, func_name) of the APIs of API_METHOD_TABLE, shared by the workers of the node
+    Requests without a valid token count per client ip, X-Forwarded-For only counts when a trusted proxy sent it
+    Failed logins count per username and client ip, [request] limit + 1 in a row, a successful login takes nothing
+    GET requests take from the read class and other methods from the write class, unless a routes pattern matches
+    """
+    def __init__(self, config):
+        self.enable = config.getboolean('throttle', 'enable', fallback=True)
+        self.allocation_seconds = max(config.getint('throttle', 'allocation_seconds', fallback=1), 1)
+        self.throttle_seconds = max(config.getint('throttle', 'throttle_seconds', fallback=10), 1)
+        self.classes = bucket_classes(config.get('throttle', 'classes', fallback='write:20:60,report:1:5'),
+                                      (self.throttle_seconds, self.throttle_seconds))
+        self.routes = route_rules(config.get('throttle', 'routes', fallback='*_export:report,*_import:report,stock_rollup*:report'),
+                                  self.classes)
+        self.login_seconds = max(config.getfloat('throttle', 'login_seconds', fallback=60), 1)
+        self.login_limit = config.getint('request', 'limit', fallback=2) + 1
+        self.trusted_proxies = trusted_networks(config.get('throttle', 'trusted_proxies', fallback=''))
+        self.buckets = TokenBuckets(join(settings.WORKING_SPACE, 'dbs', 'throttle', 'buckets.bin'),
+                                    max(config.getint('throttle', 'slots', fallback=65536), WAYS))
+        self.owners = LRUCache(max_entries=10000, ttl=60)
+        # (method, func_name) -> (tokens per second, burst)
+        self._rates = {}
+
+    def rate(self, method: str, func_name: str) -> tuple:
+        rate = self._rates.get((method, func_name))
+        if rate is None:
+            name = 'read' if method in READ_METHODS else 'write'
+            for pattern, route_class in self.routes:
+                if fnmatchcase(func_name, pattern):
+                    name = route_class
+                    break
+            tokens, burst = self.classes[name]
+            rate = self._rates[(method, func_name)] = (tokens / self.allocation_seconds, burst)
+        return rate
+
+    def known_owner(self, request):
+        """
+        (user id, department) of the token when it is cached, no database read
+        """
+        token = request.META.get('HTTP_TOKEN', '')
+        return self.owners.get(token) if token else ANONYMOUS
+
+    def owner(self, request) -> tuple:
+        token = request.META.get('HTTP_TOKEN', '')
+        if not token:
+            return ANONYMOUS
+        owner = self.owners.get(token)
+        if owner is None:
+            department = list_cache.user_scope(request)
+            owner = ANONYMOUS if department is None else (parse_payload(token)['data']['id'], department)
+            self.owners.set(token, owner)
+        return owner
+
+    def trusted(self, address: str) -> bool:
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    def client_ip(self, request) -> str:
+        """
+        REMOTE_ADDR, behind trusted proxies the last X-Forwarded-For address which is not one of them
+        The addresses left of it are written by the client and not believed
+        """
+        address = request.META.get('REMOTE_ADDR', '')
+        if not self.trusted(address):
+            return address
+        for forwarded in reversed(request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')):
+            forwarded = forwarded.strip()
+            if not forwarded:
+                continue
+            address = forwarded
+            if not self.trusted(forwarded):
+                break
+        return address
+
+    def login_key(self, request) -> str:
+        try:
+            # the body as bomiot's login reads it
+            username = orjson.loads(request.body.decode().replace("'", '"')).get('username', '')
+        except (ValueError, AttributeError):
+            username = ''
+        return f'login:{self.client_ip(request)}:{username}'
+
+    def check_login(self, request) -> float:
+        """
+        Seconds until the next login attempt, 0 when one is left
+        """
+        return self.buckets.take(self.login_key(request), 1 / self.login_seconds, self.login_limit, cost=0)
+
+    def charge_login(self, request, response) -> None:
+        """
+        A login answer without a token is a failed attempt
+        """
+        try:
+            data = orjson.loads(response.content)
+        except (ValueError, AttributeError):
+            data = None
+        if not isinstance(data, dict) or not data.get('token'):
+            self.buckets.take(self.login_key(request), 1 / self.login_seconds, self.login_limit)
+
+    def check(self, request, func_name: str, owner: tuple) -> float:
+        """
+        :return: 0 when the request may run, else the seconds until it may
+        """
+        rate, burst = self.rate(request.method, func_name)
+        user, department = owner
+        if user == '':
+            key = f'ip:{self.client_ip(request)}:{func_name}'
+        else:
+            key = f'user:{user}:{department}:{func_name}'
+        return self.buckets.take(key, rate, burst)
+
+
+rate_limiter = RateLimiter(settings.CONFIG)
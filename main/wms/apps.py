@@ -0,0 +1,63 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def json_indexes_callback(sender, using='default', **kwargs):
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from main.indexes import ensure_json_indexes, ensure_scope_columns
+    ensure_json_indexes(using)
+    # bomiot's migrations may rebuild a sqlite table without the columns the model does not declare
+    applied = MigrationRecorder(connections[using]).applied_migrations()
+    if ('wms', '0002_scope_columns') in applied:
+        ensure_scope_columns(using)
+    if ('wms', '0003_archive') in applied:
+        from main.archive import ensure_archive_views
+        ensure_archive_views(using)
+    if ('wms', '0004_stock_rollup') in applied:
+        from main.rollup import stock_rollup
+        # a rebuilt sqlite table drops its triggers, and the rows written without them are summed again
+        stock_rollup.ensure_triggers(using)
+        stock_rollup.reconcile(using)
+    if ('wms', '0006_version_trigger') in applied:
+        from main.patch import ensure_version_trigger
+        ensure_version_trigger(using)
+
+
+class WmsConfig(AppConfig):
+    name = 'main.wms'
+
+    def ready(self):
+        from bomiot.server.core.signal import bomiot_data_signals
+        from main.database import READ_ALIAS, configure_databases, reset_connections, sqlite_callback
+        from main.metrics import instrument_signal, metrics_callback
+        from main.renderers import use_orjson
+        from main.throttle import rate_limiter
+        from rest_framework.settings import api_settings
+        configure_databases(settings.DATABASES, settings.CONFIG)
+        if READ_ALIAS in settings.DATABASES and 'main.database.ReadWriteRouter' not in settings.DATABASE_ROUTERS:
+            settings.DATABASE_ROUTERS.append('main.database.ReadWriteRouter')
+        connection_created.connect(sqlite_callback, weak=False)
+        connection_created.connect(metrics_callback, weak=False)
+        reset_connections()
+        post_migrate.connect(json_indexes_callback, sender=self)
+        instrument_signal(bomiot_data_signals)
+        # the ASGI handler loads MIDDLEWARE after every app is ready
+        # extend the list in place, settings may be set up again from the same module
+        for middleware in ['main.middleware.ThrottleMiddleware', 'main.middleware.ListCacheMiddleware']:
+            if middleware not in settings.MIDDLEWARE:
+                settings.MIDDLEWARE.append(middleware)
+        if rate_limiter.enable:
+            # the token buckets replace bomiot's throttle, which reads and writes the database on every request
+            throttle_classes = settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_CLASSES', [])
+            settings.REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = [
+                path for path in throttle_classes if path != 'bomiot.server.core.throttle.CoreThrottle']
+        if settings.CONFIG.getboolean('json', 'orjson', fallback=True):
+            use_orjson(settings.REST_FRAMEWORK)
+        # the views read the DRF defaults when rest_framework.views is imported, after ready
+        api_settings.reload()
+        # first, so the time of every other middleware is measured
+        if 'main.middleware.MetricsMiddleware' not in settings.MIDDLEWARE:
+            settings.MIDDLEWARE.insert(0, 'main.middleware.MetricsMiddleware')
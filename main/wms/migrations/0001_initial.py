@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=64, verbose_name='Resource')),
+                ('file_name', models.CharField(max_length=255, verbose_name='File Name')),
+                ('file_path', models.TextField(verbose_name='File Path')),
+                ('file_type', models.CharField(max_length=16, verbose_name='File Type')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='File Size')),
+                ('file_mtime', models.FloatField(default=0, verbose_name='File Modified Time')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('creater', models.CharField(max_length=255, verbose_name='Creater')),
+                ('department', models.IntegerField(default=0, verbose_name='Department')),
+                ('language', models.CharField(default='en-US', max_length=32, verbose_name='Language')),
+                ('status', models.CharField(db_index=True, default='pending', max_length=16, verbose_name='Status')),
+                ('total', models.BigIntegerField(default=0, verbose_name='Estimated Rows')),
+                ('rows_done', models.BigIntegerField(default=0, verbose_name='Rows Done')),
+                ('created', models.BigIntegerField(default=0, verbose_name='Created Rows')),
+                ('failed', models.BigIntegerField(default=0, verbose_name='Failed Rows')),
+                ('errors', models.JSONField(default=list, verbose_name='Errors')),
+                ('detail', models.TextField(blank=True, default='', verbose_name='Detail')),
+                ('seconds', models.FloatField(default=0, verbose_name='Seconds')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='Updated Time')),
+            ],
+            options={
+                'verbose_name': 'Import Job',
+                'verbose_name_plural': 'Import Job',
+                'db_table': 'wms_import_job',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def add_scope_columns(apps, schema_editor):
+    from main.indexes import ensure_scope_columns
+    ensure_scope_columns(schema_editor.connection.alias)
+
+
+def remove_scope_columns(apps, schema_editor):
+    from main.indexes import drop_scope_columns
+    drop_scope_columns(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+    """
+    Generated department / creater columns of the resource tables, the rows are backfilled when the columns are added
+    """
+
+    dependencies = [
+        ('core', '0003_asndetail_dndetail_stockbin_delete_api_asn_project_and_more'),
+        ('wms', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_scope_columns, remove_scope_columns),
+    ]
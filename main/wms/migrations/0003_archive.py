@@ -0,0 +1,544 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:29
+
+from django.db import migrations, models
+
+
+def create_views(apps, schema_editor):
+    from main.archive import ensure_archive_views
+    ensure_archive_views(schema_editor.connection.alias)
+
+
+def drop_views(apps, schema_editor):
+    from main.archive import drop_archive_views
+    drop_archive_views(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wms', '0002_scope_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ASNDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'ASN Deleted',
+                'verbose_name_plural': 'ASN Deleted',
+                'db_table': 'wms_deleted_asn',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BarDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Bar Deleted',
+                'verbose_name_plural': 'Bar Deleted',
+                'db_table': 'wms_deleted_bar',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BinDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Bin Deleted',
+                'verbose_name_plural': 'Bin Deleted',
+                'db_table': 'wms_deleted_bin',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CapitalDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Capital Deleted',
+                'verbose_name_plural': 'Capital Deleted',
+                'db_table': 'wms_deleted_capital',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Customer Deleted',
+                'verbose_name_plural': 'Customer Deleted',
+                'db_table': 'wms_deleted_customer',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DNDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'DN Deleted',
+                'verbose_name_plural': 'DN Deleted',
+                'db_table': 'wms_deleted_dn',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DriverDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Driver Deleted',
+                'verbose_name_plural': 'Driver Deleted',
+                'db_table': 'wms_deleted_driver',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ExampleDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Example Deleted',
+                'verbose_name_plural': 'Example Deleted',
+                'db_table': 'wms_deleted_example',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FeeDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Fee Deleted',
+                'verbose_name_plural': 'Fee Deleted',
+                'db_table': 'wms_deleted_fee',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Goods Deleted',
+                'verbose_name_plural': 'Goods Deleted',
+                'db_table': 'wms_deleted_goods',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PurchaseDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Purchase Deleted',
+                'verbose_name_plural': 'Purchase Deleted',
+                'db_table': 'wms_deleted_purchase',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StockDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Stock Deleted',
+                'verbose_name_plural': 'Stock Deleted',
+                'db_table': 'wms_deleted_stock',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SupplierDeleted',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Supplier Deleted',
+                'verbose_name_plural': 'Supplier Deleted',
+                'db_table': 'wms_deleted_supplier',
+                'ordering': ['-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SupplierArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Supplier Archive',
+                'verbose_name_plural': 'Supplier Archive',
+                'db_table': 'wms_archive_supplier',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_supplier_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Stock Archive',
+                'verbose_name_plural': 'Stock Archive',
+                'db_table': 'wms_archive_stock',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_stock_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PurchaseArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Purchase Archive',
+                'verbose_name_plural': 'Purchase Archive',
+                'db_table': 'wms_archive_purchase',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_purchase_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Goods Archive',
+                'verbose_name_plural': 'Goods Archive',
+                'db_table': 'wms_archive_goods',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_goods_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeeArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Fee Archive',
+                'verbose_name_plural': 'Fee Archive',
+                'db_table': 'wms_archive_fee',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_fee_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExampleArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Example Archive',
+                'verbose_name_plural': 'Example Archive',
+                'db_table': 'wms_archive_example',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_example_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DriverArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Driver Archive',
+                'verbose_name_plural': 'Driver Archive',
+                'db_table': 'wms_archive_driver',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_driver_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DNArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'DN Archive',
+                'verbose_name_plural': 'DN Archive',
+                'db_table': 'wms_archive_dn',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_dn_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Customer Archive',
+                'verbose_name_plural': 'Customer Archive',
+                'db_table': 'wms_archive_customer',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_customer_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CapitalArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Capital Archive',
+                'verbose_name_plural': 'Capital Archive',
+                'db_table': 'wms_archive_capital',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_capital_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BinArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Bin Archive',
+                'verbose_name_plural': 'Bin Archive',
+                'db_table': 'wms_archive_bin',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_bin_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BarArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'Bar Archive',
+                'verbose_name_plural': 'Bar Archive',
+                'db_table': 'wms_archive_bar',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_bar_scope')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ASNArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(default='bomiot', max_length=255, verbose_name='Project Name')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='Delete Label')),
+                ('created_time', models.DateTimeField(verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(blank=True, null=True, verbose_name='Updated Time')),
+                ('data', models.JSONField(verbose_name='Data')),
+                ('scope_department', models.BigIntegerField(null=True, verbose_name='Department')),
+                ('scope_creater', models.CharField(max_length=255, null=True, verbose_name='Creater')),
+                ('reason', models.CharField(max_length=16, verbose_name='Reason')),
+                ('archived_time', models.DateTimeField(auto_now_add=True, verbose_name='Archived Time')),
+            ],
+            options={
+                'verbose_name': 'ASN Archive',
+                'verbose_name_plural': 'ASN Archive',
+                'db_table': 'wms_archive_asn',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'], name='wms_archive_asn_scope')],
+            },
+        ),
+        migrations.RunPython(create_views, drop_views),
+    ]
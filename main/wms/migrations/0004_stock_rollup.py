@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:34
+
+from django.db import migrations, models
+
+
+def create_triggers(apps, schema_editor):
+    from main.rollup import stock_rollup
+    stock_rollup.ensure_triggers(schema_editor.connection.alias)
+    # the rows written before the triggers
+    stock_rollup.reconcile(schema_editor.connection.alias)
+
+
+def drop_triggers(apps, schema_editor):
+    from main.rollup import stock_rollup
+    stock_rollup.drop_triggers(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wms', '0003_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=255, verbose_name='Project Name')),
+                ('goods_code', models.CharField(max_length=255, verbose_name='Goods Code')),
+                ('bin_name', models.CharField(default='', max_length=255, verbose_name='Bin Name')),
+                ('onhand', models.FloatField(default=0, verbose_name='On Hand Stock')),
+                ('can_order', models.FloatField(default=0, verbose_name='Can Order Stock')),
+                ('inbound', models.FloatField(default=0, verbose_name='Inbound Qty')),
+                ('outbound', models.FloatField(default=0, verbose_name='Outbound Qty')),
+                ('records', models.BigIntegerField(default=0, verbose_name='Records')),
+            ],
+            options={
+                'verbose_name': 'Stock Rollup',
+                'verbose_name_plural': 'Stock Rollup',
+                'db_table': 'wms_stock_rollup',
+                'ordering': ['goods_code', 'bin_name'],
+                'indexes': [models.Index(fields=['project', 'bin_name'], name='wms_stock_rollup_bin')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockrollup',
+            constraint=models.UniqueConstraint(fields=('project', 'goods_code', 'bin_name'), name='wms_stock_rollup_key'),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
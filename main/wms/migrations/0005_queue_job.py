@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wms', '0004_stock_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue', models.CharField(max_length=64, verbose_name='Queue')),
+                ('func', models.CharField(max_length=255, verbose_name='Function')),
+                ('args', models.JSONField(default=list, verbose_name='Args')),
+                ('kwargs', models.JSONField(default=dict, verbose_name='Kwargs')),
+                ('priority', models.IntegerField(default=0, verbose_name='Priority')),
+                ('key', models.CharField(blank=True, default='', max_length=255, verbose_name='Coalesce Key')),
+                ('status', models.CharField(default='pending', max_length=16, verbose_name='Status')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Attempts')),
+                ('max_attempts', models.IntegerField(default=3, verbose_name='Max Attempts')),
+                ('run_after', models.DateTimeField(verbose_name='Run After')),
+                ('worker', models.CharField(blank=True, default='', max_length=255, verbose_name='Worker')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Result')),
+                ('detail', models.TextField(blank=True, default='', verbose_name='Detail')),
+                ('seconds', models.FloatField(default=0, verbose_name='Seconds')),
+                ('project', models.CharField(blank=True, default='', max_length=255, verbose_name='Project Name')),
+                ('creater', models.CharField(blank=True, default='', max_length=255, verbose_name='Creater')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='Created Time')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='Updated Time')),
+            ],
+            options={
+                'verbose_name': 'Queue Job',
+                'verbose_name_plural': 'Queue Job',
+                'db_table': 'wms_queue_job',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'queue', 'priority', 'run_after'], name='wms_queue_claim'), models.Index(fields=['key', 'status'], name='wms_queue_key')],
+            },
+        ),
+    ]
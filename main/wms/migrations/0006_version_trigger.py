@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:10
+
+from django.db import migrations
+
+
+def create_trigger(apps, schema_editor):
+    from main.patch import ensure_version_trigger
+    ensure_version_trigger(schema_editor.connection.alias)
+
+
+def drop_trigger(apps, schema_editor):
+    from main.patch import drop_version_trigger
+    drop_version_trigger(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wms', '0005_queue_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
@@ -0,0 +1,159 @@
+from django.db import models
+from main.api import RESOURCE_TABLE
+
+
+class ImportJob(models.Model):
+    """
+    One spreadsheet import, rows_done is the checkpoint and is committed with the rows of each chunk
+    """
+    resource = models.CharField(max_length=64, verbose_name="Resource")
+    file_name = models.CharField(max_length=255, verbose_name="File Name")
+    file_path = models.TextField(verbose_name="File Path")
+    file_type = models.CharField(max_length=16, verbose_name="File Type")
+    file_size = models.BigIntegerField(default=0, verbose_name="File Size")
+    file_mtime = models.FloatField(default=0, verbose_name="File Modified Time")
+    project = models.CharField(max_length=255, verbose_name="Project Name")
+    creater = models.CharField(max_length=255, verbose_name="Creater")
+    department = models.IntegerField(default=0, verbose_name="Department")
+    language = models.CharField(default='en-US', max_length=32, verbose_name="Language")
+    status = models.CharField(default='pending', max_length=16, db_index=True, verbose_name="Status")
+    total = models.BigIntegerField(default=0, verbose_name="Estimated Rows")
+    rows_done = models.BigIntegerField(default=0, verbose_name="Rows Done")
+    created = models.BigIntegerField(default=0, verbose_name="Created Rows")
+    failed = models.BigIntegerField(default=0, verbose_name="Failed Rows")
+    errors = models.JSONField(default=list, verbose_name="Errors")
+    detail = models.TextField(default='', blank=True, verbose_name="Detail")
+    seconds = models.FloatField(default=0, verbose_name="Seconds")
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name="Created Time")
+    updated_time = models.DateTimeField(auto_now=True, verbose_name="Updated Time")
+
+    class Meta:
+        db_table = 'wms_import_job'
+        verbose_name = 'Import Job'
+        verbose_name_plural = verbose_name
+        ordering = ['-id']
+
+
+class QueueJob(models.Model):
+    """
+    One job of the local job queue, claimed by a worker with a conditional update
+    A running job whose heartbeat stopped is run again, a failed run is retried after backoff
+    """
+    queue = models.CharField(max_length=64, verbose_name="Queue")
+    func = models.CharField(max_length=255, verbose_name="Function")
+    args = models.JSONField(default=list, verbose_name="Args")
+    kwargs = models.JSONField(default=dict, verbose_name="Kwargs")
+    priority = models.IntegerField(default=0, verbose_name="Priority")
+    key = models.CharField(max_length=255, default='', blank=True, verbose_name="Coalesce Key")
+    status = models.CharField(default='pending', max_length=16, verbose_name="Status")
+    attempts = models.IntegerField(default=0, verbose_name="Attempts")
+    max_attempts = models.IntegerField(default=3, verbose_name="Max Attempts")
+    run_after = models.DateTimeField(verbose_name="Run After")
+    worker = models.CharField(max_length=255, default='', blank=True, verbose_name="Worker")
+    result = models.JSONField(null=True, blank=True, verbose_name="Result")
+    detail = models.TextField(default='', blank=True, verbose_name="Detail")
+    seconds = models.FloatField(default=0, verbose_name="Seconds")
+    project = models.CharField(max_length=255, default='', blank=True, verbose_name="Project Name")
+    creater = models.CharField(max_length=255, default='', blank=True, verbose_name="Creater")
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name="Created Time")
+    updated_time = models.DateTimeField(auto_now=True, verbose_name="Updated Time")
+
+    class Meta:
+        db_table = 'wms_queue_job'
+        verbose_name = 'Queue Job'
+        verbose_name_plural = verbose_name
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'queue', 'priority', 'run_after'], name='wms_queue_claim'),
+            models.Index(fields=['key', 'status'], name='wms_queue_key'),
+        ]
+
+
+class StockRollup(models.Model):
+    """
+    Stock of one goods in one bin, summed from the stock, ASN and DN rows by database triggers
+    """
+    project = models.CharField(max_length=255, verbose_name="Project Name")
+    goods_code = models.CharField(max_length=255, verbose_name="Goods Code")
+    bin_name = models.CharField(max_length=255, default='', verbose_name="Bin Name")
+    onhand = models.FloatField(default=0, verbose_name="On Hand Stock")
+    can_order = models.FloatField(default=0, verbose_name="Can Order Stock")
+    inbound = models.FloatField(default=0, verbose_name="Inbound Qty")
+    outbound = models.FloatField(default=0, verbose_name="Outbound Qty")
+    records = models.BigIntegerField(default=0, verbose_name="Records")
+
+    class Meta:
+        db_table = 'wms_stock_rollup'
+        verbose_name = 'Stock Rollup'
+        verbose_name_plural = verbose_name
+        ordering = ['goods_code', 'bin_name']
+        constraints = [models.UniqueConstraint(fields=['project', 'goods_code', 'bin_name'], name='wms_stock_rollup_key')]
+        indexes = [models.Index(fields=['project', 'bin_name'], name='wms_stock_rollup_bin')]
+
+
+class ArchiveModel(models.Model):
+    """
+    Rows moved out of a resource table by the archive job, the id of the row is kept
+    Same columns as the resource table, so lists, filters and pagination work on it unchanged
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    project = models.CharField(max_length=255, default='bomiot', verbose_name='Project Name')
+    is_delete = models.BooleanField(default=False, verbose_name='Delete Label')
+    created_time = models.DateTimeField(verbose_name="Created Time")
+    updated_time = models.DateTimeField(blank=True, null=True, verbose_name="Updated Time")
+    data = models.JSONField(verbose_name="Data")
+    # plain columns here, generated columns of the same name in the resource tables
+    scope_department = models.BigIntegerField(null=True, verbose_name="Department")
+    scope_creater = models.CharField(max_length=255, null=True, verbose_name="Creater")
+    reason = models.CharField(max_length=16, verbose_name="Reason")
+    archived_time = models.DateTimeField(auto_now_add=True, verbose_name="Archived Time")
+
+    class Meta:
+        abstract = True
+
+
+class DeletedModel(models.Model):
+    """
+    Database view of the deleted rows of a resource, in its table and in its archive
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    project = models.CharField(max_length=255, verbose_name='Project Name')
+    is_delete = models.BooleanField(verbose_name='Delete Label')
+    created_time = models.DateTimeField(verbose_name="Created Time")
+    updated_time = models.DateTimeField(null=True, verbose_name="Updated Time")
+    data = models.JSONField(verbose_name="Data")
+
+    class Meta:
+        abstract = True
+
+
+def resource_models(name: str, label: str) -> tuple:
+    """
+    Archive table and deleted rows view of one resource of main.api
+    """
+    archive = type(f'{label}Archive', (ArchiveModel,), {
+        '__module__': __name__,
+        'Meta': type('Meta', (), {
+            'db_table': f'wms_archive_{name}',
+            'verbose_name': f'{label} Archive',
+            'verbose_name_plural': f'{label} Archive',
+            'ordering': ['-id'],
+            'indexes': [models.Index(fields=['project', 'is_delete', 'scope_department', 'id'],
+                                     name=f'wms_archive_{name}_scope')],
+        }),
+    })
+    deleted = type(f'{label}Deleted', (DeletedModel,), {
+        '__module__': __name__,
+        'Meta': type('Meta', (), {
+            'db_table': f'wms_deleted_{name}',
+            'managed': False,
+            'verbose_name': f'{label} Deleted',
+            'verbose_name_plural': f'{label} Deleted',
+            'ordering': ['-id'],
+        }),
+    })
+    return archive, deleted
+
+
+# resource model label -> (archive model, deleted view model)
+ARCHIVE_MODELS = {label: resource_models(name, label) for name, label in RESOURCE_TABLE.items()}
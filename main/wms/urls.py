@@ -0,0 +1,39 @@
+from django.urls import path
+from main import example
+from main.api import API_LIST
+from . import views
+
+urlpatterns = [
+    path(r'example/bulk/create/', example.ExampleBulkCreate.as_view({"post": "create"}), name="Bulk Create Example"),
+    path(r'example/bulk/update/', example.ExampleBulkUpdate.as_view({"post": "update"}), name="Bulk Update Example"),
+    path(r'example/bulk/delete/', example.ExampleBulkDelete.as_view({"post": "delete"}), name="Bulk Delete Example"),
+    path(r'example/patch/', example.ExampleUpdate.as_view({"post": "partial_update"}), name="Patch Example"),
+    path(r'example/', example.AsyncExampleList.as_view(), name="Async Get Example List"),
+    path(r'example/create/', example.AsyncExampleCreate.as_view(), name="Async Create Example"),
+    path(r'example/update/', example.AsyncExampleUpdate.as_view(), name="Async Update Example"),
+    path(r'example/delete/', example.AsyncExampleDelete.as_view(), name="Async Delete Example"),
+    path(r'cache/', views.CacheStatsList.as_view({"get": "list"}), name="Get Cache Stats"),
+    path(r'import/', views.ImportList.as_view({"get": "list"}), name="Get Import List"),
+    path(r'monitor/', views.MonitorList.as_view({"get": "list"}), name="Get Server Monitor"),
+    path(r'monitor/stream/', views.MonitorStream.as_view({"get": "list"}), name="Stream Server Monitor"),
+    path(r'queue/', views.QueueList.as_view({"get": "list"}), name="Get Queue Job List"),
+    path(r'queue/stats/', views.QueueStats.as_view({"get": "list"}), name="Get Queue Stats"),
+    path(r'queue/submit/', views.QueueSubmit.as_view({"post": "create"}), name="Submit Queue Job"),
+    path(r'queue/cancel/', views.QueueCancel.as_view({"post": "create"}), name="Cancel Queue Job"),
+    path(r'stock/rollup/', views.StockRollupList.as_view({"get": "list"}), name="Get Stock Rollup"),
+    path(r'stock/rollup/goods/', views.StockRollupGoods.as_view({"get": "list"}), name="Get Stock Rollup By Goods"),
+    # no name, probes stay out of the permission list
+    path(r'health/', views.HealthList.as_view({"get": "list"})),
+    path(r'ready/', views.ReadyList.as_view({"get": "list"})),
+    path(r'metrics/', views.MetricsList.as_view({"get": "list"})),
+]
+
+urlpatterns += [
+    path(api['api'][len('/wms/'):], views.ExportList.as_view({"get": "list"}, resource=api['resource']), name=api['name'])
+    for api in API_LIST if api['func_name'] == f"{api['resource']}_export"
+]
+
+urlpatterns += [
+    path(api['api'][len('/wms/'):], views.ImportCreate.as_view({"post": "create"}, resource=api['resource']), name=api['name'])
+    for api in API_LIST if api['func_name'] == f"{api['resource']}_import"
+]
@@ -0,0 +1,325 @@
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ParseError
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from bomiot.server.core import models
+from bomiot.server.core.page import CorePageNumberPagination
+from bomiot.server.core.permission import NormalPermission
+from main.api import RESOURCE_TABLE
+from main.cache import list_cache
+from main.export import CONTENT_TYPES, export_response
+from main.health import liveness, readiness
+from main.imports import ImportFileError, create_job, job_to_dict, start_import
+from main.jobs import STATUSES, TASKS, job_queue, queue_job_to_dict
+from main.metrics import CONTENT_TYPE, metrics
+from main.monitor import monitor
+from main.rollup import rollup_to_dict, stock_rollup
+from main.query import QueryError, list_queryset
+from main.wms.models import ImportJob, QueueJob
+
+
+class CacheStatsList(ViewSet):
+    """
+        list:
+            Response the list cache counters
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        return Response(list_cache.stats())
+
+
+class HealthList(ViewSet):
+    """
+        list:
+            Response the liveness of the worker, for load balancer probes
+    """
+    authentication_classes = []
+    permission_classes = []
+    throttle_classes = []
+
+    def list(self, request, *args, **kwargs):
+        return Response(liveness())
+
+
+class ReadyList(ViewSet):
+    """
+        list:
+            Response the readiness of the worker, 503 until the database answers and the schema is current
+    """
+    authentication_classes = []
+    permission_classes = []
+    throttle_classes = []
+
+    def list(self, request, *args, **kwargs):
+        ready, data = readiness()
+        return Response(data, status=200 if ready else 503)
+
+
+class MetricsList(ViewSet):
+    """
+        list:
+            Response the request metrics of every worker in the Prometheus text format
+    """
+    authentication_classes = []
+    permission_classes = []
+    throttle_classes = []
+
+    def list(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
+
+
+def monitor_window(request) -> tuple:
+    """
+    (since, seconds) of a monitor request, since is the sample id of ?since= or Last-Event-ID
+    """
+    since = request.query_params.get('since', request.META.get('HTTP_LAST_EVENT_ID', ''))
+    if since and not since.isdigit():
+        raise ParseError('since must be an integer')
+    try:
+        seconds = float(request.query_params.get('seconds', 600))
+    except ValueError:
+        raise ParseError('seconds must be a number')
+    return (int(since) if since else None), seconds
+
+
+class MonitorList(ViewSet):
+    """
+        list:
+            Response the server monitor samples of the node from memory, the last ?seconds= or after ?since=
+            The last cpu, disk and process snapshot is added
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        since, seconds = monitor_window(request)
+        return Response({**monitor.history(since, seconds), 'snapshot': monitor.snapshot()})
+
+
+class MonitorStream(ViewSet):
+    """
+        list:
+            Push the new server monitor samples as server-sent events, and the snapshot when it changes
+            The stream ends after stream_seconds, the browser reconnects with Last-Event-ID
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        since, seconds = monitor_window(request)
+        if isinstance(getattr(request, '_request', request), ASGIRequest):
+            events = monitor.astream(since, seconds)
+        else:
+            events = monitor.stream(since, seconds)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ExportList(ViewSet):
+    """
+        list:
+            Stream every row of a resource list as csv or xlsx, filtered and scoped like the list
+    """
+    permission_classes = [NormalPermission, ]
+    resource = ''
+
+    def list(self, request, *args, **kwargs):
+        file_type = request.query_params.get('type', 'csv').lower()
+        if file_type not in CONTENT_TYPES:
+            raise ParseError(f"type must be one of {', '.join(CONTENT_TYPES)}")
+        try:
+            queryset = list_queryset(getattr(models, RESOURCE_TABLE[self.resource]), request, connection.vendor)
+        except QueryError as e:
+            raise ParseError(str(e))
+        filename = f"{self.resource}_{timezone.now():%Y%m%d%H%M%S}"
+        return export_response(request, queryset, file_type, filename)
+
+
+class ImportCreate(ViewSet):
+    """
+        create:
+            Import a csv or xlsx file of the user's media folder into a resource, or resume an import job
+            The rows are written in the background, the job is returned at once
+    """
+    permission_classes = [NormalPermission, ]
+    resource = ''
+
+    def create(self, request, *args, **kwargs):
+        job_id = request.data.get('job')
+        if job_id is None:
+            try:
+                job = create_job(self.resource, request, request.data.get('file', ''))
+            except ImportFileError as e:
+                raise ParseError(str(e))
+        else:
+            job = ImportJob.objects.filter(id=job_id if isinstance(job_id, int) else 0, resource=self.resource,
+                                           creater=request.auth.username).first()
+            if job is None:
+                raise NotFound('Import job not exists')
+        if not start_import(job.id):
+            raise ParseError(f'Import job is {job.status}')
+        job.refresh_from_db()
+        return Response(job_to_dict(job), status=202)
+
+
+class ImportList(ViewSet):
+    """
+        list:
+            Response the import jobs of the user with their progress, ?id= adds the failed rows
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        queryset = ImportJob.objects.all()
+        if not request.auth.is_superuser:
+            queryset = queryset.filter(creater=request.auth.username)
+        job_id = request.query_params.get('id')
+        if job_id is not None:
+            if not job_id.isdigit():
+                raise ParseError('id must be an integer')
+            queryset = queryset.filter(id=int(job_id))
+        paginator = CorePageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response([job_to_dict(job, errors=job_id is not None) for job in page])
+
+
+class QueueList(ViewSet):
+    """
+        list:
+            Response the queue jobs of the user, ?id=, ?status= and ?queue= filter them
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        queryset = QueueJob.objects.all()
+        if not request.auth.is_superuser:
+            queryset = queryset.filter(creater=request.auth.username)
+        job_id = request.query_params.get('id')
+        if job_id is not None:
+            if not job_id.isdigit():
+                raise ParseError('id must be an integer')
+            queryset = queryset.filter(id=int(job_id))
+        status = request.query_params.get('status')
+        if status is not None:
+            if status not in STATUSES:
+                raise ParseError(f"status must be one of {', '.join(STATUSES)}")
+            queryset = queryset.filter(status=status)
+        queue = request.query_params.get('queue')
+        if queue is not None:
+            queryset = queryset.filter(queue=queue)
+        paginator = CorePageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response([queue_job_to_dict(job) for job in page])
+
+
+class QueueStats(ViewSet):
+    """
+        list:
+            Response the jobs of every queue by status, and the tasks the submit API runs
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        return Response({'queues': job_queue.stats(), 'tasks': sorted(TASKS)})
+
+
+class QueueSubmit(ViewSet):
+    """
+        create:
+            Queue a registered task, the job is returned at once
+    """
+    permission_classes = [NormalPermission, ]
+
+    def create(self, request, *args, **kwargs):
+        if not job_queue.enable:
+            raise ParseError('Job queue is disabled')
+        task = request.data.get('task', '')
+        if task not in TASKS:
+            raise ParseError(f"Unknown task '{task}'")
+        path, queue = TASKS[task]
+        args = request.data.get('args', [])
+        kwargs = request.data.get('kwargs', {})
+        priority = request.data.get('priority', 0)
+        key = request.data.get('key', '')
+        delay = request.data.get('delay', 0)
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ParseError('args must be a list and kwargs an object')
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ParseError('priority must be an integer')
+        if not isinstance(key, str):
+            raise ParseError('key must be a string')
+        if not isinstance(delay, (int, float)) or isinstance(delay, bool) or delay < 0:
+            raise ParseError('delay must be a number of seconds')
+        project_name = request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+        if project_name.lower() == 'bomiot':
+            project_name = settings.PROJECT_NAME
+        # keys of the API are per task, a job only coalesces with the jobs of the same task
+        job = job_queue.submit(path, args, kwargs, queue=queue, priority=priority, key=f'{task}:{key}' if key else '',
+                               delay=delay, project=project_name, creater=request.auth.username)
+        return Response(queue_job_to_dict(job), status=202)
+
+
+class QueueCancel(ViewSet):
+    """
+        create:
+            Cancel a pending queue job of the user, a running job finishes
+    """
+    permission_classes = [NormalPermission, ]
+
+    def create(self, request, *args, **kwargs):
+        job_id = request.data.get('id')
+        if not isinstance(job_id, int) or isinstance(job_id, bool):
+            raise ParseError('id must be an integer')
+        if not job_queue.cancel(job_id, None if request.auth.is_superuser else request.auth.username):
+            raise NotFound('Pending queue job not exists')
+        return Response(queue_job_to_dict(QueueJob.objects.get(id=job_id)))
+
+
+# goods codes one rollup request can ask for
+MAX_GOODS_CODES = 1000
+
+
+def rollup_query(request) -> tuple:
+    """
+    (project, goods codes, bin name) of a rollup request, ?goods_code= takes a comma separated list
+    """
+    project_name = request.META.get('HTTP_PROJECT', settings.PROJECT_NAME)
+    if project_name.lower() == 'bomiot':
+        project_name = settings.PROJECT_NAME
+    goods_codes = [code for code in request.query_params.get('goods_code', '').split(',') if code]
+    if len(goods_codes) > MAX_GOODS_CODES:
+        raise ParseError(f'goods_code can not be more than {MAX_GOODS_CODES} codes')
+    return project_name, goods_codes, request.query_params.get('bin_name')
+
+
+class StockRollupList(ViewSet):
+    """
+        list:
+            Response the stock of every goods in every bin from the rollup, ?goods_code= and ?bin_name= look rows up
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        project_name, goods_codes, bin_name = rollup_query(request)
+        paginator = CorePageNumberPagination()
+        page = paginator.paginate_queryset(stock_rollup.rows(project_name, goods_codes, bin_name), request, view=self)
+        return paginator.get_paginated_response([rollup_to_dict(row) for row in page])
+
+
+class StockRollupGoods(ViewSet):
+    """
+        list:
+            Response the stock of the goods of ?goods_code= over all of their bins, for allocation
+    """
+    permission_classes = [NormalPermission, ]
+
+    def list(self, request, *args, **kwargs):
+        project_name, goods_codes, _ = rollup_query(request)
+        if not goods_codes:
+            raise ParseError('goods_code is required')
+        return Response({'results': stock_rollup.totals(project_name, goods_codes)})
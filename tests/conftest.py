@@ -0,0 +1,47 @@
+import os
+import shutil
+import sys
+import tempfile
+from configparser import ConfigParser
+from os.path import dirname, abspath, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+
+def pytest_configure(config):
+    """
+    Django set up in a temporary working space, a copy of setup.ini on its own sqlite database
+    bomiot reads WORKING_SPACE from the current directory, so it has to be switched before django.setup()
+    """
+    workspace = tempfile.mkdtemp(prefix='wms-tests-')
+    setup_config = ConfigParser(interpolation=None)
+    setup_config.read(join(ROOT, 'setup.ini'), encoding='utf-8')
+    setup_config.set('database', 'engine', 'sqlite')
+    setup_config.set('database', 'sqlite_read_split', 'False')
+    with open(join(workspace, 'setup.ini'), 'w', encoding='utf-8') as f:
+        setup_config.write(f)
+    project = setup_config.get('project', 'name', fallback='bomiot')
+    try:
+        os.symlink(join(ROOT, project), join(workspace, project), target_is_directory=True)
+    except OSError:
+        shutil.copytree(join(ROOT, project), join(workspace, project), ignore=shutil.ignore_patterns('__pycache__', 'media'))
+    os.makedirs(join(workspace, 'dbs'), exist_ok=True)
+    config.wms_workspace = (os.getcwd(), workspace)
+    os.chdir(workspace)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bomiot.server.server.settings')
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def pytest_unconfigure(config):
+    cwd, workspace = getattr(config, 'wms_workspace', (None, None))
+    if workspace is None:
+        return
+    from django.db import connections
+    connections.close_all()
+    os.chdir(cwd)
+    shutil.rmtree(workspace, ignore_errors=True)
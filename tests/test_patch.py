@@ -0,0 +1,91 @@
+import pytest
+
+from django.db import transaction
+from django.utils import timezone
+from bomiot.server.core.models import Example
+from main.patch import VERSION_KEY, locked_versions, patch_rows, record_version, replace_rows, split_patch
+
+PROJECT = 'test_patch'
+
+
+@pytest.fixture
+def record():
+    record = Example.objects.create(project=PROJECT, data={'goods_code': 'P-001', 'qty': 1, 'note': 'old'})
+    yield record
+    Example.objects.filter(id=record.id).delete()
+
+
+def data_of(record) -> dict:
+    return Example.objects.get(id=record.id).data
+
+
+def test_split_patch():
+    assert split_patch({'id': 1, VERSION_KEY: 3, 'qty': 5, 'note': None, 'updated_time': 'x'}) == (1, 3, {'qty': 5}, ['note'])
+    assert split_patch({'id': 1, 'qty': 5}) == (1, None, {'qty': 5}, [])
+
+
+@pytest.mark.parametrize('data', [
+    [1], {'qty': 5}, {'id': '1', 'qty': 5}, {'id': True, 'qty': 5}, {'id': 1},
+    {'id': 1, VERSION_KEY: -1, 'qty': 5}, {'id': 1, VERSION_KEY: '1', 'qty': 5}, {'id': 1, 'a"b': 5},
+])
+def test_split_patch_rejects(data):
+    with pytest.raises(ValueError):
+        split_patch(data)
+
+
+def test_patch_writes_the_keys_and_moves_the_version_on(record):
+    queryset = Example.objects.filter(id=record.id)
+    assert record_version(record.data) == 0
+    assert patch_rows(queryset, {'qty': 2, 'bins': ['A', 'B']}, ['note'], 0, updated_time=timezone.now()) == 1
+    assert data_of(record) == {'goods_code': 'P-001', 'qty': 2, 'bins': ['A', 'B'], VERSION_KEY: 1}
+    assert patch_rows(queryset, {'qty': 3}, [], 1) == 1
+    assert data_of(record)[VERSION_KEY] == 2
+
+
+def test_patch_of_a_stale_version_writes_nothing(record):
+    queryset = Example.objects.filter(id=record.id)
+    assert patch_rows(queryset, {'qty': 2}, [], 0) == 1
+    assert patch_rows(queryset, {'qty': 9}, ['note'], 0) == 0
+    assert data_of(record) == {'goods_code': 'P-001', 'qty': 2, 'note': 'old', VERSION_KEY: 1}
+
+
+def test_patch_of_a_missing_record(record):
+    assert patch_rows(Example.objects.filter(id=record.id, is_delete=True), {'qty': 2}, [], 0) == 0
+    assert data_of(record)['qty'] == 1
+
+
+def test_replace_writes_the_whole_document(record):
+    queryset = Example.objects.filter(id=record.id)
+    assert replace_rows(queryset, {'goods_code': 'P-001', 'qty': 7}, 0, project=PROJECT) == 1
+    assert data_of(record) == {'goods_code': 'P-001', 'qty': 7, VERSION_KEY: 1}
+    assert replace_rows(queryset, {'goods_code': 'P-001', 'qty': 8}, 0) == 0
+    assert data_of(record)['qty'] == 7
+
+
+def test_every_write_of_data_moves_the_version_on(record):
+    # bomiot's handlers save data without the version, the trigger keeps counting
+    record.data = {**record.data, 'qty': 4}
+    record.save()
+    assert data_of(record)[VERSION_KEY] == 1
+    Example.objects.filter(id=record.id).update(data={'goods_code': 'P-001', 'qty': 5})
+    assert data_of(record) == {'goods_code': 'P-001', 'qty': 5, VERSION_KEY: 2}
+    # a client holding version 1 lost the race
+    assert patch_rows(Example.objects.filter(id=record.id), {'qty': 6}, [], 1) == 0
+    assert patch_rows(Example.objects.filter(id=record.id), {'qty': 6}, [], 2) == 1
+    assert data_of(record)[VERSION_KEY] == 3
+
+
+def test_writes_without_data_keep_the_version(record):
+    Example.objects.filter(id=record.id).update(is_delete=True, updated_time=timezone.now())
+    assert VERSION_KEY not in data_of(record)
+
+
+def test_locked_versions(record):
+    other = Example.objects.create(project=PROJECT, data={'goods_code': 'P-002'})
+    try:
+        patch_rows(Example.objects.filter(id=other.id), {'qty': 1}, [], 0)
+        with transaction.atomic():
+            versions = locked_versions(Example.objects.filter(id__in=[record.id, other.id]))
+        assert versions == {record.id: 0, other.id: 1}
+    finally:
+        other.delete()
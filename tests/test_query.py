@@ -0,0 +1,130 @@
+import pytest
+
+from django.db import connection
+from bomiot.server.core.models import Example
+from main.query import QueryError, compile_condition, compile_node, compile_query, parse_params
+
+PROJECT = 'test_query'
+
+
+@pytest.fixture(scope='module')
+def rows():
+    Example.objects.filter(project=PROJECT).delete()
+    records = Example.objects.bulk_create([
+        Example(project=PROJECT, data={'goods_code': 'A-001', 'goods_name': 'Apple', 'qty': 5, 'department': 1}),
+        Example(project=PROJECT, data={'goods_code': 'A-002', 'goods_name': 'Apricot', 'qty': 12, 'department': 2}),
+        Example(project=PROJECT, data={'goods_code': 'B-001', 'goods_name': 'Banana', 'qty': 20, 'department': 3}),
+        Example(project=PROJECT, data={'goods_code': 'C-001', 'goods_name': 'Cherry', 'department': 3}),
+    ])
+    yield {record.data['goods_code']: record.id for record in Example.objects.filter(project=PROJECT)}
+    Example.objects.filter(id__in=[record.id for record in records]).delete()
+
+
+def codes(query) -> set:
+    return {data['goods_code'] for data in Example.objects.filter(project=PROJECT).filter(query).values_list('data', flat=True)}
+
+
+def condition(field, value):
+    return compile_condition(field, value, connection.vendor)
+
+
+def test_parse_params_accepts_json_and_the_single_quoted_payload():
+    assert parse_params('') == {}
+    assert parse_params('{"data__qty__gte": 5}') == {'data__qty__gte': 5}
+    assert parse_params("{'data__goods_code': 'A-001'}") == {'data__goods_code': 'A-001'}
+    assert parse_params("{'is_delete': True}") == {'is_delete': True}
+
+
+@pytest.mark.parametrize('params', ['[1, 2]', '"text"', '{"data__qty": ', 'goods_code=A-001', '__import__("os")'])
+def test_parse_params_rejects_what_is_not_an_object(params):
+    with pytest.raises(QueryError):
+        parse_params(params)
+
+
+@pytest.mark.parametrize('field, value, expected', [
+    ('data__goods_code', 'A-001', {'A-001'}),
+    ('data__goods_code__iexact', 'a-001', {'A-001'}),
+    ('data__goods_code__ne', 'A-001', {'A-002', 'B-001', 'C-001'}),
+    ('data__goods_code__in', ['A-002', 'B-001', 'X'], {'A-002', 'B-001'}),
+    ('data__goods_code__startswith', 'A-', {'A-001', 'A-002'}),
+    ('data__goods_name__icontains', 'AP', {'A-001', 'A-002'}),
+    ('data__department__gte', 2, {'A-002', 'B-001', 'C-001'}),
+    ('data__department', '3', {'B-001', 'C-001'}),
+    ('data__qty__gt', 5, {'A-002', 'B-001'}),
+    ('data__qty__lte', 12, {'A-001', 'A-002'}),
+    ('data__qty__lt', 12, {'A-001'}),
+    ('data__qty__isnull', True, {'C-001'}),
+    ('data__qty', None, {'C-001'}),
+    ('data__qty__ne', None, {'A-001', 'A-002', 'B-001'}),
+])
+def test_operators(rows, field, value, expected):
+    assert codes(condition(field, value)) == expected
+
+
+def test_top_level_filters_are_ored(rows):
+    is_delete, ordering, query = compile_query({'data__goods_code': 'A-001', 'data__qty__gte': 20}, connection.vendor)
+    assert is_delete is False
+    assert ordering == ['-id']
+    assert codes(query) == {'A-001', 'B-001'}
+
+
+def test_or_group(rows):
+    _, _, query = compile_query({'$or': [{'data__goods_code': 'A-001'}, {'data__goods_name__startswith': 'Ch'}]},
+                                connection.vendor)
+    assert codes(query) == {'A-001', 'C-001'}
+
+
+def test_and_group_with_nested_or(rows):
+    query = compile_node({'$and': [
+        {'data__department__gte': 2},
+        {'$or': [{'data__qty__lt': 15}, {'data__qty__isnull': True}]},
+    ]}, connection.vendor)
+    assert codes(query) == {'A-002', 'C-001'}
+
+
+def test_group_members_are_anded(rows):
+    _, _, query = compile_query({'$or': [{'data__goods_code__startswith': 'A', 'data__qty__gt': 10},
+                                         {'data__goods_code': 'C-001'}]}, connection.vendor)
+    assert codes(query) == {'A-002', 'C-001'}
+
+
+def test_is_delete_and_order_by(rows):
+    is_delete, ordering, query = compile_query({'is_delete': True, 'order_by': 'id'}, connection.vendor)
+    assert is_delete is True
+    assert ordering == ['id']
+    _, ordering, _ = compile_query({'order_by': '-data__goods_code'}, connection.vendor)
+    ordered = Example.objects.filter(project=PROJECT).order_by(*ordering).values_list('data', flat=True)
+    assert [data['goods_code'] for data in ordered] == ['C-001', 'B-001', 'A-002', 'A-001']
+
+
+@pytest.mark.parametrize('query_data', [
+    {'data': 1},
+    {'goods_code': 'A-001'},
+    {'data__goods_code; DROP TABLE x': 'A'},
+    {'data__goods-code': 'A'},
+    {'data__goods_code__in': []},
+    {'data__goods_code__in': 'A-001'},
+    {'data__goods_code__in': [None]},
+    {'data__qty__gte': True},
+    {'data__qty__gte': [1]},
+    {'data__goods_name__icontains': 1},
+    {'data__qty__isnull': 'yes'},
+    {'data__goods_code': {'$ne': 'A'}},
+    {'data__department': 'two'},
+    {'data__goods_code': True},
+    {'$or': {'data__qty': 1}},
+    {'$or': []},
+    {'$or': ['data__qty']},
+    {'$and': [{'is_delete': True}]},
+    {'is_delete': 'false'},
+    {'order_by': 'data__qty__gte'},
+    {'order_by': 'name'},
+    {'order_by': ''},
+])
+def test_malformed_params_raise_query_error(query_data):
+    with pytest.raises(QueryError):
+        compile_query(query_data, connection.vendor)
+
+
+def test_query_error_is_a_value_error():
+    assert issubclass(QueryError, ValueError)
@@ -0,0 +1,116 @@
+import pytest
+
+from django.db import connection
+from bomiot.server.core.models import ASN, DN, Stock
+from main.rollup import stock_rollup
+from main.wms.models import StockRollup
+
+PROJECT = 'test_rollup'
+
+pytestmark = pytest.mark.skipif(not stock_rollup.supported(connection.vendor), reason='[stock] enable = False')
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    yield
+    for model in (Stock, ASN, DN):
+        model.objects.filter(project=PROJECT).delete()
+    StockRollup.objects.filter(project=PROJECT).delete()
+
+
+def rollup() -> dict:
+    """
+    {(goods, bin): (onhand, can_order, inbound, outbound, records)} the triggers keep
+    """
+    return {(row.goods_code, row.bin_name): (row.onhand, row.can_order, row.inbound, row.outbound, row.records)
+            for row in StockRollup.objects.filter(project=PROJECT)}
+
+
+def assert_reconciled():
+    """
+    The rollup equals the sums of the source tables and reconcile finds nothing to correct
+    """
+    sources = {(row[1], row[2]): tuple(row[3:]) for row in stock_rollup.source_rows('default', PROJECT)}
+    assert rollup() == sources
+    result = stock_rollup.reconcile()
+    assert (result['fixed'], result['removed']) == (0, 0)
+
+
+def stock(goods='G1', bin_name='B1', onhand=10, can_order=8, **data):
+    return Stock.objects.create(project=PROJECT, data={'goods_code': goods, 'bin_name': bin_name, 'onhand_stock': onhand,
+                                                       'can_order_stock': can_order, **data})
+
+
+def test_create():
+    stock()
+    stock(onhand=5, can_order=5)
+    stock(goods='G2', bin_name='B2', onhand=2.5, can_order='3')
+    ASN.objects.create(project=PROJECT, data={'goods_code': 'G1', 'bin_name': 'B1', 'goods_qty': 4, 'asn_status': 1})
+    DN.objects.create(project=PROJECT, data={'goods_code': 'G1', 'goods_qty': 3, 'dn_status': 1})
+    assert rollup() == {
+        ('G1', 'B1'): (15, 13, 4, 0, 3),
+        ('G1', ''): (0, 0, 0, 3, 1),
+        # a quantity which is not a JSON number counts as 0
+        ('G2', 'B2'): (2.5, 0, 0, 0, 1),
+    }
+    assert_reconciled()
+
+
+def test_rows_without_goods_are_left_out():
+    stock(goods='')
+    Stock.objects.create(project=PROJECT, data={'bin_name': 'B1', 'onhand_stock': 1})
+    Stock.objects.create(project=PROJECT, data=['not', 'an', 'object'])
+    assert rollup() == {}
+    assert_reconciled()
+
+
+def test_update():
+    row = stock()
+    asn = ASN.objects.create(project=PROJECT, data={'goods_code': 'G1', 'bin_name': 'B1', 'goods_qty': 4, 'asn_status': 1})
+    row.data = {**row.data, 'onhand_stock': 6, 'can_order_stock': 1}
+    row.save()
+    assert rollup() == {('G1', 'B1'): (6, 1, 4, 0, 2)}
+    assert_reconciled()
+    # moved to another bin
+    Stock.objects.filter(id=row.id).update(data={**row.data, 'bin_name': 'B2'})
+    assert rollup() == {('G1', 'B1'): (0, 0, 4, 0, 1), ('G1', 'B2'): (6, 1, 0, 0, 1)}
+    assert_reconciled()
+    # a closed ASN line is already in the stock rows
+    asn.data = {**asn.data, 'asn_status': 5}
+    asn.save()
+    assert rollup() == {('G1', 'B2'): (6, 1, 0, 0, 1)}
+    assert_reconciled()
+    # another project
+    Stock.objects.filter(id=row.id).update(project=f'{PROJECT}_other')
+    assert rollup() == {}
+    assert_reconciled()
+    Stock.objects.filter(project=f'{PROJECT}_other').delete()
+
+
+def test_delete():
+    first = stock()
+    second = stock(onhand=5, can_order=5)
+    DN.objects.create(project=PROJECT, data={'goods_code': 'G1', 'bin_name': 'B1', 'goods_qty': 3, 'dn_status': 1})
+    # the delete label of bomiot's handlers
+    Stock.objects.filter(id=first.id).update(is_delete=True)
+    assert rollup() == {('G1', 'B1'): (5, 5, 0, 3, 2)}
+    assert_reconciled()
+    second.delete()
+    DN.objects.filter(project=PROJECT).delete()
+    assert rollup() == {}
+    assert_reconciled()
+    Stock.objects.filter(id=first.id).update(is_delete=False)
+    assert rollup() == {('G1', 'B1'): (10, 8, 0, 0, 1)}
+    assert_reconciled()
+
+
+def test_reconcile_corrects_a_drift():
+    stock()
+    stock(goods='G2')
+    StockRollup.objects.filter(project=PROJECT, goods_code='G1').update(onhand=99)
+    StockRollup.objects.filter(project=PROJECT, goods_code='G2').delete()
+    StockRollup.objects.create(project=PROJECT, goods_code='G3', onhand=1, records=1)
+    result = stock_rollup.reconcile()
+    assert (result['fixed'], result['removed']) == (2, 1)
+    assert rollup() == {('G1', 'B1'): (10, 8, 0, 0, 1), ('G2', 'B1'): (10, 8, 0, 0, 1)}
+    assert_reconciled()